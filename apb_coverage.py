@@ -0,0 +1,102 @@
+from array import array
+import itertools
+import math
+from apb_model import APBCommand
+
+
+class APBCoverage:
+    """
+    Functional coverage of the (slave_id, address, command, wait states)
+    space of an APB bus
+
+    Attach to an `APBBus` with `bus.add_monitor(coverage)`.  Each bin is a
+    counter in a flat array indexed by
+    `((slave_id * num_addresses + address) * 2 + command) * num_wait_bins +
+    wait_states`, with wait states above `max_wait_states` counted in the last
+    bin.
+
+    Transfers to a slave or address outside of the coverage space raise a
+    ValueError.
+
+    `target` is the fraction of bins that must be hit for `done` to be set,
+    use `until_done` to stop a stimulus stream once it is reached
+    """
+    COMMANDS = (APBCommand.READ, APBCommand.WRITE)
+
+    def __init__(self, num_slaves, num_addresses, max_wait_states=0,
+                 target=1.0):
+        if not 0 < target <= 1:
+            raise ValueError(f"Expected target in (0, 1], got {target}")
+        self.num_slaves = num_slaves
+        self.num_addresses = num_addresses
+        self.num_wait_bins = max_wait_states + 1
+        self.num_bins = num_slaves * num_addresses * 2 * self.num_wait_bins
+        self.bins = array("Q", bytes(8 * self.num_bins))
+        self.target_bins = math.ceil(round(target * self.num_bins, 6))
+        self.hits = 0
+        self._command_index = {APBCommand.READ: 0, APBCommand.WRITE: 1}
+
+    def _index(self, slave_id, address, command, wait_states):
+        # Arguments may be hwtypes or NumPy values, which must not take part
+        # in the index arithmetic
+        slave_id, address = int(slave_id), int(address)
+        if not 0 <= slave_id < self.num_slaves:
+            raise ValueError(f"Slave id {slave_id} out of range for "
+                             f"{self.num_slaves} slaves")
+        if not 0 <= address < self.num_addresses:
+            raise ValueError(f"Address {address} out of range for "
+                             f"{self.num_addresses} addresses")
+        wait_bin = min(int(wait_states), self.num_wait_bins - 1)
+        return ((slave_id * self.num_addresses + address) * 2 +
+                self._command_index[command]) * self.num_wait_bins + wait_bin
+
+    def __call__(self, slave_id, address, command, data, wait_states,
+                 strobe=None):
+        index = self._index(slave_id, address, command, wait_states)
+        if not self.bins[index]:
+            self.hits += 1
+        self.bins[index] += 1
+
+    @property
+    def coverage(self):
+        return self.hits / self.num_bins
+
+    @property
+    def done(self):
+        return self.hits >= self.target_bins
+
+    def until_done(self, iterable):
+        """
+        Yield from `iterable` until the coverage target is reached
+        """
+        for item in iterable:
+            if self.done:
+                return
+            yield item
+
+    def count(self, slave_id, address, command, wait_states=0):
+        return self.bins[self._index(slave_id, address, command,
+                                     wait_states)]
+
+    def holes(self):
+        """
+        Returns the list of (slave_id, address, command, wait_states) bins
+        that have not been hit
+        """
+        return [
+            (slave_id, address, command, wait_states)
+            for (slave_id, address, command, wait_states), count in zip(
+                itertools.product(range(self.num_slaves),
+                                  range(self.num_addresses), self.COMMANDS,
+                                  range(self.num_wait_bins)),
+                self.bins)
+            if not count
+        ]
+
+    def report(self):
+        lines = [f"coverage: {self.hits}/{self.num_bins} bins "
+                 f"({self.coverage:.1%})"]
+        for slave_id, address, command, wait_states in self.holes():
+            lines.append(f"  hole: slave={slave_id} address={address} "
+                         f"command={command} wait_states={wait_states}")
+        return "\n".join(lines)
@@ -1,8 +1,9 @@
 import math
 from hwtypes import Enum, Product, Bit, BitVector
-import apb
 from functools import lru_cache, wraps
 import inspect
+import os
+import weakref
 
 
 def canonicalize_args(f):
@@ -59,14 +60,37 @@ def APB(addr_width, data_width, num_slaves=1):
     return result
 
 
-def default_APB_instance(_APB):
+def default_instance(T):
     """
-    Convenience function to instantiate an _APB object with default values of 0
+    Convenience function to instantiate a bus interface product `T` (e.g. an
+    _APB or _AXI4Lite object) with default values of 0
     """
     fields = {}
-    for key, value in _APB.field_dict.items():
+    for key, value in T.field_dict.items():
         fields[key] = value(0)
-    return _APB(**fields)
+    return T(**fields)
+
+
+# Name used by the APB tests and notebooks
+default_APB_instance = default_instance
+
+
+def copy_product(value):
+    """
+    Returns a copy of the hwtypes Product `value`, copying nested products
+    (field values such as `Bit` and `BitVector` are immutable and shared)
+    """
+    if not isinstance(value, Product):
+        return value
+    return type(value)(**{key: copy_product(getattr(value, key))
+                          for key in type(value).field_dict})
+
+
+def slave_id_width(num_slaves):
+    """
+    Width of the `slave_id` field of a `Request` for `num_slaves` slaves
+    """
+    return max(math.ceil(math.log2(num_slaves)), 1)
 
 
 @canonicalize_args
@@ -76,10 +100,26 @@ def Request(addr_width, data_width, num_slaves):
         command = APBCommand
         address = BitVector[addr_width]
         data = BitVector[data_width]
-        slave_id = BitVector[max(math.ceil(math.log2(num_slaves)), 1)]
+        slave_id = BitVector[slave_id_width(num_slaves)]
+        # Byte lanes of `data` to update on a write (driven on PSTRB)
+        strobe = BitVector[math.ceil(data_width / 8)]
     return _Request
 
 
+def apply_strobe(value, data, strobe, data_width):
+    """
+    Returns `value` with the byte lanes enabled in `strobe` replaced by the
+    corresponding bytes of `data` (as an `int`)
+    """
+    value, data, strobe = int(value), int(data), int(strobe)
+    mask = 0
+    for lane in range(math.ceil(data_width / 8)):
+        if strobe >> lane & 1:
+            mask |= 0xFF << (8 * lane)
+    mask &= (1 << data_width) - 1
+    return (value & ~mask) | (data & mask)
+
+
 @canonicalize_args
 @lru_cache(maxsize=None)
 def APBBusIO(addr_width, data_width, num_slaves=1):
@@ -99,6 +139,10 @@ def APBBus(addr_width, data_width, num_slaves=1):
             # TODO: Move main logic to a base class
             self.main = self._main()
             next(self.main)
+            # Set while a transfer is in progress, see `checkpoint`
+            self.busy = False
+            # Callables notified when a transfer completes, see `add_monitor`
+            self.monitors = []
 
         def __call__(self, io):
             self.io = io
@@ -112,59 +156,374 @@ def APBBus(addr_width, data_width, num_slaves=1):
                                          self.io.request.data)
                 elif self.io.request.command == APBCommand.WRITE:
                     yield from self.write(self.io.request.address,
-                                          self.io.request.data)
+                                          self.io.request.data,
+                                          self.io.request.strobe)
                 else:
                     yield
 
+        def idle(self, io, cycles):
+            """
+            Advance the model by `cycles` idle cycles in constant time, as if
+            it was called `cycles` times with `io`
+
+            The model does not change its outputs between transfers, so only
+            valid between transfers with an IDLE request.  The model then
+            has no state to advance and `cycles` is not used, it is kept so
+            `idle` has the signature of the bindings and helpers it is
+            called along with (see `apb_model.idle`)
+            """
+            self.io = io
+            if self.busy or io.request.command != APBCommand.IDLE:
+                raise RuntimeError("Can only fast-forward the APB model "
+                                   "between transfers with an IDLE request")
+
+        def checkpoint(self):
+            """
+            Returns a snapshot of the state of the bus and of the `io` it was
+            last called with, e.g. after a configuration prologue, to start
+            several scenarios from with `restore`
+
+            Only supported between transfers, the progress of a transfer is
+            held by the generator driving it, which cannot be copied
+            """
+            if self.busy:
+                raise RuntimeError("Cannot checkpoint the APB model during a "
+                                   "transfer")
+            return copy_product(self.io)
+
+        def restore(self, snapshot):
+            """
+            Restore the state saved by `checkpoint`, returns a copy of the
+            `io` to call the bus with (its `request` field replaces the
+            request of the scenario that was interrupted)
+            """
+            self.main = self._main()
+            next(self.main)
+            self.busy = False
+            self.io = copy_product(snapshot)
+            return self.io
+
+        def add_monitor(self, monitor):
+            """
+            Register `monitor` to be called as
+            `monitor(slave_id, address, command, data, wait_states, strobe)`
+            when a transfer completes, where `data` is PWDATA for writes and
+            PRDATA for reads and `strobe` is PSTRB for writes and `None` for
+            reads
+
+            Note that `APBBus` instances are shared between callers with the
+            same parameters, so monitors should be removed with
+            `remove_monitor` when they are no longer needed
+            """
+            self.monitors.append(monitor)
+
+        def remove_monitor(self, monitor):
+            self.monitors.remove(monitor)
+
+        def notify(self, slave_id, address, command, data, wait_states,
+                   strobe=None):
+            for monitor in self.monitors:
+                monitor(slave_id, address, command, data, wait_states,
+                        strobe)
+
         def set_psel(self, value):
             setattr(self.io.apb, f"PSEL{self.io.request.slave_id}", value)
 
-        def write(self, address, data):
+        def write(self, address, data, strobe):
+            self.busy = True
+            slave_id = self.io.request.slave_id
             self.io.apb.PADDR = address
             self.io.apb.PWDATA = data
+            self.io.apb.PSTRB = strobe
             self.set_psel(Bit(1))
             self.io.apb.PWRITE = Bit(1)
             yield
             self.io.apb.PENABLE = Bit(1)
             yield
+            wait_states = 0
             while not self.io.apb.PREADY:
                 # TODO: Insert timeout logic
+                wait_states += 1
                 yield
             self.io.apb.PENABLE = Bit(0)
             self.set_psel(Bit(0))
+            self.busy = False
+            if self.monitors:
+                self.notify(slave_id, address, APBCommand.WRITE, data,
+                            wait_states, strobe)
 
         def read(self, address, data):
+            self.busy = True
+            slave_id = self.io.request.slave_id
             self.io.apb.PADDR = address
+            # PSTRB must be low for reads
+            self.io.apb.PSTRB = BitVector[len(self.io.apb.PSTRB)](0)
             self.set_psel(Bit(1))
             self.io.apb.PWRITE = Bit(0)
             yield
             self.io.apb.PENABLE = Bit(1)
             yield
+            wait_states = 0
             while not self.io.apb.PREADY:
                 # TODO: Insert timeout logic
+                wait_states += 1
                 yield
             self.io.apb.PENABLE = Bit(0)
             self.set_psel(Bit(0))
+            self.busy = False
+            if self.monitors:
+                self.notify(slave_id, address, APBCommand.READ,
+                            self.io.apb.PRDATA, wait_states)
 
             # TODO: Handle PSLVERR and checking the expected data
     return APBBus()
 
 
+class APBSlaveModel:
+    """
+    Cycle-accurate model of the APB front-end of `RegisterFileGenerator`
+    backed by the list of register `values`
+
+    Call after the bus has driven the current cycle to set PREADY and PRDATA
+    (the slave has no wait states) and advance to the next cycle, where the
+    register written in the ACCESS phase takes its new value.  `values` can
+    be modified between calls to model hardware updates.
+    """
+    def __init__(self, data_width, values, slave_id=0):
+        self.data_width = data_width
+        self.values = list(values)
+        self.slave_id = slave_id
+
+    def __call__(self, io):
+        apb = io.apb
+        selected = getattr(apb, f"PSEL{self.slave_id}") and apb.PENABLE
+        address = int(apb.PADDR)
+        in_range = address < len(self.values)
+        is_write = bool(selected and apb.PWRITE) and in_range
+        is_read = bool(selected and not apb.PWRITE)
+        apb.PREADY = Bit(is_write or is_read)
+        apb.PRDATA = BitVector[self.data_width](
+            self.values[address] if in_range else 0)
+        # Clock edge
+        if is_write:
+            self.values[address] = apply_strobe(
+                self.values[address], apb.PWDATA, apb.PSTRB, self.data_width)
+
+
+class APBPortBinding:
+    """
+    Resolves the APB inputs of the circuit under test driven by `bus` once
+    so each cycle only has to poke the precomputed list of ports
+
+    Use `bind_apb_inputs` to get the binding for a (tester, bus) pair
+
+    Subclasses can bind other bus interfaces by overriding `interface` (the
+    name of the port of the circuit and of the field of `bus.io`) and
+    `clock_ports`
+    """
+    interface = "apb"
+    clock_ports = ("PCLK", "PRESETn")
+
+    def __init__(self, tester, bus):
+        self.tester = tester
+        self.bus = bus
+        port = getattr(tester._circuit, self.interface)
+        # Skip clock signals and the outputs of the circuit
+        self.ports = tuple(
+            (key, port[key]) for key in port.keys()
+            if key not in self.clock_ports and port[key].is_output()
+        )
+
+    def drive(self):
+        """
+        Poke the current value of each bound field of `bus.io.<interface>`
+        """
+        values = getattr(self.bus.io, self.interface)
+        poke = self.tester.poke
+        for key, port in self.ports:
+            poke(port, getattr(values, key))
+
+    def step(self):
+        self.drive()
+        self.tester.step(2)
+
+    def drive_cycles(self, frames):
+        """
+        Append the actions for a batch of cycles at once, where `frames` is
+        an iterable of dictionaries mapping field names to values (one
+        dictionary per cycle)
+        """
+        poke = self.tester.poke
+        for frame in frames:
+            for key, port in self.ports:
+                poke(port, frame[key])
+            self.tester.step(2)
+
+    def hold(self):
+        """
+        Advance a cycle without changing the driven values
+        """
+        self.tester.step(2)
+
+    def idle(self, cycles):
+        """
+        Drive the current values and advance `cycles` cycles with a single
+        step action
+        """
+        if cycles < 1:
+            raise ValueError(f"Expected at least one idle cycle, got "
+                             f"{cycles}")
+        self.drive()
+        self.tester.step(2 * cycles)
+
+    def expect(self, key, value):
+        self.tester.expect(
+            getattr(self.tester._circuit, self.interface)[key], value)
+
+
+class StimulusTable(APBPortBinding):
+    """
+    Port binding that records the values driven in each cycle in a table
+    instead of appending poke and step actions to the tester
+
+    Creating a `StimulusTable` installs it as the binding of (tester, bus), so
+    the `step`/`write`/`read` helpers record into it.  `replay` then writes
+    the table to one file per port and appends a fixed loop that reads a row
+    per cycle, so the size of the generated testbench does not depend on the
+    number of transfers.  Expectations are recorded with their cycle number
+    and checked against the simulation trace with `check_trace`.
+
+    While the table is installed, the test should not append other actions
+    to the tester, since they would not be ordered with the recorded cycles
+    """
+    def __init__(self, tester, bus):
+        super().__init__(tester, bus)
+        fields = bus.IO.field_dict[self.interface].field_dict
+        self.widths = tuple(
+            fields[key].size if issubclass(fields[key], BitVector)
+            else 1
+            for key, _ in self.ports
+        )
+        self.frames = []
+        self.expects = []
+        self.current = None
+        # Clock cycles already in the tester's action list, so expectations
+        # can be matched with the cycles of the trace
+        self.offset = sum(getattr(action, "steps", 0)
+                          for action in tester.actions) // 2
+        _bindings.setdefault(tester, {})[id(bus)] = self
+
+    def drive(self):
+        values = getattr(self.bus.io, self.interface)
+        self.current = tuple(int(getattr(values, key))
+                             for key, _ in self.ports)
+
+    def step(self):
+        self.drive()
+        self.frames.append(self.current)
+
+    def drive_cycles(self, frames):
+        for frame in frames:
+            self.current = tuple(int(frame[key]) for key, _ in self.ports)
+            self.frames.append(self.current)
+
+    def hold(self):
+        if self.current is None:
+            self.drive()
+        self.frames.append(self.current)
+
+    def idle(self, cycles):
+        if cycles < 1:
+            raise ValueError(f"Expected at least one idle cycle, got "
+                             f"{cycles}")
+        # The table has a row per cycle
+        self.drive()
+        self.frames.extend([self.current] * cycles)
+
+    def expect(self, key, value):
+        self.expects.append((self.offset + len(self.frames), key,
+                             int(value)))
+
+    def replay(self, directory="build"):
+        """
+        Write the table to `directory` and append the loop replaying it to
+        the tester, uninstalling the table
+        """
+        files = []
+        columns = zip(self.ports, self.widths)
+        for column, ((key, port), width) in enumerate(columns):
+            chunk_size = (width + 7) // 8
+            file_name = os.path.abspath(os.path.join(
+                directory, f"{self.tester._circuit.name}_{key}.raw"))
+            with open(file_name, "wb") as f:
+                f.write(b"".join(frame[column].to_bytes(chunk_size, "little")
+                                 for frame in self.frames))
+            files.append(self.tester.file_open(file_name, "r",
+                                               chunk_size=chunk_size))
+
+        loop = self.tester.loop(len(self.frames))
+        for (key, port), file in zip(self.ports, files):
+            loop.poke(port, loop.file_read(file))
+        loop.step(2)
+        for file in files:
+            self.tester.file_close(file)
+
+        bindings = _bindings[self.tester]
+        if bindings.get(id(self.bus)) is self:
+            del bindings[id(self.bus)]
+
+    def check_trace(self, file_name):
+        """
+        Check the recorded expectations against the VCD file `file_name`,
+        raising an AssertionError listing the mismatches
+        """
+        from vcd import VCD
+        prefix = self.interface + "_"
+        keys = sorted({key for _, key, _ in self.expects})
+        samples = VCD.load(file_name).sample(
+            prefix + self.clock_ports[0], [prefix + key for key in keys])
+        errors = []
+        for cycle, key, value in self.expects:
+            actual = samples[cycle - 1][keys.index(key)]
+            if actual != value:
+                errors.append(f"cycle {cycle}: {key} was {hex(actual)}, "
+                              f"expected {hex(value)}")
+        if errors:
+            raise AssertionError("\n".join(errors))
+
+
+_bindings = weakref.WeakKeyDictionary()
+
+
+def bind_apb_inputs(tester, bus, binding_cls=APBPortBinding):
+    """
+    Returns the port binding for `tester` and `bus`, creating it (as a
+    `binding_cls`) on first use
+    """
+    bindings = _bindings.setdefault(tester, {})
+    binding = bindings.get(id(bus))
+    if binding is None or binding.bus is not bus:
+        binding = bindings[id(bus)] = binding_cls(tester, bus)
+    return binding
+
+
 def set_apb_inputs(tester, bus):
-    for key in tester._circuit.apb.keys():
-        # Skip clock signals
-        if key in ["PCLK", "PRESETn"]:
-            continue
-        if tester._circuit.apb[key].is_output():
-            setattr(tester.circuit.apb, key,
-                    getattr(bus.io.apb, key))
+    bind_apb_inputs(tester, bus).drive()
 
 
-def make_request(addr, data, addr_width, data_width, num_slaves=1, slave_id=0):
+def make_request(addr, data, addr_width, data_width, num_slaves=1, slave_id=0,
+                 strobe=None):
+    """
+    `strobe` selects the byte lanes updated by a write, defaults to all lanes
+    """
+    strobe_width = math.ceil(data_width / 8)
+    if strobe is None:
+        strobe = (1 << strobe_width) - 1
     request = Request(addr_width, data_width, num_slaves)(
         APBCommand.IDLE, BitVector[addr_width](addr),
         BitVector[data_width](data),
-        BitVector[max(math.ceil(math.log2(num_slaves)), 1)](slave_id))
+        BitVector[slave_id_width(num_slaves)](slave_id),
+        BitVector[strobe_width](strobe))
 
     # Specialized instance of APB for addr/data width
     _APB = APB(addr_width, data_width, num_slaves)
@@ -176,11 +535,27 @@ def make_request(addr, data, addr_width, data_width, num_slaves=1, slave_id=0):
 
 def step(bus, io, tester):
     bus(io)
-    set_apb_inputs(tester, bus)
-    tester.step(2)
+    bind_apb_inputs(tester, bus).step()
 
 
-def write(bus, io, request, tester, addr, data):
+def idle(bus, io, tester, cycles):
+    """
+    Advance `bus` and `tester` by `cycles` idle cycles, appending a single
+    step action
+    """
+    bus.idle(io, cycles)
+    bind_apb_inputs(tester, bus).idle(cycles)
+
+
+def write(bus, io, request, tester, addr, data, check=True):
+    """
+    Append the actions for an APB write of `data` to `addr`
+
+    `check=False` skips the `expect` actions on PREADY, e.g. when the
+    transfers are checked by a `scoreboard.Scoreboard` after simulation
+    """
+    binding = bind_apb_inputs(tester, bus)
+
     # Test idle state
     step(bus, io, tester)
 
@@ -194,15 +569,25 @@ def write(bus, io, request, tester, addr, data):
     io.apb.PREADY = Bit(1)
     step(bus, io, tester)
 
-    tester.circuit.apb.PREADY.expect(1)
+    if check:
+        binding.expect("PREADY", 1)
 
     step(bus, io, tester)
 
-    tester.circuit.apb.PREADY.expect(0)
-    tester.step(2)
+    if check:
+        binding.expect("PREADY", 0)
+    binding.hold()
+
 
+def read(bus, io, request, tester, addr, data, check=True):
+    """
+    Append the actions for an APB read of `addr`, expecting `data` on PRDATA
+
+    `check=False` skips the `expect` actions on PREADY and PRDATA, e.g. when
+    the transfers are checked by a `scoreboard.Scoreboard` after simulation
+    """
+    binding = bind_apb_inputs(tester, bus)
 
-def read(bus, io, request, tester, addr, data):
     # Send request
     request.command = APBCommand.READ
     step(bus, io, tester)
@@ -213,9 +598,11 @@ def read(bus, io, request, tester, addr, data):
     io.apb.PREADY = Bit(1)
     step(bus, io, tester)
 
-    tester.circuit.apb.PREADY.expect(1)
-    tester.circuit.apb.PRDATA.expect(data)
+    if check:
+        binding.expect("PREADY", 1)
+        binding.expect("PRDATA", data)
     step(bus, io, tester)
 
-    tester.circuit.apb.PREADY.expect(0)
-    tester.step(2)
+    if check:
+        binding.expect("PREADY", 0)
+    binding.hold()
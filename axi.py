@@ -0,0 +1,74 @@
+import math
+import magma as m
+
+
+def AXI4LiteBase(addr_width: int, data_width: int):
+    """
+    Constructs a dictionary mapping port names to magma types
+
+    Used to construct the master and slave variants of the AXI4-Lite
+    interface
+
+    Parametrized by width of the address and data bus
+    """
+    return {
+        "ACLK"   : m.Out(m.Clock),
+        "ARESETn": m.Out(m.Reset),
+        # Write address channel
+        "AWADDR" : m.Out(m.Bits[addr_width]),
+        "AWPROT" : m.Out(m.Bits[3]),
+        "AWVALID": m.Out(m.Bit),
+        "AWREADY": m.In(m.Bit),
+        # Write data channel, one write strobe bit for each byte of the data
+        # bus
+        "WDATA"  : m.Out(m.Bits[data_width]),
+        "WSTRB"  : m.Out(m.Bits[math.ceil(data_width / 8)]),
+        "WVALID" : m.Out(m.Bit),
+        "WREADY" : m.In(m.Bit),
+        # Write response channel
+        "BRESP"  : m.In(m.Bits[2]),
+        "BVALID" : m.In(m.Bit),
+        "BREADY" : m.Out(m.Bit),
+        # Read address channel
+        "ARADDR" : m.Out(m.Bits[addr_width]),
+        "ARPROT" : m.Out(m.Bits[3]),
+        "ARVALID": m.Out(m.Bit),
+        "ARREADY": m.In(m.Bit),
+        # Read data channel
+        "RDATA"  : m.In(m.Bits[data_width]),
+        "RRESP"  : m.In(m.Bits[2]),
+        "RVALID" : m.In(m.Bit),
+        "RREADY" : m.Out(m.Bit),
+    }
+
+
+def AXI4LiteMaster(addr_width: int, data_width: int):
+    """
+    Constructs the master variant of the AXI4-Lite interface using
+    AXI4LiteBase
+
+    Parametrized by the width of the address and data bus
+    """
+    check_data_width(data_width)
+    return m.Product.from_fields("AXI4LiteMaster",
+                                 AXI4LiteBase(addr_width, data_width))
+
+
+def AXI4LiteSlave(addr_width: int, data_width: int):
+    """
+    Constructs the slave variant of the AXI4-Lite interface using
+    AXI4LiteBase
+
+    Parametrized by the width of the address and data bus
+    """
+    check_data_width(data_width)
+    # Note the use of `flip()` to return the inverse of the type created by
+    # AXI4LiteBase
+    return m.Product.from_fields("AXI4LiteSlave",
+                                 AXI4LiteBase(addr_width, data_width)).flip()
+
+
+def check_data_width(data_width: int):
+    if data_width not in [32, 64]:
+        raise ValueError("AXI4-Lite specifies that the data bus is either "
+                         "32 or 64 bits wide")
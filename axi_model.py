@@ -0,0 +1,199 @@
+import math
+from collections import deque
+from hwtypes import Product, Bit, BitVector
+from apb_model import APBCommand, APBPortBinding, apply_strobe, \
+    bind_apb_inputs, canonicalize_args, default_instance
+from functools import lru_cache
+
+
+@canonicalize_args
+@lru_cache(maxsize=None)
+def AXI4Lite(addr_width, data_width):
+    strobe_width = math.ceil(data_width / 8)
+
+    fields = {
+        "AWADDR": BitVector[addr_width],
+        "AWPROT": BitVector[3],
+        "AWVALID": Bit,
+        "AWREADY": Bit,
+        "WDATA": BitVector[data_width],
+        "WSTRB": BitVector[strobe_width],
+        "WVALID": Bit,
+        "WREADY": Bit,
+        "BRESP": BitVector[2],
+        "BVALID": Bit,
+        "BREADY": Bit,
+        "ARADDR": BitVector[addr_width],
+        "ARPROT": BitVector[3],
+        "ARVALID": Bit,
+        "ARREADY": Bit,
+        "RDATA": BitVector[data_width],
+        "RRESP": BitVector[2],
+        "RVALID": Bit,
+        "RREADY": Bit,
+    }
+
+    return type("_AXI4Lite", (Product, ), fields)
+
+
+@canonicalize_args
+@lru_cache(maxsize=None)
+def AXI4LiteBusIO(addr_width, data_width):
+    class IO(Product):
+        axi = AXI4Lite(addr_width, data_width)
+    return IO
+
+
+def make_axi4lite_io(addr_width, data_width):
+    _AXI4Lite = AXI4Lite(addr_width, data_width)
+    return AXI4LiteBusIO(addr_width, data_width)(
+        default_instance(_AXI4Lite))
+
+
+class AXI4LiteBus:
+    """
+    Cycle-accurate model of an AXI4-Lite master
+
+    Unlike `APBBus`, transfers are queued with `write`/`read` and issued
+    back to back: a new address is presented as soon as the previous one is
+    accepted, so several transfers can be outstanding and, against a slave
+    that is always ready, one transfer completes per cycle on each of the
+    read and write channels.  BREADY and RREADY are held high.
+
+    Calling the bus with `io` first processes the handshakes of the previous
+    cycle (using the slave outputs set in `io` for that cycle) and then
+    drives the master outputs for the current cycle.  Bus monitors are
+    called like those of `APBBus`, with the number of cycles the address was
+    stalled as the wait states.
+    """
+    def __init__(self, addr_width, data_width):
+        self.IO = AXI4LiteBusIO(addr_width, data_width)
+        self.addr_width = addr_width
+        self.data_width = data_width
+        self.strobe_width = math.ceil(data_width / 8)
+        self.writes = deque()
+        self.reads = deque()
+        # Transfers whose address has been accepted, waiting for a response
+        self.write_responses = deque()
+        self.read_responses = deque()
+        self.aw_done = False
+        self.w_done = False
+        self.aw_stalls = 0
+        self.ar_stalls = 0
+        self.monitors = []
+
+    def write(self, address, data, strobe=None):
+        if strobe is None:
+            strobe = (1 << self.strobe_width) - 1
+        self.writes.append((address, data, strobe))
+
+    def read(self, address):
+        self.reads.append(address)
+
+    @property
+    def idle(self):
+        return not (self.writes or self.reads or self.write_responses or
+                    self.read_responses)
+
+    def add_monitor(self, monitor):
+        self.monitors.append(monitor)
+
+    def remove_monitor(self, monitor):
+        self.monitors.remove(monitor)
+
+    def notify(self, address, command, data, wait_states, strobe=None):
+        for monitor in self.monitors:
+            monitor(0, address, command, data, wait_states, strobe)
+
+    def __call__(self, io):
+        self.io = io
+        axi = io.axi
+
+        # Handshakes of the previous cycle
+        if axi.AWVALID and axi.AWREADY:
+            self.aw_done = True
+        elif axi.AWVALID:
+            self.aw_stalls += 1
+        if axi.WVALID and axi.WREADY:
+            self.w_done = True
+        if self.aw_done and self.w_done:
+            self.write_responses.append(self.writes.popleft() +
+                                        (self.aw_stalls, ))
+            self.aw_done = self.w_done = False
+            self.aw_stalls = 0
+        if axi.BVALID and axi.BREADY:
+            address, data, strobe, stalls = self.write_responses.popleft()
+            self.notify(address, APBCommand.WRITE, data, stalls, strobe)
+        if axi.ARVALID and axi.ARREADY:
+            self.read_responses.append((self.reads.popleft(),
+                                        self.ar_stalls))
+            self.ar_stalls = 0
+        elif axi.ARVALID:
+            self.ar_stalls += 1
+        if axi.RVALID and axi.RREADY:
+            address, stalls = self.read_responses.popleft()
+            self.notify(address, APBCommand.READ, axi.RDATA, stalls)
+
+        # Drive the current cycle
+        Address = BitVector[self.addr_width]
+        if self.writes:
+            address, data, strobe = self.writes[0]
+            axi.AWADDR = Address(address)
+            axi.WDATA = BitVector[self.data_width](data)
+            axi.WSTRB = BitVector[self.strobe_width](strobe)
+        axi.AWVALID = Bit(bool(self.writes) and not self.aw_done)
+        axi.WVALID = Bit(bool(self.writes) and not self.w_done)
+        if self.reads:
+            axi.ARADDR = Address(self.reads[0])
+        axi.ARVALID = Bit(bool(self.reads))
+        axi.BREADY = Bit(1)
+        axi.RREADY = Bit(1)
+
+
+class AXI4LiteSlaveModel:
+    """
+    Cycle-accurate model of the AXI4-Lite front-end of
+    `RegisterFileGenerator` (with `interface="axi4lite"`) backed by the list
+    of register `values`
+
+    Call after the master has driven the current cycle to set the slave
+    outputs and advance to the next cycle
+    """
+    def __init__(self, data_width, values):
+        self.data_width = data_width
+        self.values = list(values)
+        self.bvalid = False
+        self.rvalid = False
+        self.rdata = 0
+
+    def __call__(self, io):
+        axi = io.axi
+        axi.BVALID = Bit(self.bvalid)
+        axi.RVALID = Bit(self.rvalid)
+        axi.RDATA = BitVector[self.data_width](self.rdata)
+
+        is_write = bool(axi.AWVALID and axi.WVALID and
+                        (not self.bvalid or axi.BREADY))
+        is_read = bool(axi.ARVALID and (not self.rvalid or axi.RREADY))
+        axi.AWREADY = Bit(is_write)
+        axi.WREADY = Bit(is_write)
+        axi.ARREADY = Bit(is_read)
+
+        # Clock edge
+        if is_read:
+            self.rdata = self.values[int(axi.ARADDR)]
+        if is_write:
+            address = int(axi.AWADDR)
+            self.values[address] = apply_strobe(
+                self.values[address], axi.WDATA, axi.WSTRB, self.data_width)
+        self.bvalid = is_write or (self.bvalid and not axi.BREADY)
+        self.rvalid = is_read or (self.rvalid and not axi.RREADY)
+
+
+class AXI4LitePortBinding(APBPortBinding):
+    interface = "axi"
+    clock_ports = ("ACLK", "ARESETn")
+
+
+def bind_axi_inputs(tester, bus):
+    return bind_apb_inputs(tester, bus, AXI4LitePortBinding)
@@ -0,0 +1,144 @@
+"""
+Throughput benchmark of the APB model and waveform layer
+
+Drives `APBBus` (through `traffic.play`), `WaveForm.step`,
+`WaveForm.to_wavejson` and `make_request` through fixed scenarios and
+compares the results with the baseline stored in bench_baseline.json.
+
+Usage: python bench_apb_model.py [--transfers 2000] [--threshold 0.3]
+                                 [--update-baseline]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from apb_model import APBBus, make_request
+from traffic import TrafficGenerator, play
+from waveform import WaveForm
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "bench_baseline.json")
+ADDR_WIDTH = 8
+DATA_WIDTH = 32
+
+# TrafficGenerator parameters of each scenario
+SCENARIOS = {
+    "idle_heavy": {"max_idle_cycles": 32},
+    "write_heavy": {"write_ratio": 1.0},
+    "wait_state_heavy": {"wait_probability": 1.0, "max_wait_states": 8},
+    "multi_slave": {"num_slaves": 4},
+}
+
+# Metrics where a larger value is a regression
+LOWER_IS_BETTER = {"retained_bytes_per_cycle", "peak_bytes"}
+
+
+def timed(f, *args, **kwargs):
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_scenario(params, num_transfers):
+    num_slaves = params.get("num_slaves", 1)
+    transfers = list(TrafficGenerator(ADDR_WIDTH, DATA_WIDTH, seed=0,
+                                      **params).take(num_transfers))
+    bus = APBBus(ADDR_WIDTH, DATA_WIDTH, num_slaves)
+
+    def run(on_cycle=None, on_idle=None):
+        io, _ = make_request(0, 0, ADDR_WIDTH, DATA_WIDTH, num_slaves)
+        return play(bus, io, transfers, on_cycle=on_cycle, on_idle=on_idle)
+
+    cycles, model_time = timed(run)
+
+    fields = [field for field in bus.IO.field_dict["apb"].field_dict]
+    waveform = WaveForm(fields, clock_name="PCLK")
+    _, waveform_time = timed(
+        run, lambda io: waveform.step(io.apb),
+        lambda io, cycles: waveform.step(io.apb, cycles))
+    _, wavejson_time = timed(waveform.to_wavejson)
+
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    run()
+    end, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "model_cycles_per_s": cycles / model_time,
+        # Model and waveform capture together
+        "waveform_cycles_per_s": cycles / waveform_time,
+        "wavejson_cycles_per_s": cycles / wavejson_time,
+        "retained_bytes_per_cycle": max(end - start, 0) / cycles,
+        "peak_bytes": peak - start,
+    }
+
+
+def bench_make_request(calls):
+    def run():
+        for i in range(calls):
+            make_request(i % (1 << ADDR_WIDTH), i, ADDR_WIDTH, DATA_WIDTH)
+    _, elapsed = timed(run)
+    return {"calls_per_s": calls / elapsed}
+
+
+def run_benchmarks(num_transfers):
+    results = {name: bench_scenario(params, num_transfers)
+               for name, params in SCENARIOS.items()}
+    results["make_request"] = bench_make_request(num_transfers)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns a description of each metric of `results` that regressed by more
+    than `threshold` (a fraction) relative to `baseline`
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            expected = baseline.get(name, {}).get(metric)
+            if expected is None:
+                continue
+            if metric in LOWER_IS_BETTER:
+                regressed = value > expected * (1 + threshold)
+            else:
+                regressed = value < expected * (1 - threshold)
+            if regressed:
+                regressions.append(f"{name}.{metric}: {value:.1f} (baseline "
+                                   f"{expected:.1f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transfers", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=0.3,
+                        help="Allowed regression relative to the baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.transfers)
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            print(f"{name:>18} {metric:>26} {value:>14.1f}")
+
+    if args.update_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        return
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print("Regression:", regression)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark of Verilog generation time of the register file versus the number
+of registers, through magma and CoreIR and through `reg_file_verilog`
+
+Usage: python bench_reg_file_verilog.py [--regs 64 512 4096]
+                                        [--data-width 32] [--no-coreir]
+"""
+import argparse
+import os
+import time
+import magma as m
+from reg_file import RegisterFileGenerator
+from reg_file_verilog import write_verilog
+from register import Register
+
+
+def make_regs(num_regs):
+    # Alternate the access modes so every kind of register logic is emitted
+    modes = ("rw", "hw", "ro", "wo")
+    return tuple(Register(f"reg_{i}", access=modes[i % len(modes)])
+                 for i in range(num_regs))
+
+
+# The outputs are named after the register count, the generator names of
+# large register files are a digest
+def bench_coreir(regs, data_width, directory):
+    start = time.perf_counter()
+    circuit = RegisterFileGenerator(regs, data_width)
+    elaborate = time.perf_counter() - start
+
+    start = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    m.compile(os.path.join(directory, f"RegFile{len(regs)}"), circuit,
+              output="coreir-verilog")
+    compile_ = time.perf_counter() - start
+    return elaborate, compile_
+
+
+def bench_direct(regs, data_width, directory):
+    start = time.perf_counter()
+    write_verilog(directory, regs, data_width, name=f"RegFile{len(regs)}")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--regs", type=int, nargs="+",
+                        default=[64, 512, 4096])
+    parser.add_argument("--data-width", type=int, default=32)
+    parser.add_argument("--no-coreir", action="store_true",
+                        help="only benchmark the direct emitter")
+    parser.add_argument("-o", "--directory", default="build/bench_verilog")
+    args = parser.parse_args()
+
+    print(f"{'regs':>6} {'elaborate (s)':>14} {'coreir (s)':>11} "
+          f"{'direct (s)':>11} {'speedup':>8}")
+    for num_regs in args.regs:
+        regs = make_regs(num_regs)
+        direct = bench_direct(regs, args.data_width,
+                              os.path.join(args.directory, "direct"))
+        if args.no_coreir:
+            print(f"{num_regs:>6} {'':>14} {'':>11} {direct:>11.3f}")
+            continue
+        elaborate, compile_ = bench_coreir(
+            regs, args.data_width, os.path.join(args.directory, "coreir"))
+        speedup = (elaborate + compile_) / direct
+        print(f"{num_regs:>6} {elaborate:>14.3f} {compile_:>11.3f} "
+              f"{direct:>11.3f} {speedup:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark of verilator build and simulation time of `TopGenerator` versus the
+number of DMAs and verilator threads
+
+Usage: python bench_verilator.py [--dmas 2 16 64] [--threads 1 2 4]
+                                 [--cycles 1000000] [--mode pack]
+"""
+import argparse
+import time
+import numpy as np
+from harness import verilator_flags
+from sim import VerilatorSim
+from top import TopGenerator
+
+
+def stimulus(sim, cycles, seed=0):
+    """
+    Back to back APB writes (setup and access phase) of random data to random
+    addresses of random slaves
+    """
+    rng = np.random.default_rng(seed)
+    transfers = cycles // 2
+    psels = [port for port in sim.inputs if port.startswith("apb_PSEL")]
+    slave = rng.integers(len(psels), size=transfers)
+    inputs = {
+        "apb_PRESETn": np.ones(cycles, dtype=np.uint8),
+        "apb_PWRITE": np.ones(cycles, dtype=np.uint8),
+        "apb_PENABLE": np.tile(np.array([0, 1], dtype=np.uint8), transfers),
+        "apb_PADDR": np.repeat(rng.integers(1 << sim.widths["apb_PADDR"],
+                                            size=transfers, dtype=np.uint8),
+                               2),
+        "apb_PWDATA": np.repeat(rng.integers(1 << 32, size=transfers,
+                                             dtype=np.uint32), 2),
+        "apb_PSTRB": np.full(cycles, 0xF, dtype=np.uint8),
+    }
+    for i, psel in enumerate(psels):
+        inputs[psel] = np.repeat((slave == i).astype(np.uint8), 2)
+    return inputs
+
+
+def bench(mode, num_dmas, threads, cycles):
+    start = time.perf_counter()
+    Top = TopGenerator(mode=mode, num_dmas=num_dmas)
+    elaborate = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sim = VerilatorSim(Top, directory=f"build/bench_{threads}",
+                       flags=verilator_flags(threads, trace=False))
+    build = time.perf_counter() - start
+
+    inputs = stimulus(sim, cycles)
+    start = time.perf_counter()
+    sim.run(inputs, outputs=["apb_PREADY"])
+    simulate = time.perf_counter() - start
+    sim.close()
+    return elaborate, build, simulate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", default="pack",
+                        choices=["pack", "distribute"])
+    parser.add_argument("--dmas", type=int, nargs="+", default=[2, 16, 64])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--cycles", type=int, default=1000000)
+    args = parser.parse_args()
+
+    print(f"{'dmas':>6} {'threads':>8} {'elaborate (s)':>14} "
+          f"{'build (s)':>10} {'simulate (s)':>13} {'cycles/s':>12}")
+    for num_dmas in args.dmas:
+        for threads in args.threads:
+            elaborate, build, simulate = bench(args.mode, num_dmas, threads,
+                                               args.cycles)
+            print(f"{num_dmas:>6} {threads:>8} {elaborate:>14.2f} "
+                  f"{build:>10.2f} {simulate:>13.2f} "
+                  f"{args.cycles / simulate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
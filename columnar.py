@@ -0,0 +1,230 @@
+"""
+Columnar on-disk traces
+
+A trace is a directory holding one NumPy array file per signal (one element
+per cycle) and a `trace.json` with the number of cycles and the width of each
+signal.  The arrays are memory-mapped, so traces of tens of millions of
+cycles are written, loaded and compared without reading them into memory.
+
+Traces are produced from the model (`from_waveform`, e.g. a `WaveForm`
+captured from `APBBus`) and from the RTL (`from_vcd`, a verilator `--trace`
+dump), and compared with `compare`.
+"""
+import json
+import os
+from typing import NamedTuple
+import numpy as np
+from hwtypes import BitVector, Bit
+from waveform import Run
+
+
+METADATA = "trace.json"
+
+
+def column_shape(width, cycles):
+    """
+    Returns the dtype and shape of the array storing `cycles` samples of a
+    signal of `width` bits, signals wider than 64 bits are stored as rows of
+    64 bit words (least significant first)
+    """
+    for bits, dtype in ((8, np.uint8), (16, np.uint16), (32, np.uint32),
+                        (64, np.uint64)):
+        if width <= bits:
+            return np.dtype(dtype), (cycles,)
+    return np.dtype(np.uint64), (cycles, (width + 63) // 64)
+
+
+def to_words(value, words):
+    return [(value >> (64 * i)) & ((1 << 64) - 1) for i in range(words)]
+
+
+class Divergence(NamedTuple):
+    cycle: int
+    expected: int
+    actual: int
+
+
+class Trace:
+    """
+    A trace stored in `directory`, `trace[signal]` is the read-only
+    memory-mapped array of `signal`
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, METADATA)) as f:
+            metadata = json.load(f)
+        self.cycles = metadata["cycles"]
+        self.widths = metadata["widths"]
+        self._columns = {}
+
+    @classmethod
+    def create(cls, directory, widths, cycles):
+        """
+        Create an empty (zero-filled) trace of `cycles` cycles with a signal
+        of each width of the `widths` dict, returns the trace and a dict of
+        writable memory-mapped arrays (flushed when deleted)
+        """
+        os.makedirs(directory, exist_ok=True)
+        columns = {}
+        for signal, width in widths.items():
+            dtype, shape = column_shape(width, cycles)
+            columns[signal] = np.lib.format.open_memmap(
+                os.path.join(directory, signal + ".npy"), mode="w+",
+                dtype=dtype, shape=shape)
+        with open(os.path.join(directory, METADATA), "w") as f:
+            json.dump({"cycles": cycles, "widths": widths}, f)
+        return cls(directory), columns
+
+    @property
+    def signals(self):
+        return list(self.widths)
+
+    def __getitem__(self, signal):
+        if signal not in self.widths:
+            raise KeyError(f"Signal {signal} not found in trace")
+        if signal not in self._columns:
+            self._columns[signal] = np.load(
+                os.path.join(self.directory, signal + ".npy"), mmap_mode="r")
+        return self._columns[signal]
+
+    def value(self, signal, cycle):
+        """
+        Returns the value of `signal` in `cycle` as an `int`
+        """
+        sample = self[signal][cycle]
+        if np.ndim(sample):
+            return sum(int(word) << (64 * i) for i, word in enumerate(sample))
+        return int(sample)
+
+
+def sample_value(value):
+    if isinstance(value, Bit):
+        return int(bool(value))
+    if isinstance(value, BitVector):
+        return value.as_uint()
+    return int(value)
+
+
+def sample_width(value):
+    if isinstance(value, Bit):
+        return 1
+    if isinstance(value, BitVector):
+        return value.size
+    return max(int(value).bit_length(), 1)
+
+
+def from_waveform(waveform, directory, widths=None):
+    """
+    Write the samples of `waveform` (a `WaveForm`, without its clock) to a
+    trace in `directory`, `Run`s are written as a single slice assignment
+
+    The width of each signal is taken from `widths` if provided, otherwise
+    from its first sample (`BitVector` and `Bit` samples carry their width)
+    """
+    fields = [field for field in waveform if field != waveform.clock_name]
+    if widths is None:
+        widths = {}
+        for field in fields:
+            entries = waveform[field]
+            first = entries[0].value if entries and \
+                isinstance(entries[0], Run) else (entries[0] if entries else 0)
+            widths[field] = sample_width(first)
+    cycles = max((sum(entry.cycles if isinstance(entry, Run) else 1
+                      for entry in waveform[field]) for field in fields),
+                 default=0)
+    trace, columns = Trace.create(directory, {field: widths[field]
+                                              for field in fields}, cycles)
+    for field in fields:
+        column = columns[field]
+        wide = column.ndim == 2
+        cycle = 0
+        for entry in waveform[field]:
+            length = 1
+            if isinstance(entry, Run):
+                entry, length = entry
+            value = sample_value(entry)
+            if wide:
+                value = to_words(value, column.shape[1])
+            column[cycle:cycle + length] = value
+            cycle += length
+        column.flush()
+    return trace
+
+
+def from_vcd(vcd, clock, signals, directory):
+    """
+    Write the values of `signals` at each rising edge of `clock` in `vcd` (a
+    `vcd.VCD`, see `VCD.sample` for the sampling semantics) to a trace in
+    `directory`
+
+    `signals` is a list of VCD signal names (see `VCD.find`) or a dict
+    mapping the names of the trace signals to VCD signal names, e.g.
+    `{"PADDR": "apb_PADDR"}` to compare with a `WaveForm` of `io.apb`
+    """
+    if not isinstance(signals, dict):
+        signals = {signal: signal for signal in signals}
+    clock_changes = np.array(vcd.changes[vcd.find(clock)],
+                             dtype=np.int64).reshape(-1, 2)
+    times, values = clock_changes[:, 0], clock_changes[:, 1]
+    rising = (values[1:] == 1) & (values[:-1] == 0)
+    edges = times[1:][rising]
+    if len(times) and values[0] and times[0]:
+        edges = np.concatenate([times[:1], edges])
+
+    ids = {signal: vcd.find(name) for signal, name in signals.items()}
+    trace, columns = Trace.create(
+        directory, {signal: vcd.widths[id_] for signal, id_ in ids.items()},
+        len(edges))
+    for signal, id_ in ids.items():
+        changes = vcd.changes[id_]
+        column = columns[signal]
+        change_times = np.array([time for time, _ in changes],
+                                dtype=np.int64)
+        # Index of the last change at or before each edge
+        index = np.searchsorted(change_times, edges, side="right") - 1
+        if column.ndim == 2:
+            change_values = np.array(
+                [to_words(value, column.shape[1]) for _, value in changes],
+                dtype=np.uint64).reshape(-1, column.shape[1])
+        else:
+            change_values = np.array([value for _, value in changes],
+                                     dtype=column.dtype)
+        if len(changes):
+            column[:] = change_values[np.maximum(index, 0)]
+            column[index < 0] = 0
+        column.flush()
+    return trace
+
+
+def compare(expected, actual, signals=None, offset=0, chunk=1 << 22):
+    """
+    Compare the `signals` (default the signals of both traces) of the
+    `expected` and `actual` traces cycle by cycle, with cycle `c` of
+    `expected` aligned with cycle `c + offset` of `actual`
+
+    Returns a dict mapping each signal to its first `Divergence` or None,
+    only the cycles present in both traces are compared.  The arrays are
+    compared `chunk` cycles at a time.
+    """
+    if signals is None:
+        signals = [signal for signal in expected.signals
+                   if signal in actual.widths]
+    start = max(-offset, 0)
+    stop = min(expected.cycles, actual.cycles - offset)
+    result = {}
+    for signal in signals:
+        a, b = expected[signal], actual[signal]
+        result[signal] = None
+        for begin in range(start, stop, chunk):
+            end = min(begin + chunk, stop)
+            differs = a[begin:end] != b[begin + offset:end + offset]
+            if differs.ndim == 2:
+                differs = differs.any(axis=1)
+            cycles = np.flatnonzero(differs)
+            if len(cycles):
+                cycle = begin + int(cycles[0])
+                result[signal] = Divergence(
+                    cycle, expected.value(signal, cycle),
+                    actual.value(signal, cycle + offset))
+                break
+    return result
@@ -1,10 +1,72 @@
+import os
+import random
 import pytest
 from magma import clear_cachedFunctions
 import magma.backend.coreir_
+import harness
+import profiling
 
 
-@pytest.fixture(autouse=True)
+def pytest_addoption(parser):
+    parser.addoption("--profile", action="store_true",
+                     help="Record per-phase wall time and peak RSS of each "
+                          "test in build/profile")
+    parser.addoption("--no-result-cache", action="store_true",
+                     help="Verilate and simulate every scenario, even if "
+                          "it passed before unchanged (see "
+                          "harness.ResultCache)")
+
+
+def pytest_configure(config):
+    if config.getoption("--profile"):
+        profiling.instrument()
+        config._profile_session = profiling.Profiler()
+    if config.getoption("--no-result-cache"):
+        harness.CACHE_DIRECTORY = None
+
+
+def pytest_sessionfinish(session):
+    profiler = getattr(session.config, "_profile_session", None)
+    if profiler is not None:
+        profiler.write(os.path.join("build", "profile", "session"))
+
+
+@pytest.fixture(autouse=True, scope="module")
 def magma_test():
+    """
+    Reset magma and the CoreIR context once per test module, so tests of the
+    same module reuse the circuits elaborated and compiled by earlier tests
+    (e.g. the register files shared by the `test_top.py` configurations)
+
+    Generators include all of their parameters in the circuit name (see
+    `reg_file.generator_name`) so circuits of different tests do not collide
+    in the shared context.  A circuit with a fixed name must only be defined
+    once per test module.
+    """
     import magma.config
     clear_cachedFunctions()
     magma.backend.coreir_.CoreIRContextSingleton().reset_instance()
+
+
+@pytest.fixture(autouse=True)
+def seed_random(request):
+    """
+    Seed the random stimulus of each test (e.g. `fault.random`) from its id,
+    so an unchanged test generates the same actions and can hit the result
+    cache of `harness.compile_and_run`
+    """
+    random.seed(request.node.nodeid)
+
+
+@pytest.fixture(autouse=True)
+def profile(request):
+    session = getattr(request.config, "_profile_session", None)
+    if session is None:
+        yield
+        return
+    profiler = profiling.Profiler()
+    with profiling.activate(profiler), profiler.phase("test"):
+        yield
+    name = request.node.nodeid.replace("/", ".").replace("::", ".")
+    profiler.write(os.path.join("build", "profile", name))
+    session.extend(profiler, prefix=(request.node.nodeid, ))
@@ -0,0 +1,309 @@
+"""
+Static cost estimate of elaborated circuits
+
+`estimate` walks the instance hierarchy of an elaborated magma circuit (e.g.
+a `TopGenerator`) and reports the flop bits, mux inputs, comparators and
+gates it instances, along with an estimate of the combinational depth of its
+paths in levels of two-input logic, without compiling or synthesizing it.
+`sweep` compares the two modes of `TopGenerator` over a range of DMA counts,
+elaborating the configurations in a process pool.
+
+Usage: python cost.py [--dmas 1 2 4 8 16] [--jobs N]
+"""
+import argparse
+import concurrent.futures
+import math
+from typing import NamedTuple, Optional
+import magma as m
+from magma.ref import AnonRef, ArrayRef, ConstRef, InstRef, TupleRef
+
+
+COMPARATORS = {"eq", "neq", "ult", "ule", "ugt", "uge", "slt", "sle", "sgt",
+               "sge"}
+GATES = {"and", "or", "xor", "not"}
+REDUCTIONS = {"andr", "orr", "xorr"}
+FLOPS = {"reg", "reg_arst", "dff"}
+
+
+class Cost(NamedTuple):
+    flops: int
+    mux_inputs: int
+    comparators: int
+    gates: int
+    # Estimated levels of two-input logic from the inputs and flops to the
+    # flops (e.g. the APB write decode), from the inputs and flops to the
+    # outputs (e.g. the APB read path), and the worst of the two
+    decode_depth: int
+    read_depth: int
+    critical_depth: int
+
+
+class Timing(NamedTuple):
+    """
+    Combinational depth through a definition, None where there is no path:
+    `comb` from an input to an output, `setup` from an input to a flop,
+    `clk_to_out` from a flop to an output and `internal` between flops
+    """
+    comb: Optional[int]
+    setup: Optional[int]
+    clk_to_out: Optional[int]
+    internal: Optional[int]
+
+
+def _max(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def _add(value, delay):
+    return None if value is None else value + delay
+
+
+def _log2(n):
+    return math.ceil(math.log2(n)) if n > 1 else 0
+
+
+def is_primitive(defn):
+    return not getattr(defn, "instances", None) and \
+        getattr(defn, "coreir_lib", None) in ("coreir", "corebit",
+                                              "commonlib")
+
+
+def primitive_cost(defn):
+    """
+    Returns the counts `(flops, mux_inputs, comparators, gates)` and the
+    `Timing` of a CoreIR primitive
+    """
+    name = defn.coreir_name
+    genargs = getattr(defn, "coreir_genargs", None) or {}
+    width = genargs.get("width", 1)
+    if name in FLOPS:
+        return (width, 0, 0, 0), Timing(None, 0, 0, None)
+    if name == "mux":
+        return (0, 2, 0, 0), Timing(1, None, None, None)
+    if name == "muxn":
+        n = genargs["N"]
+        return (0, n, 0, 0), Timing(_log2(n), None, None, None)
+    if name in COMPARATORS:
+        # Bitwise compare and a reduction tree
+        return (0, 0, 1, 0), Timing(_log2(width) + 1, None, None, None)
+    if name in GATES:
+        return (0, 0, 0, 1), Timing(1, None, None, None)
+    if name in REDUCTIONS:
+        return (0, 0, 0, 1), Timing(_log2(width), None, None, None)
+    # Wiring, constants and terminations
+    return (0, 0, 0, 0), Timing(0, None, None, None)
+
+
+def _root(ref):
+    """
+    Returns the instance owning the port referenced by `ref`, "input" for a
+    port of the enclosing definition and None for constants
+    """
+    while True:
+        if isinstance(ref, InstRef):
+            return ref.inst
+        if isinstance(ref, TupleRef):
+            ref = ref.tuple.name
+        elif isinstance(ref, ArrayRef):
+            ref = ref.array.name
+        elif isinstance(ref, ConstRef):
+            return None
+        else:
+            return "input"
+
+
+def _sources(value):
+    if isinstance(value.name, AnonRef):
+        return set().union(*(_sources(child) for child in value))
+    return {_root(value.name)}
+
+
+def drivers(port):
+    """
+    Returns the set of instances driving (any bit of) the sink `port`, which
+    includes "input" if a port of the enclosing definition drives it
+    """
+    value = port.trace()
+    if value is not None:
+        return _sources(value)
+    if isinstance(port, m.Digital):
+        return set()
+    children = port.values() if isinstance(port, m.Tuple) else list(port)
+    return set().union(*(drivers(child) for child in children))
+
+
+def sinks(port, name=""):
+    """
+    Yields `(name, port)` for the input leaves of `port`, recursing into
+    products and arrays with ports of both directions (e.g. an APB interface)
+    """
+    if port.is_input():
+        yield name, port
+    elif not port.is_output() and not isinstance(port, m.Digital):
+        if isinstance(port, m.Tuple):
+            children = port.items()
+        else:
+            children = enumerate(port)
+        for key, child in children:
+            yield from sinks(child, f"{name}_{key}" if name else str(key))
+
+
+class Estimator:
+    """
+    Estimates the cost of definitions, memoized per definition so the shared
+    definitions of a hierarchy (e.g. the register files of a distributed top)
+    are only analyzed once
+    """
+    def __init__(self):
+        self._costs = {}
+
+    def __call__(self, defn):
+        """
+        Returns the counts `(flops, mux_inputs, comparators, gates)` and the
+        `Timing` of `defn` and the depth of each of its outputs
+        """
+        if defn in self._costs:
+            return self._costs[defn]
+        if is_primitive(defn):
+            counts, timing = primitive_cost(defn)
+            result = counts, timing, {}
+            self._costs[defn] = result
+            return result
+
+        counts = [0, 0, 0, 0]
+        # Depth of the outputs of each instance from the inputs and from the
+        # flops of `defn`
+        arrival = {}
+        setup = internal = None
+
+        def arrive(inst):
+            if inst == "input":
+                return 0, None
+            if inst is None:
+                return None, None
+            # Depth-first without recursion, chains of instances (e.g. the
+            # OR of the write enables) can be longer than the recursion limit
+            stack = [inst]
+            visiting = set()
+            while stack:
+                top = stack[-1]
+                if top in arrival:
+                    stack.pop()
+                    continue
+                _, timing, _ = self(type(top))
+                sources = self._inputs_drivers(top) \
+                    if timing.comb is not None else set()
+                pending = [source for source in sources
+                           if source not in ("input", None) and
+                           source not in arrival]
+                if pending:
+                    if top in visiting:
+                        raise ValueError(f"Combinational loop through "
+                                         f"{top.name} in {defn.name}")
+                    visiting.add(top)
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+                from_input = from_flop = None
+                for source in sources:
+                    if source == "input":
+                        a_input, a_flop = 0, None
+                    elif source is None:
+                        continue
+                    else:
+                        a_input, a_flop = arrival[source]
+                    from_input = _max(from_input, _add(a_input, timing.comb))
+                    from_flop = _max(from_flop, _add(a_flop, timing.comb))
+                arrival[top] = from_input, _max(from_flop, timing.clk_to_out)
+            return arrival[inst]
+
+        for inst in defn.instances:
+            inst_counts, timing, _ = self(type(inst))
+            for i, count in enumerate(inst_counts):
+                counts[i] += count
+            if timing.setup is not None:
+                for driver in self._inputs_drivers(inst):
+                    a_input, a_flop = arrive(driver)
+                    setup = _max(setup, _add(a_input, timing.setup))
+                    internal = _max(internal, _add(a_flop, timing.setup))
+            internal = _max(internal, timing.internal)
+
+        outputs = {}
+        comb = clk_to_out = None
+        # Inside the definition its outputs are the sinks
+        for name, port in ((name, sink)
+                           for port_name, port in defn.interface.ports.items()
+                           for name, sink in sinks(port, port_name)):
+            from_input = from_flop = None
+            for driver in drivers(port):
+                a_input, a_flop = arrive(driver)
+                from_input = _max(from_input, a_input)
+                from_flop = _max(from_flop, a_flop)
+            outputs[name] = _max(from_input, from_flop) or 0
+            comb = _max(comb, from_input)
+            clk_to_out = _max(clk_to_out, from_flop)
+
+        result = (tuple(counts), Timing(comb, setup, clk_to_out, internal),
+                  outputs)
+        self._costs[defn] = result
+        return result
+
+    @staticmethod
+    def _inputs_drivers(inst):
+        sources = set()
+        for port in inst.interface.ports.values():
+            for _, sink in sinks(port):
+                sources |= drivers(sink)
+        return sources
+
+
+def estimate(circuit, read_port="apb"):
+    """
+    Returns the `Cost` of the elaborated `circuit`, `read_depth` is the
+    depth of the outputs of the `read_port` interface (e.g. PRDATA)
+    """
+    (flops, mux_inputs, comparators, gates), timing, outputs = \
+        Estimator()(circuit)
+    decode_depth = _max(timing.setup, timing.internal) or 0
+    read_depth = max((depth for name, depth in outputs.items()
+                      if name.startswith(read_port + "_")), default=0)
+    critical_depth = _max(decode_depth, read_depth, timing.comb) or 0
+    return Cost(flops, mux_inputs, comparators, gates, decode_depth,
+                read_depth, critical_depth)
+
+
+def estimate_top(mode, num_dmas, banked=False):
+    from top import TopGenerator
+    return estimate(TopGenerator(mode, num_dmas, banked))
+
+
+def sweep(modes=("pack", "distribute"), dmas=(1, 2, 4, 8, 16), jobs=None):
+    """
+    Estimate the cost of `TopGenerator` for each mode and DMA count in a
+    pool of `jobs` processes, returns a dict mapping `(mode, num_dmas)` to
+    its `Cost`
+    """
+    configs = [(mode, num_dmas) for num_dmas in dmas for mode in modes]
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        costs = pool.map(estimate_top, *zip(*configs))
+        return dict(zip(configs, costs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dmas", type=int, nargs="+",
+                        default=[1, 2, 4, 8, 16])
+    parser.add_argument("--jobs", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{'mode':>10} {'dmas':>5} " +
+          " ".join(f"{field:>14}" for field in Cost._fields))
+    for (mode, num_dmas), cost in sweep(dmas=args.dmas,
+                                        jobs=args.jobs).items():
+        print(f"{mode:>10} {num_dmas:>5} " +
+              " ".join(f"{value:>14}" for value in cost))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+from hwtypes import BitVector
+from apb_model import APBCommand
+
+
+class APBTransport:
+    """
+    Issues register accesses through an `APBBus` model
+
+    `slave(io)` is called every cycle after the bus to evaluate the slave,
+    e.g. `apb_model.APBSlaveModel` or `sim.VerilatorSim.cycle`.  A sequence
+    of transfers is issued back to back: the next transfer starts in the
+    cycle the previous one completes.
+    """
+    def __init__(self, bus, io, slave, slave_id=0):
+        self.bus = bus
+        self.io = io
+        self.slave = slave
+        self.slave_id = slave_id
+        self.cycles = 0
+        self.transfers = 0
+
+    def _cycle(self):
+        self.bus(self.io)
+        self.slave(self.io)
+        self.cycles += 1
+
+    def run(self, transfers):
+        """
+        Issue `transfers`, a list of `(command, address, data)`, and return
+        the data of each transfer once completed (PRDATA for reads)
+        """
+        if not transfers:
+            return []
+        completed = []
+
+        def monitor(slave_id, address, command, data, wait_states, strobe):
+            completed.append(int(data))
+
+        request = self.io.request
+        request.slave_id = type(request.slave_id)(self.slave_id)
+        psel = f"PSEL{self.slave_id}"
+        pending = iter(transfers)
+
+        def load():
+            transfer = next(pending, None)
+            if transfer is None:
+                request.command = APBCommand.IDLE
+            else:
+                command, address, data = transfer
+                request.command = command
+                request.address = type(request.address)(address)
+                request.data = type(request.data)(data)
+                request.strobe = BitVector[len(request.strobe)](-1)
+
+        self.bus.add_monitor(monitor)
+        try:
+            load()
+            while len(completed) < len(transfers):
+                self._cycle()
+                # A transfer entered its SETUP phase, the model latched the
+                # request so the next one can be loaded
+                if getattr(self.io.apb, psel) and not self.io.apb.PENABLE:
+                    load()
+        finally:
+            self.bus.remove_monitor(monitor)
+        self.transfers += len(transfers)
+        return completed
+
+    def write(self, address, data):
+        self.run([(APBCommand.WRITE, address, data)])
+
+    def read(self, address):
+        return self.run([(APBCommand.READ, address, 0)])[0]
+
+
+class RegisterDriver:
+    """
+    Software access layer for a register file described by the tuple of
+    `Register`s `regs` (as passed to `RegisterFileGenerator`), issuing bus
+    transfers through `transport` (e.g. an `APBTransport`)
+
+    Software read/write registers (access mode "rw") only change when
+    software writes them, so the driver keeps a shadow copy of them: reads
+    are served from the shadow, writes of the current value are skipped and
+    writes are held back and coalesced until `flush`, which issues them back
+    to back.  Accesses to the other registers ("hw" registers that hardware
+    can update, "ro" status and "wo" pulse registers) go to the bus, after
+    flushing the pending writes so the bus sees the accesses in program
+    order.  Writes of "ro" registers and reads of "wo" registers raise a
+    `ValueError`.
+    """
+    def __init__(self, regs, data_width, transport):
+        self.regs = regs
+        self.mask = (1 << data_width) - 1
+        self.transport = transport
+        self.addresses = {reg.name: address
+                          for address, reg in enumerate(regs)}
+        self.access = {reg.name: reg.access for reg in regs}
+        self.reset()
+        # Accesses served without a bus transfer
+        self.cache_hits = 0
+        self.skipped_writes = 0
+
+    def reset(self):
+        """
+        Drop the pending writes and reset the shadow copies to the register
+        reset values, e.g. after resetting the register file
+        """
+        self.shadow = {reg.name: reg.init for reg in self.regs
+                       if reg.access == "rw"}
+        self.pending = {}
+
+    def read(self, name):
+        if name in self.pending:
+            self.cache_hits += 1
+            return self.pending[name]
+        if name in self.shadow:
+            self.cache_hits += 1
+            return self.shadow[name]
+        if self.access[name] == "wo":
+            raise ValueError(f"Register {name} is write-only")
+        self.flush()
+        return self.transport.read(self.addresses[name])
+
+    def write(self, name, value):
+        value &= self.mask
+        if self.access[name] == "ro":
+            raise ValueError(f"Register {name} is read-only")
+        if name not in self.shadow:
+            self.flush()
+            self.transport.write(self.addresses[name], value)
+            return
+        if self.pending.get(name, self.shadow[name]) == value:
+            self.skipped_writes += 1
+            return
+        if name in self.pending:
+            # Coalesced with the pending write
+            self.skipped_writes += 1
+        if value == self.shadow[name]:
+            del self.pending[name]
+        else:
+            self.pending[name] = value
+
+    def flush(self):
+        """
+        Issue the pending writes
+        """
+        if not self.pending:
+            return
+        self.transport.run([(APBCommand.WRITE, self.addresses[name], value)
+                            for name, value in self.pending.items()])
+        self.shadow.update(self.pending)
+        self.pending = {}
+
+    def __getitem__(self, name):
+        return self.read(name)
+
+    def __setitem__(self, name, value):
+        self.write(name, value)
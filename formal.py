@@ -0,0 +1,205 @@
+"""
+Bounded formal verification of the APB register file
+
+`verify` compiles a `RegisterFileGenerator` to Verilog, wraps it in a
+harness asserting the properties of an APB register file and checks them with
+yosys and yosys-smtbmc (bounded model checking, or k-induction for an
+unbounded proof).  Everything runs locally, the tools are only required when
+`verify` is called.
+
+Usage: python formal.py [--depth 10] [--induction]
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+from typing import NamedTuple, Optional
+import magma as m
+from reg_file import RegisterFileGenerator
+from register import Register
+from sim import leaf_ports
+
+
+TOOLS = ("yosys", "yosys-smtbmc")
+
+
+class FormalResult(NamedTuple):
+    passed: bool
+    # Name of the first failing property and path of the counterexample VCD
+    failed: Optional[str]
+    trace: Optional[str]
+    log: str
+
+
+def harness(circuit, regs, data_width, apb_slave_id=0):
+    """
+    Returns the source of a SystemVerilog harness instancing `circuit` (a
+    `RegisterFileGenerator` with the APB interface) and asserting its
+    properties, and a dict mapping each line of an assertion to the name of
+    its property
+
+    The harness assumes PRESETn is asserted in the first cycle and checks
+        `ready_in_access`: PREADY is only asserted in the ACCESS phase
+        `read_data_<reg>`: PRDATA is the value of the register addressed
+            by a read (the `<reg>_d` input of "ro" registers, 0 for "wo"
+            registers)
+        `reset_<reg>`: a register holds its reset value after reset
+        `write_<reg>`: a write to a register is visible on `<reg>_q` the
+            next cycle (only the byte lanes enabled by PSTRB change, the
+            other lanes of "wo" registers are 0)
+        `update_<reg>`: otherwise a hardware update (`<reg>_en`) of a "hw"
+            register is visible the next cycle, even during a write to
+            another register
+        `hold_<reg>`: otherwise the register keeps its value ("rw" and "hw")
+            or is cleared ("wo")
+    """
+    ports = list(leaf_ports(circuit.IO))
+    lines = [f"module {circuit.name}_formal ("]
+    inputs = [(port, T) for port, T in ports if T.is_input()]
+    for i, (port, T) in enumerate(inputs):
+        sep = "," if i < len(inputs) - 1 else ""
+        lines.append(f"    input [{T.flat_length() - 1}:0] {port}{sep}")
+    lines.append(");")
+    for port, T in ports:
+        if T.is_output():
+            lines.append(f"    wire [{T.flat_length() - 1}:0] {port};")
+    connections = ", ".join(f".{port}({port})" for port, _ in ports)
+    lines.append(f"    {circuit.name} dut ({connections});")
+    lines += [
+        "    reg past_valid = 1'b0;",
+        "    always @(posedge apb_PCLK) past_valid <= 1'b1;",
+        f"    wire access = apb_PSEL{apb_slave_id} && apb_PENABLE;",
+        "    wire write = access && apb_PWRITE;",
+        "    wire read = access && !apb_PWRITE;",
+    ]
+    stored = [reg for reg in regs if reg.access != "ro"]
+    for reg in stored:
+        lanes = []
+        for lane in range((data_width + 7) // 8):
+            lo, hi = 8 * lane, min(8 * (lane + 1), data_width) - 1
+            keep = f"{reg.name}_q[{hi}:{lo}]" if reg.access != "wo" else \
+                f"{hi - lo + 1}'d0"
+            lanes.append(f"apb_PSTRB[{lane}] ? apb_PWDATA[{hi}:{lo}] : "
+                         f"{keep}")
+        lanes = ", ".join(f"({lane})" for lane in reversed(lanes))
+        lines.append(f"    wire [{data_width - 1}:0] {reg.name}_wdata = "
+                     f"{{{lanes}}};")
+
+    properties = {}
+
+    def check(name, condition, indent=8):
+        properties[len(lines) + 1] = name
+        lines.append(" " * indent + f"assert ({condition});")
+
+    lines += ["    always @(*) begin",
+              "        if (!past_valid) assume (!apb_PRESETn);"]
+    check("ready_in_access", "!apb_PREADY || access")
+    for i, reg in enumerate(regs):
+        value = {"ro": f"{reg.name}_d", "wo": f"{data_width}'d0"}.get(
+            reg.access, f"{reg.name}_q")
+        check(f"read_data_{reg.name}",
+              f"!(read && apb_PADDR == {i}) || apb_PRDATA == {value}")
+    lines += ["    end",
+              "    always @(posedge apb_PCLK) begin",
+              "        if (past_valid) begin"]
+    for reg in stored:
+        i = regs.index(reg)
+        init = reg.init if reg.access != "wo" else 0
+        lines.append("            if (!$past(apb_PRESETn))")
+        check(f"reset_{reg.name}", f"{reg.name}_q == {data_width}'d{init}",
+              16)
+        lines.append(f"            else if ($past(write && apb_PADDR == {i}))")
+        check(f"write_{reg.name}", f"{reg.name}_q == $past({reg.name}_wdata)",
+              16)
+        if reg.access == "hw":
+            lines.append(f"            else if ($past({reg.name}_en))")
+            check(f"update_{reg.name}", f"{reg.name}_q == $past({reg.name}_d)",
+                  16)
+        lines.append("            else")
+        held = f"$past({reg.name}_q)" if reg.access != "wo" else \
+            f"{data_width}'d0"
+        check(f"hold_{reg.name}", f"{reg.name}_q == {held}", 16)
+    lines += ["        end", "    end", "endmodule", ""]
+    return "\n".join(lines), properties
+
+
+def verify(regs, data_width, apb_slave_id=0, depth=10, induction=False,
+           directory="build/formal", solver="z3"):
+    """
+    Check the properties of `harness` for the register file described by
+    `regs`, `data_width` and `apb_slave_id`
+
+    Bounded model checking covers the first `depth` cycles after reset,
+    `induction` additionally attempts a k-induction proof (with k = `depth`)
+    that the properties hold in every cycle.  Returns a `FormalResult`, the
+    counterexample of a failing check is written to `directory`.
+    """
+    missing = [tool for tool in TOOLS if shutil.which(tool) is None]
+    if missing:
+        raise RuntimeError(f"{', '.join(missing)} required for formal "
+                           f"verification")
+    circuit = RegisterFileGenerator(regs, data_width, apb_slave_id)
+    os.makedirs(directory, exist_ok=True)
+    basename = os.path.join(directory, circuit.name)
+    m.compile(basename, circuit, output="coreir-verilog")
+    source, properties = harness(circuit, regs, data_width, apb_slave_id)
+    with open(basename + "_formal.sv", "w") as f:
+        f.write(source)
+
+    subprocess.run(
+        ["yosys", "-q", "-p",
+         f"read_verilog {basename}.v; "
+         f"read_verilog -formal -sv {basename}_formal.sv; "
+         f"prep -top {circuit.name}_formal; async2sync; dffunmap; "
+         f"write_smt2 -wires {basename}.smt2"],
+        check=True, capture_output=True
+    )
+
+    log = ""
+    steps = [("bmc", [])] + ([("induction", ["-i"])] if induction else [])
+    for step, flags in steps:
+        trace = f"{basename}_{step}.vcd"
+        result = subprocess.run(
+            ["yosys-smtbmc", "-s", solver, "-t", str(depth), *flags,
+             "--dump-vcd", trace, f"{basename}.smt2"],
+            capture_output=True, text=True
+        )
+        log += result.stdout + result.stderr
+        if result.returncode != 0:
+            return FormalResult(False, failed_property(log, properties),
+                                trace, log)
+    return FormalResult(True, None, None, log)
+
+
+def failed_property(log, properties):
+    """
+    Returns the name of the property of the first assertion reported as
+    failing in the yosys-smtbmc `log`, or None if it can not be identified
+    """
+    for match in re.finditer(r"_formal\.sv:(\d+)", log):
+        name = properties.get(int(match.group(1)))
+        if name is not None:
+            return name
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--depth", type=int, default=10)
+    parser.add_argument("--induction", action="store_true")
+    args = parser.parse_args()
+
+    regs = (Register("ctrl", init=1), Register("status", has_ce=True),
+            Register("src"), Register("dst"), Register("irq", access="ro"),
+            Register("start", access="wo"))
+    result = verify(regs, 32, depth=args.depth, induction=args.induction)
+    if result.passed:
+        print("All properties hold")
+    else:
+        print(f"Property {result.failed} failed, see {result.trace}")
+    raise SystemExit(0 if result.passed else 1)
+
+
+if __name__ == "__main__":
+    main()
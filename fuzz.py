@@ -0,0 +1,335 @@
+"""
+Differential fuzzing of the RTL of `RegisterFileGenerator` against a Python
+model of the register file
+
+Each case generates a random register map (number of registers, reset values,
+access modes and data width) and a long random sequence of APB
+transfers and hardware updates, runs it through the verilated RTL (in-process,
+see `sim.VerilatorSim`) and through the model, and compares PREADY, PRDATA and
+the `_q` outputs every cycle.  Failing sequences are shrunk to a minimal list
+of transactions.  Cases run in a process pool.  `--direct` fuzzes the output
+of `reg_file_verilog` instead of the CoreIR output.
+
+Usage: python fuzz.py [--cases 8] [--jobs N] [--transactions 10000]
+                      [--seed 0] [--direct]
+"""
+import argparse
+import concurrent.futures
+import math
+import os
+import random
+import time
+from typing import NamedTuple, Optional
+import numpy as np
+from apb_model import apply_strobe
+from register import Register, ACCESS_MODES
+
+
+DATA_WIDTHS = (8, 12, 16, 32, 64)
+
+
+class Transaction(NamedTuple):
+    """
+    An APB transfer ("write" or "read", a SETUP and an ACCESS cycle) or an
+    "idle" cycle
+
+    If `hw_reg` is not None, the `_d` input of that register ("hw" or "ro")
+    is set to `hw_data` in the last cycle of the transaction, along with the
+    `_en` input of "hw" registers
+    """
+    command: str
+    address: int = 0
+    data: int = 0
+    strobe: int = 0
+    hw_reg: Optional[int] = None
+    hw_data: int = 0
+
+
+class Mismatch(NamedTuple):
+    cycle: int
+    transaction: int
+    port: str
+    expected: int
+    actual: int
+
+    def __str__(self):
+        return (f"cycle {self.cycle} (transaction {self.transaction}): "
+                f"{self.port} is {hex(self.actual)}, expected "
+                f"{hex(self.expected)}")
+
+
+class Case(NamedTuple):
+    seed: int
+    regs: tuple
+    data_width: int
+    transactions: list
+
+
+class Result(NamedTuple):
+    case: Case
+    cycles: int
+    # Time spent simulating the RTL and the model, excluding the build
+    elapsed: float
+    # None if the RTL matched the model, otherwise the first mismatch of the
+    # shrunk case and its transactions
+    mismatch: Optional[Mismatch]
+    shrunk: Optional[list]
+
+
+def random_case(seed, num_transactions, max_regs=12):
+    rng = random.Random(seed)
+    data_width = rng.choice(DATA_WIDTHS)
+    regs = tuple(Register(f"reg_{i}", init=rng.getrandbits(data_width),
+                          access=rng.choice(ACCESS_MODES))
+                 for i in range(rng.randint(1, max_regs)))
+    hw_regs = [i for i, reg in enumerate(regs) if reg.access in ("hw", "ro")]
+    strobe_width = math.ceil(data_width / 8)
+    full_strobe = (1 << strobe_width) - 1
+    transactions = []
+    for _ in range(num_transactions):
+        command = rng.choices(["write", "read", "idle"], [4, 4, 1])[0]
+        address = rng.randrange(len(regs))
+        data = rng.getrandbits(data_width) if command == "write" else 0
+        strobe = 0
+        if command == "write":
+            strobe = full_strobe if rng.random() < 0.75 else \
+                rng.getrandbits(strobe_width)
+        hw_reg, hw_data = None, 0
+        if hw_regs and rng.random() < 0.25:
+            hw_reg = rng.choice(hw_regs)
+            hw_data = rng.getrandbits(data_width)
+        transactions.append(Transaction(command, address, data, strobe,
+                                        hw_reg, hw_data))
+    return Case(seed, regs, data_width, transactions)
+
+
+def stimulus(regs, transactions):
+    """
+    Expand `transactions` into one stimulus array per input port of the
+    register file, returns the arrays and the index of the transaction of
+    each cycle
+    """
+    cycles = sum(1 if t.command == "idle" else 2 for t in transactions)
+    inputs = {port: np.zeros(cycles, dtype=np.uint64) for port in
+              ["apb_PSEL0", "apb_PENABLE", "apb_PWRITE", "apb_PADDR",
+               "apb_PWDATA", "apb_PSTRB"]}
+    inputs["apb_PRESETn"] = np.ones(cycles, dtype=np.uint64)
+    for reg in regs:
+        if reg.access in ("hw", "ro"):
+            inputs[f"{reg.name}_d"] = np.zeros(cycles, dtype=np.uint64)
+        if reg.access == "hw":
+            inputs[f"{reg.name}_en"] = np.zeros(cycles, dtype=np.uint64)
+    owner = np.zeros(cycles, dtype=np.int64)
+    cycle = 0
+    for i, t in enumerate(transactions):
+        length = 1 if t.command == "idle" else 2
+        owner[cycle:cycle + length] = i
+        if t.command != "idle":
+            inputs["apb_PSEL0"][cycle:cycle + 2] = 1
+            inputs["apb_PENABLE"][cycle + 1] = 1
+            inputs["apb_PWRITE"][cycle:cycle + 2] = t.command == "write"
+            inputs["apb_PADDR"][cycle:cycle + 2] = t.address
+            inputs["apb_PWDATA"][cycle:cycle + 2] = t.data
+            inputs["apb_PSTRB"][cycle:cycle + 2] = t.strobe
+        if t.hw_reg is not None:
+            reg = regs[t.hw_reg]
+            last = cycle + length - 1
+            if reg.access == "hw":
+                inputs[f"{reg.name}_en"][last] = 1
+            inputs[f"{reg.name}_d"][last] = t.hw_data
+        cycle += length
+    return inputs, owner
+
+
+def model(regs, data_width, inputs):
+    """
+    Returns the outputs of the register file expected in each cycle for
+    `inputs` (as produced by `stimulus`), sampled before the clock edge
+    """
+    cycles = len(inputs["apb_PSEL0"])
+    # Stored value of "rw" and "hw" registers, pulse of "wo" registers
+    values = [reg.init if reg.access in ("rw", "hw") else 0 for reg in regs]
+    outputs = {port: np.zeros(cycles, dtype=np.uint64)
+               for port in ["apb_PREADY", "apb_PRDATA"] +
+               [f"{reg.name}_q" for reg in regs if reg.access != "ro"]}
+    columns = {port: array.tolist() for port, array in inputs.items()}
+    hw = [(i, columns[f"{reg.name}_en"], columns[f"{reg.name}_d"])
+          for i, reg in enumerate(regs) if reg.access == "hw"]
+    status = {i: columns[f"{reg.name}_d"] for i, reg in enumerate(regs)
+              if reg.access == "ro"}
+    pulses = [i for i, reg in enumerate(regs) if reg.access == "wo"]
+    for cycle in range(cycles):
+        selected = columns["apb_PSEL0"][cycle] and \
+            columns["apb_PENABLE"][cycle]
+        write = columns["apb_PWRITE"][cycle]
+        address = columns["apb_PADDR"][cycle]
+        outputs["apb_PREADY"][cycle] = bool(selected)
+        access = regs[address].access
+        if access == "ro":
+            outputs["apb_PRDATA"][cycle] = status[address][cycle]
+        elif access != "wo":
+            outputs["apb_PRDATA"][cycle] = values[address]
+        for reg, value in zip(regs, values):
+            if reg.access != "ro":
+                outputs[f"{reg.name}_q"][cycle] = value
+        # Clock edge, a bus write has priority over the hardware update, its
+        # unstrobed lanes keep the value before the edge (pulses clear them)
+        written = None
+        if selected and write and access != "ro":
+            written = address
+            value = apply_strobe(
+                0 if access == "wo" else values[address],
+                columns["apb_PWDATA"][cycle], columns["apb_PSTRB"][cycle],
+                data_width)
+        for i in pulses:
+            values[i] = 0
+        for i, en, d in hw:
+            if en[cycle] and i != written:
+                values[i] = d[cycle]
+        if written is not None:
+            values[written] = value
+    return outputs
+
+
+def compare(regs, inputs, owner, expected, actual):
+    """
+    Returns the first `Mismatch` between the `expected` and `actual` outputs
+    or None, PRDATA is only compared in the ACCESS cycle of reads
+    """
+    read_access = (inputs["apb_PSEL0"] == 1) & (inputs["apb_PENABLE"] == 1) \
+        & (inputs["apb_PWRITE"] == 0)
+    first = None
+    for port, values in expected.items():
+        differs = values != actual[port].astype(np.uint64)
+        if port == "apb_PRDATA":
+            differs &= read_access
+        cycles = np.flatnonzero(differs)
+        if len(cycles) and (first is None or cycles[0] < first.cycle):
+            cycle = int(cycles[0])
+            first = Mismatch(cycle, int(owner[cycle]), port,
+                             int(values[cycle]), int(actual[port][cycle]))
+    return first
+
+
+def shrink(transactions, fails):
+    """
+    Returns a subsequence of `transactions` for which `fails` still holds,
+    from which no single transaction can be removed (delta debugging)
+    """
+    n = 2
+    while len(transactions) >= 2:
+        chunk = math.ceil(len(transactions) / n)
+        for start in range(0, len(transactions), chunk):
+            complement = transactions[:start] + transactions[start + chunk:]
+            if fails(complement):
+                transactions = complement
+                n = max(n - 1, 2)
+                break
+        else:
+            if chunk == 1:
+                break
+            n = min(2 * n, len(transactions))
+    return transactions
+
+
+class RTL:
+    """
+    The verilated register file of a case, reset before each run, compiled
+    with CoreIR or emitted by `reg_file_verilog` if `direct`
+    """
+    def __init__(self, regs, data_width, directory, direct=False):
+        from reg_file import RegisterFileGenerator
+        from sim import VerilatorSim
+        circuit = RegisterFileGenerator(regs, data_width)
+        verilog = None
+        if direct:
+            from reg_file_verilog import write_verilog
+            # Next to, not over, the CoreIR output of the circuit
+            verilog = write_verilog(os.path.join(directory, "direct"), regs,
+                                    data_width, name=circuit.name)
+        self.sim = VerilatorSim(circuit, directory=directory, verilog=verilog)
+        self.regs = regs
+
+    def run(self, inputs):
+        sim = self.sim
+        for port in inputs:
+            sim[port] = 0
+        sim["apb_PRESETn"] = 0
+        sim.step()
+        outputs = ["apb_PREADY", "apb_PRDATA"] + \
+            [f"{reg.name}_q" for reg in self.regs if reg.access != "ro"]
+        return sim.run(inputs, outputs)
+
+
+def check(rtl, case, transactions):
+    inputs, owner = stimulus(case.regs, transactions)
+    expected = model(case.regs, case.data_width, inputs)
+    return compare(case.regs, inputs, owner, expected, rtl.run(inputs))
+
+
+def run_case(case, directory="build/fuzz", direct=False):
+    name = f"{case.seed}_direct" if direct else str(case.seed)
+    rtl = RTL(case.regs, case.data_width, os.path.join(directory, name),
+              direct)
+    start = time.perf_counter()
+    mismatch = check(rtl, case, case.transactions)
+    elapsed = time.perf_counter() - start
+    shrunk = None
+    if mismatch is not None:
+        shrunk = shrink(case.transactions,
+                        lambda transactions: transactions and
+                        check(rtl, case, transactions) is not None)
+        mismatch = check(rtl, case, shrunk)
+    cycles = len(stimulus(case.regs, case.transactions)[1])
+    rtl.sim.close()
+    return Result(case, cycles, elapsed, mismatch, shrunk)
+
+
+def fuzz(cases, jobs=None, transactions=10000, seed=0, direct=False):
+    """
+    Run `cases` random cases in a pool of `jobs` processes, yielding each
+    `Result` as it completes
+    """
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        futures = [pool.submit(run_case, random_case(seed + i, transactions),
+                               direct=direct)
+                   for i in range(cases)]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cases", type=int, default=8)
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--transactions", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--direct", action="store_true")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    failures = 0
+    simulated = 0
+    elapsed = 0
+    for result in fuzz(args.cases, args.jobs, args.transactions, args.seed,
+                       args.direct):
+        case = result.case
+        simulated += len(case.transactions)
+        elapsed += result.elapsed
+        status = "ok" if result.mismatch is None else "FAIL"
+        print(f"seed {case.seed}: {len(case.regs)} registers, data width "
+              f"{case.data_width}, {result.cycles} cycles: {status}")
+        if result.mismatch is not None:
+            failures += 1
+            print(f"  {result.mismatch}")
+            print(f"  registers: {case.regs}")
+            for transaction in result.shrunk:
+                print(f"  {transaction}")
+    wall = time.perf_counter() - start
+    print(f"{simulated / elapsed:.0f} transactions/s per core, "
+          f"{simulated / wall:.0f} transactions/s overall (including builds)")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
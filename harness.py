@@ -0,0 +1,190 @@
+import functools
+import hashlib
+import importlib.metadata
+import json
+import os
+import re
+import shutil
+import subprocess
+import profiling
+
+
+# Directory of the `ResultCache` used by `compile_and_run`, None disables
+# the cache (`pytest --no-result-cache`)
+CACHE_DIRECTORY = os.path.join("build", "cache")
+
+
+def verilator_flags(threads=1, jobs=None, trace=True):
+    """
+    Returns the verilator flags shared by the tests
+
+    `threads` > 1 builds verilator's multithreaded model, which evaluates the
+    design on `threads` threads (worthwhile for large designs such as a
+    `TopGenerator` with many register files)
+
+    `jobs` sets the number of parallel verilation (and, for builds driven by
+    verilator such as `sim.VerilatorSim`, C++ compilation) jobs.  fault
+    already compiles the generated C++ with `make -j`.
+    """
+    if threads < 1:
+        raise ValueError("threads must be at least 1")
+    flags = []
+    if trace:
+        flags.append("--trace")
+    if threads > 1:
+        flags += ["--threads", str(threads)]
+    if jobs is not None:
+        flags += ["-j", str(jobs)]
+    return flags
+
+
+@functools.lru_cache(maxsize=None)
+def tool_versions():
+    """
+    Returns a dict of the versions of verilator and of the Python packages
+    generating the Verilog and the test bench (None if not installed)
+    """
+    versions = {}
+    if shutil.which("verilator") is not None:
+        versions["verilator"] = subprocess.run(
+            ["verilator", "--version"], capture_output=True, text=True
+        ).stdout.strip()
+    else:
+        versions["verilator"] = None
+    for package in ("magma-lang", "mantle", "coreir", "fault", "hwtypes"):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def _walk(actions):
+    # The actions nested in loops and conditionals
+    for action in actions:
+        yield action
+        yield from _walk(getattr(action, "actions", None) or ())
+        yield from _walk(getattr(action, "else_actions", None) or ())
+
+
+def fingerprint(verilog, actions, options):
+    """
+    Returns the fingerprint of a test scenario: the contents of the
+    generated `verilog` file, the tester `actions` (stimulus and
+    expectations), the contents of the files read by the actions (e.g. the
+    stimulus of `apb_model.StimulusTable`), the `options` of the run (e.g.
+    verilator flags) and the `tool_versions`
+    """
+    digest = hashlib.sha256()
+    with open(verilog, "rb") as f:
+        digest.update(f.read())
+    # fault numbers loop variables with a counter shared by all the testers
+    # of the process, they are numbered from 0 in each scenario instead
+    loop_vars = {}
+
+    def loop_var(match):
+        return f"__loop_var_{loop_vars.setdefault(match[0], len(loop_vars))}"
+
+    for action in actions:
+        digest.update(re.sub(r"__fault_loop_var_action_\d+", loop_var,
+                             str(action)).encode())
+        digest.update(b"\n")
+    # File actions only print the file name
+    inputs = {action.file.name for action in _walk(actions)
+              if hasattr(action, "file") and "r" in action.file.mode}
+    for name in sorted(inputs):
+        digest.update(name.encode())
+        with open(name, "rb") as f:
+            digest.update(f.read())
+    digest.update(repr(sorted(options.items())).encode())
+    digest.update(json.dumps(tool_versions(), sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Passing runs of test scenarios, keyed by `fingerprint`
+
+    Each entry is a directory holding `result.json` and the files produced by
+    the run that tests read afterwards (e.g. the VCD trace checked by a
+    scoreboard), which are restored on a hit
+    """
+    def __init__(self, directory=CACHE_DIRECTORY):
+        self.directory = directory
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key, restore_to=None):
+        """
+        Returns True if the scenario `key` passed before, restoring its files
+        to the directory `restore_to`
+        """
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, "result.json")) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if restore_to is not None and result["files"]:
+            os.makedirs(restore_to, exist_ok=True)
+            for name in result["files"]:
+                shutil.copy(os.path.join(entry, name), restore_to)
+        return True
+
+    def put(self, key, files=()):
+        """
+        Record that the scenario `key` passed, along with copies of `files`
+        """
+        entry = self._entry(key)
+        os.makedirs(entry, exist_ok=True)
+        names = []
+        for path in files:
+            if os.path.isfile(path):
+                shutil.copy(path, entry)
+                names.append(os.path.basename(path))
+        # Written last so a partial entry is never a hit
+        with open(os.path.join(entry, "result.json"), "w") as f:
+            json.dump({"files": names}, f)
+
+
+def compile_and_run(tester, threads=1, jobs=None, trace=True, **kwargs):
+    """
+    Compile and run `tester` with verilator using the options shared by the
+    tests, see `verilator_flags` for `threads`, `jobs` and `trace`
+
+    Additional `kwargs` are passed to `tester.compile_and_run`
+
+    The circuit is compiled to Verilog first so the scenario can be looked up
+    in the `ResultCache` at `CACHE_DIRECTORY`, if the same Verilog, actions,
+    options and tools passed before, verilation and simulation are skipped
+    (the VCD trace of the previous run is restored).
+    """
+    flags = verilator_flags(threads, jobs, trace) + kwargs.pop("flags", [])
+    kwargs.setdefault("magma_output", "coreir-verilog")
+    kwargs.setdefault("magma_opts", {"verilator_debug": True})
+    if CACHE_DIRECTORY is None:
+        with profiling.phase("compile_and_run"):
+            tester.compile_and_run(target="verilator", flags=flags, **kwargs)
+        return
+
+    import magma as m
+    circuit = tester._circuit
+    directory = kwargs.setdefault("directory", "build")
+    # The options fault compiles the circuit with
+    magma_opts = dict(kwargs["magma_opts"], verilator_compat=True)
+    basename = os.path.join(directory, circuit.name)
+    os.makedirs(directory, exist_ok=True)
+    m.compile(basename, circuit, output=kwargs["magma_output"], **magma_opts)
+
+    options = dict(kwargs, flags=flags)
+    key = fingerprint(basename + ".v", tester.actions, options)
+    logs = os.path.join(directory, "logs")
+    cache = ResultCache(CACHE_DIRECTORY)
+    if cache.get(key, restore_to=logs):
+        return
+    with profiling.phase("compile_and_run"):
+        tester.compile_and_run(target="verilator", flags=flags,
+                               skip_compile=True, **kwargs)
+    files = [os.path.join(logs, f"{circuit.name}.vcd")] if trace else []
+    cache.put(key, files)
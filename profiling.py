@@ -0,0 +1,190 @@
+import contextlib
+import functools
+import json
+import os
+import resource
+import time
+from typing import NamedTuple, Tuple
+
+
+class Phase(NamedTuple):
+    # Names of the enclosing phases, outermost first, ending with this phase
+    stack: Tuple[str, ...]
+    wall: float
+    # High-water mark of the resident set size (in kilobytes) of this process
+    # and of its waited for children (e.g. verilator, make and the simulator)
+    # at the end of the phase
+    peak_rss: int
+    children_peak_rss: int
+
+
+def peak_rss():
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+class Profiler:
+    """
+    Records the wall time and peak RSS of nested phases
+
+    Phases are recorded with `phase`, either directly or through the hooks
+    installed by `instrument` while the profiler is active (see `activate`).
+    The report is available as JSON (`report`) and in the folded stack format
+    consumed by flamegraph tools (`folded`).
+    """
+    def __init__(self):
+        self.phases = []
+        self.stack = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self.stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            self.phases.append(Phase(tuple(self.stack), wall, *peak_rss()))
+            self.stack.pop()
+
+    def extend(self, other, prefix=()):
+        """
+        Add the phases of `other` (e.g. the profile of a test) under the
+        phases named in `prefix`
+        """
+        for phase in other.phases:
+            self.phases.append(phase._replace(
+                stack=tuple(prefix) + phase.stack))
+
+    def self_times(self):
+        """
+        Returns the wall time of each stack not spent in nested phases
+        """
+        times = {}
+        for phase in self.phases:
+            times[phase.stack] = times.get(phase.stack, 0) + phase.wall
+        for phase in self.phases:
+            parent = phase.stack[:-1]
+            if parent in times:
+                times[parent] -= phase.wall
+        return times
+
+    def totals(self):
+        """
+        Returns the total wall time, number of calls and peak RSS of each
+        phase name, aggregated over all stacks
+        """
+        totals = {}
+        for phase in self.phases:
+            name = phase.stack[-1]
+            total = totals.setdefault(name, {"wall": 0.0, "calls": 0,
+                                             "peak_rss": 0,
+                                             "children_peak_rss": 0})
+            total["wall"] += phase.wall
+            total["calls"] += 1
+            total["peak_rss"] = max(total["peak_rss"], phase.peak_rss)
+            total["children_peak_rss"] = max(total["children_peak_rss"],
+                                             phase.children_peak_rss)
+        return totals
+
+    def report(self):
+        return {
+            "phases": [{"stack": list(phase.stack), "wall": phase.wall,
+                        "peak_rss": phase.peak_rss,
+                        "children_peak_rss": phase.children_peak_rss}
+                       for phase in self.phases],
+            "totals": self.totals()
+        }
+
+    def folded(self):
+        """
+        Returns one `outer;inner <microseconds>` line per stack
+        """
+        return "".join(f"{';'.join(stack)} {round(wall * 1e6)}\n"
+                       for stack, wall in self.self_times().items())
+
+    def write(self, basename):
+        """
+        Write the report to `<basename>.json` and `<basename>.folded`
+        """
+        directory = os.path.dirname(basename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(basename + ".json", "w") as f:
+            json.dump(self.report(), f, indent=2)
+        with open(basename + ".folded", "w") as f:
+            f.write(self.folded())
+
+
+_active = None
+
+
+@contextlib.contextmanager
+def activate(profiler):
+    """
+    Record the phases of the hooks installed by `instrument` in `profiler`
+    """
+    global _active
+    previous, _active = _active, profiler
+    try:
+        yield profiler
+    finally:
+        _active = previous
+
+
+def phase(name):
+    """
+    Record a phase in the active profiler, if any
+    """
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.phase(name)
+
+
+def wrap(owner, attr, name):
+    """
+    Record calls to `owner.attr` as phases, `name` is the phase name or a
+    function of the call arguments returning it
+    """
+    original = getattr(owner, attr)
+    if getattr(original, "_profiled", False):
+        return
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        with phase(name(*args, **kwargs) if callable(name) else name):
+            return original(*args, **kwargs)
+
+    wrapper._profiled = True
+    setattr(owner, attr, wrapper)
+
+
+def _subprocess_phase(args, *rest, **kwargs):
+    command = os.path.basename(args[0])
+    if command == "verilator":
+        return "verilate"
+    if command == "make":
+        return "cxx_compile"
+    return "simulate"
+
+
+def instrument():
+    """
+    Install hooks recording the phases of the generate-compile-simulate flow:
+
+    * `elaborate:<generator>` for the elaboration of magma generators
+    * `magma_compile` for the compilation of a circuit to Verilog (CoreIR
+      passes and Verilog emission)
+    * `verilate`, `cxx_compile` and `simulate` for the tools run by fault's
+      verilator target
+
+    The hooks only record phases while a profiler is active, so they can be
+    installed once for the session
+    """
+    import magma as m
+    import fault.verilator_target
+
+    wrap(type(m.Generator2), "__call__",
+         lambda cls, *args, **kwargs: f"elaborate:{cls.__name__}")
+    wrap(m, "compile", "magma_compile")
+    wrap(fault.verilator_target, "subprocess_run", _subprocess_phase)
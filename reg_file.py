@@ -1,87 +1,242 @@
+import functools
+import hashlib
 import magma as m
 import mantle
 from apb import APBMaster, APBSlave
-from typing import Tuple
+from axi import AXI4LiteSlave
+from register import Register
+from typing import Optional, Tuple
 
 
-class Register:
-    def __init__(self, name, init=0, has_ce=False):
-        self.name = name
-        self.init = init
-        self.has_ce = has_ce
-        
+@functools.lru_cache(maxsize=None)
+def RegisterBankType(regs: Tuple[Register], data_width: int, port: str):
+    """
+    Returns the product type grouping the `port` ("d", "en" or "q") of each
+    register of a bank described by `regs` that has one, or None if no
+    register has the port
+
+    The types are cached so the ports of the banks of a register file can be
+    wired to circuits declaring the same type (see `top.ChannelDMA`)
+    """
+    fields = {}
+    for reg in regs:
+        if port == "d" and reg.access in ("hw", "ro"):
+            fields[reg.name] = m.Bits[data_width]
+        elif port == "en" and reg.access == "hw":
+            fields[reg.name] = m.Enable
+        elif port == "q" and reg.access != "ro":
+            fields[reg.name] = m.Bits[data_width]
+    if not fields:
+        return None
+    return m.Product.from_fields(f"RegisterBank_{port}", fields)
+
 
 def make_reg_file_interface(reg_list: Tuple[Register], data_width: int,
-                            apb_slave_id: int):
-    # magma provides various helper functions in m.bitutils, 
-    # here we use clog2 to derive the number of bits required 
-    # to store the address space described by number of Registers 
+                            apb_slave_id: int, interface: str = "apb",
+                            banks: Optional[int] = None):
+    """
+    `banks` replicates `reg_list` in that many banks, exposed as array ports
+    `d`, `en` and `q` with an element of type `RegisterBankType` per bank,
+    instead of the individual `<reg_name>_d`, `<reg_name>_en` and
+    `<reg_name>_q` ports
+    """
+    # magma provides various helper functions in m.bitutils,
+    # here we use clog2 to derive the number of bits required
+    # to store the address space described by number of Registers
     # in `reg_list`
-    addr_width = m.bitutils.clog2(len(reg_list))
-    
+    addr_width = m.bitutils.clog2(len(reg_list) * (banks or 1))
+
     Data = m.Bits[data_width]
-    
-    io = m.IO(apb=APBSlave(addr_width, data_width, apb_slave_id))
+
+    if interface == "apb":
+        io = m.IO(apb=APBSlave(addr_width, data_width, apb_slave_id))
+    elif interface == "axi4lite":
+        io = m.IO(axi=AXI4LiteSlave(addr_width, data_width))
+    else:
+        raise ValueError(f"Unexpected interface {interface}")
+    if banks is not None:
+        for port, direction in (("d", m.In), ("en", m.In), ("q", m.Out)):
+            T = RegisterBankType(reg_list, data_width, port)
+            if T is not None:
+                io += m.IO(**{port: direction(m.Array[banks, T])})
+        return io
+    # Only the ports needed by the access mode of each register (see
+    # `Register`)
     for reg in reg_list:
-        io += m.IO(**{f"{reg.name}_d": m.In(Data)})
-        if reg.has_ce:
+        if reg.access in ("hw", "ro"):
+            io += m.IO(**{f"{reg.name}_d": m.In(Data)})
+        if reg.access == "hw":
             io += m.IO(**{f"{reg.name}_en": m.In(m.Enable)})
-        io += m.IO(**{f"{reg.name}_q": m.Out(Data)})
+        if reg.access != "ro":
+            io += m.IO(**{f"{reg.name}_q": m.Out(Data)})
     return io
 
 
+def register_ports(io, regs, banks=None):
+    """
+    Returns `(instance name, Register, port)` for each register address of a
+    register file with the interface `io`, where `port(name)` returns the
+    "d", "en" or "q" port of the register
+
+    The registers of bank `b` are at addresses `b * len(regs)` onwards
+    """
+    if banks is None:
+        return [(reg.name, reg,
+                 lambda name, reg=reg: getattr(io, f"{reg.name}_{name}"))
+                for reg in regs]
+    return [(f"{reg.name}_{bank}", reg,
+             lambda name, reg=reg, bank=bank:
+             getattr(getattr(io, name)[bank], reg.name))
+            for bank in range(banks) for reg in regs]
+
+
+def make_registers(ports, data_width, CLK, RESET, is_write, addr, wdata,
+                   wstrb):
+    """
+    Instance the registers described by `ports` (see `register_ports`),
+    shared by the APB and AXI4-Lite front-ends
+
+    `is_write`, `addr`, `wdata` and `wstrb` describe the bus write performed
+    in the current cycle
+
+    Returns the list of the values returned by reads of each register and the
+    list of their bus write enables
+    """
+    read_values = []
+    write_enables = []
+    for i, (name, reg, port) in enumerate(ports):
+        # Clock enable is based on write signal and address value
+        # For now, a register's address is defined by its index in
+        # `ports`
+        ce = is_write & (addr == i)
+        write_enables.append(ce)
+
+        if reg.access == "ro":
+            # Status registers are read straight from the hardware input
+            read_values.append(port("d"))
+            continue
+
+        if reg.access == "wo":
+            # The written byte lanes are held for one cycle, the register
+            # is cleared in every other cycle
+            register = mantle.Register(data_width, has_reset=True,
+                                       name=name)
+            lanes = []
+            for lane in range(len(wstrb)):
+                lo, hi = 8 * lane, min(8 * (lane + 1), data_width)
+                lanes.append(mantle.mux([m.bits(0, hi - lo), wdata[lo:hi]],
+                                        ce & wstrb[lane]))
+            register.I @= m.concat(*lanes)
+            read_values.append(m.bits(0, data_width))
+        else:
+            register = mantle.Register(data_width, init=reg.init,
+                                       has_ce=True, has_reset=True,
+                                       name=name)
+            # Only the byte lanes enabled by the write strobe take the value
+            # from the bus, the others keep the current value of the
+            # register so software can update part of a register in a
+            # single transfer
+            lanes = []
+            for lane in range(len(wstrb)):
+                lo, hi = 8 * lane, min(8 * (lane + 1), data_width)
+                lanes.append(mantle.mux([register.O[lo:hi], wdata[lo:hi]],
+                                        wstrb[lane]))
+            write_data = m.concat(*lanes)
+
+            if reg.access == "hw":
+                # Register input is from `<reg_name>_d` port by default and
+                # the strobed write data when handling a bus write to this
+                # register (a write to another register must not override a
+                # hardware update), `or` the enable signal with the IO input
+                register.I @= mantle.mux([port("d"), write_data], ce)
+                register.CE @= ce | m.bit(port("en"))
+            else:
+                # Software-only registers need neither the `_d` input nor
+                # its mux, they only load on bus writes
+                register.I @= write_data
+                register.CE @= ce
+            read_values.append(register.O)
+
+        # Wire up register output to `<reg_name>_q` interface port
+        port("q") <= register.O
+
+        # Wire the clock signals
+        register.CLK @= CLK
+        register.RESET @= RESET
+    return read_values, write_enables
+
+
+# Longest circuit name made of the readable names, the name is also the base
+# name of the output files
+MAX_NAME_LENGTH = 128
+
+
+def generator_name(prefix, names, *params):
+    """
+    Returns a circuit name made of `prefix`, the readable `names` and a digest
+    of the remaining generator parameters
+
+    Circuits elaborated by different tests share the CoreIR context of a test
+    module, where a circuit is identified by its name, so two register files
+    with the same register names but e.g. different reset values or data
+    widths must not share a name
+
+    Past `MAX_NAME_LENGTH` (e.g. register maps with thousands of entries), the
+    names are replaced by their count and included in the digest
+    """
+    names = tuple(names)
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()[:8]
+    name = prefix + "_".join(names) + "_" + digest
+    if len(name) > MAX_NAME_LENGTH:
+        digest = hashlib.sha1(repr((names, ) + params).encode()).hexdigest()
+        name = f"{prefix}{len(names)}_{digest[:8]}"
+    return name
+
+
 class RegisterFileGenerator(m.Generator2):
-    def __init__(self, regs, data_width, apb_slave_id=0):
+    def __init__(self, regs, data_width, apb_slave_id=0, interface="apb",
+                 banks=None):
         """
         regs : tuple of Register instances
+        interface : "apb" or "axi4lite", the bus used to access the
+                    registers (`apb_slave_id` only applies to "apb")
+        banks : number of banks of `regs` (e.g. one per DMA channel)
+                exposed as array ports, see `make_reg_file_interface`
         """
-        self.name = "RegFile_" + "_".join(reg.name for reg in regs)
-        self.io = io = make_reg_file_interface(regs, data_width, apb_slave_id)
+        if banks is not None and banks < 1:
+            raise ValueError(f"Expected at least one bank, got {banks}")
+        prefix = "RegFile_" if interface == "apb" else "RegFileAXI4Lite_"
+        params = (regs, data_width, apb_slave_id)
+        if banks is not None:
+            prefix += f"Bank{banks}_"
+            params += (banks,)
+        self.name = generator_name(prefix, (reg.name for reg in regs),
+                                   *params)
+        self.io = io = make_reg_file_interface(regs, data_width, apb_slave_id,
+                                               interface, banks)
+        ports = register_ports(io, regs, banks)
+        if interface == "apb":
+            self._apb_frontend(io, ports, data_width, apb_slave_id)
+        else:
+            self._axi4lite_frontend(io, ports, data_width)
 
+    @staticmethod
+    def _apb_frontend(io, ports, data_width, apb_slave_id):
         # Get the concrete PSEL signal based on the `apb_slave_id`
         # parameter
         PSEL = getattr(io.apb, f"PSEL{apb_slave_id}")
 
-        # Create a list of Register instances (parametrized by the members
-        # of `regs`)
-        registers = [
-            mantle.Register(data_width, init=reg.init, has_ce=True,
-                            has_reset=True, name=reg.name)
-            for reg in regs
-        ]
-
         is_write = io.apb.PENABLE & io.apb.PWRITE & PSEL
 
-        ready = None
-        for i, reg in enumerate(registers):
-            # Register input is from `<reg_name>_d` port by default
-            # and PWDATA when handling an APB write
-            reg.I @= mantle.mux([getattr(io, reg.name + "_d"),
-                                 io.apb.PWDATA], is_write)
-
-            # Wire up register output to `<reg_name>_q` interface port
-            getattr(io, reg.name + "_q") <= reg.O
-
-            # Wire the clock signals
-            reg.CLK @= io.apb.PCLK
-            reg.RESET @= ~m.bit(io.apb.PRESETn)
-
-            # Clock enable is based on write signal and PADDR value
-            # For now, a register's address is defined by its index in
-            # `regs`
-            ce = is_write & (io.apb.PADDR == i)
-            if regs[i].has_ce:
-                # If has a clock enable, `or` the enable signal with the IO
-                # input
-                reg.CE @= ce | m.bit(getattr(io, reg.name + "_en"))
-            else:
-                reg.CE @= ce
+        read_values, write_enables = make_registers(
+            ports, data_width, io.apb.PCLK, ~m.bit(io.apb.PRESETn),
+            is_write, io.apb.PADDR, io.apb.PWDATA, io.apb.PSTRB
+        )
 
-            # Set ready high if a register is being written to
-            if ready is not None:
-                ready |= ce
-            else:
-                ready = ce
+        # Set ready high if a register is being written to
+        ready = write_enables[0]
+        for ce in write_enables[1:]:
+            ready |= ce
 
         is_read = io.apb.PENABLE & ~io.apb.PWRITE & PSEL
 
@@ -90,7 +245,7 @@ class RegisterFileGenerator(m.Generator2):
 
         # Select PRDATA based on PADDR
         io.apb.PRDATA @= mantle.mux(
-            [reg.O for reg in registers], io.apb.PADDR)
+            read_values, io.apb.PADDR)
 
         # Stub out the rest of the signals for now, CoreIR does not allow
         # unconnected signals, so we wire them up to the CoreIR `Term`
@@ -99,4 +254,58 @@ class RegisterFileGenerator(m.Generator2):
         # does not complain)
         io.apb.PSLVERR.undriven()
         io.apb.PPROT.unused()
-        io.apb.PSTRB.unused()
+
+    @staticmethod
+    def _axi4lite_frontend(io, ports, data_width):
+        """
+        AXI4-Lite slave accepting one write and one read per cycle
+
+        The write address and data are accepted together, and a new
+        transfer is accepted while the response of the previous one is
+        being accepted by the master, so with BREADY/RREADY held high a
+        transfer completes every cycle on each channel.  As with the APB
+        interface, addresses are register indices.
+        """
+        axi = io.axi
+        CLK, RESET = axi.ACLK, ~m.bit(axi.ARESETn)
+
+        def flag(name):
+            # Single bit state register (BVALID/RVALID)
+            reg = mantle.Register(1, has_reset=True, name=name)
+            reg.CLK @= CLK
+            reg.RESET @= RESET
+            return reg
+
+        # Write channels: accept a write if there is no pending response or
+        # the pending response is being accepted in this cycle
+        bvalid = flag("bvalid")
+        write_ready = ~bvalid.O[0] | axi.BREADY
+        is_write = axi.AWVALID & axi.WVALID & write_ready
+        axi.AWREADY @= is_write
+        axi.WREADY @= is_write
+        bvalid.I @= m.bits(is_write | (bvalid.O[0] & ~axi.BREADY), 1)
+        axi.BVALID @= bvalid.O[0]
+        axi.BRESP @= m.bits(0, 2)
+
+        read_values, _ = make_registers(ports, data_width, CLK, RESET,
+                                        is_write, axi.AWADDR, axi.WDATA,
+                                        axi.WSTRB)
+
+        # Read channels: same acceptance rule, the read data is registered
+        rvalid = flag("rvalid")
+        read_ready = ~rvalid.O[0] | axi.RREADY
+        is_read = axi.ARVALID & read_ready
+        axi.ARREADY @= is_read
+        rdata = mantle.Register(data_width, has_ce=True, has_reset=True,
+                                name="rdata")
+        rdata.CLK @= CLK
+        rdata.RESET @= RESET
+        rdata.CE @= is_read
+        rdata.I @= mantle.mux(read_values, axi.ARADDR)
+        rvalid.I @= m.bits(is_read | (rvalid.O[0] & ~axi.RREADY), 1)
+        axi.RVALID @= rvalid.O[0]
+        axi.RDATA @= rdata.O
+        axi.RRESP @= m.bits(0, 2)
+
+        axi.AWPROT.unused()
+        axi.ARPROT.unused()
@@ -0,0 +1,195 @@
+"""
+Direct Verilog emitter for large APB register files
+
+`emit` writes the Verilog of the APB register file described by a tuple of
+`Register`s without elaborating it with magma or running the CoreIR passes,
+whose run time dominates the generation of register maps with thousands of
+entries.  The module has the name and ports of the equivalent
+`RegisterFileGenerator` (see `ports`), so it can replace the CoreIR output,
+e.g. `VerilatorSim(circuit, verilog=path)`.
+
+Usage: python reg_file_verilog.py --regs 4096 [--data-width 32] [-o build]
+"""
+import argparse
+import os
+import time
+from register import Register
+
+
+def addr_width(num_regs):
+    # Width of PADDR, at least one bit so single register files are legal
+    # Verilog
+    return max(1, (num_regs - 1).bit_length())
+
+
+def ports(regs, data_width, apb_slave_id=0, banks=None):
+    """
+    Returns `(name, direction, width)` for each port of the register file,
+    in the order of `sim.leaf_ports` of the equivalent
+    `RegisterFileGenerator`, `width` is None for single bit (`m.Bit`) ports
+    """
+    num_regs = len(regs) * (banks or 1)
+    result = [(f"apb_PSEL{apb_slave_id}", "input", None)]
+    for name, direction, width in (
+            ("PCLK", "input", None), ("PRESETn", "input", None),
+            ("PADDR", "input", addr_width(num_regs)),
+            ("PPROT", "input", None), ("PENABLE", "input", None),
+            ("PWRITE", "input", None), ("PWDATA", "input", data_width),
+            ("PSTRB", "input", (data_width + 7) // 8),
+            ("PREADY", "output", None), ("PRDATA", "output", data_width),
+            ("PSLVERR", "output", None)):
+        result.append((f"apb_{name}", direction, width))
+    for name, reg, port in register_names(regs, banks):
+        if reg.access in ("hw", "ro"):
+            result.append((port("d"), "input", data_width))
+        if reg.access == "hw":
+            result.append((port("en"), "input", None))
+        if reg.access != "ro":
+            result.append((port("q"), "output", data_width))
+    if banks is not None:
+        # Banked ports are grouped per port (all the `d` ports, then the
+        # `en` and `q` ports) like the array ports of the generator
+        order = {"d": 0, "en": 1, "q": 2}
+        apb, banked = result[:12], result[12:]
+        result = apb + sorted(banked,
+                              key=lambda port: order[port[0].split("_")[0]])
+    return result
+
+
+def register_names(regs, banks=None):
+    """
+    Returns `(name, Register, port)` for each register address, where
+    `port(kind)` returns the name of its "d", "en" or "q" port, following
+    `reg_file.register_ports`
+    """
+    if banks is None:
+        return [(reg.name, reg, lambda kind, reg=reg: f"{reg.name}_{kind}")
+                for reg in regs]
+    return [(f"{reg.name}_{bank}", reg,
+             lambda kind, reg=reg, bank=bank: f"{kind}_{bank}_{reg.name}")
+            for bank in range(banks) for reg in regs]
+
+
+def module_name(regs, data_width, apb_slave_id=0, banks=None):
+    """
+    Returns the name of the equivalent `RegisterFileGenerator`
+    """
+    from reg_file import generator_name
+    prefix, params = "RegFile_", (regs, data_width, apb_slave_id)
+    if banks is not None:
+        prefix += f"Bank{banks}_"
+        params += (banks,)
+    return generator_name(prefix, (reg.name for reg in regs), *params)
+
+
+def _declaration(direction, width):
+    kind = " reg" if direction == "output" and width is not None else ""
+    size = f" [{width - 1}:0]" if width is not None else ""
+    return f"{direction}{kind}{size}"
+
+
+def emit(regs, data_width, apb_slave_id=0, banks=None, name=None):
+    """
+    Returns the Verilog source of the APB register file described by `regs`
+    (see `RegisterFileGenerator` for the parameters), with the module `name`
+    (default the name of the equivalent generator)
+
+    The write decode is a one-hot vector indexed by PADDR and the read mux a
+    case statement on PADDR.  Reads of unmapped addresses return 0 and
+    PSLVERR is tied low (the generator leaves it undriven).
+    """
+    if banks is not None and banks < 1:
+        raise ValueError(f"Expected at least one bank, got {banks}")
+    if name is None:
+        name = module_name(regs, data_width, apb_slave_id, banks)
+    addresses = register_names(regs, banks)
+    num_regs = len(addresses)
+    width = addr_width(num_regs)
+    W = data_width
+
+    lines = [f"module {name} (", "    // verilator lint_off UNUSED"]
+    declarations = ports(regs, data_width, apb_slave_id, banks)
+    for i, (port, direction, port_width) in enumerate(declarations):
+        sep = "," if i < len(declarations) - 1 else ""
+        lines.append(f"    {_declaration(direction, port_width)} {port}{sep}")
+    lines += ["    // verilator lint_on UNUSED", ");"]
+
+    lanes = []
+    for lane in range((W + 7) // 8):
+        lo, hi = 8 * lane, min(8 * (lane + 1), W)
+        lanes.append(f"{{{hi - lo}{{apb_PSTRB[{lane}]}}}}")
+    lines += [
+        f"    wire access = apb_PSEL{apb_slave_id} & apb_PENABLE;",
+        "    wire write = access & apb_PWRITE;",
+        "    wire read = access & ~apb_PWRITE;",
+        f"    wire [{num_regs - 1}:0] ce = {{{num_regs}{{write}}}} & "
+        f"({num_regs}'d1 << apb_PADDR);",
+        "    assign apb_PREADY = (|ce) | read;",
+        "    assign apb_PSLVERR = 1'b0;",
+    ]
+    if any(reg.access != "ro" for _, reg, _ in addresses):
+        lines.append(f"    wire [{W - 1}:0] strobe = "
+                     f"{{{', '.join(reversed(lanes))}}};")
+        lines.append(f"    wire [{W - 1}:0] wdata = apb_PWDATA & strobe;")
+
+    for i, (_, reg, port) in enumerate(addresses):
+        if reg.access == "ro":
+            continue
+        q = port("q")
+        lines.append("    always @(posedge apb_PCLK)")
+        if reg.access == "wo":
+            # The written byte lanes for one cycle, 0 otherwise
+            lines += ["        if (!apb_PRESETn)",
+                      f"            {q} <= {W}'h0;",
+                      "        else",
+                      f"            {q} <= ce[{i}] ? wdata : {W}'h0;"]
+            continue
+        lines += ["        if (!apb_PRESETn)",
+                  f"            {q} <= {W}'h{reg.init:x};",
+                  f"        else if (ce[{i}])",
+                  f"            {q} <= wdata | ({q} & ~strobe);"]
+        if reg.access == "hw":
+            lines += [f"        else if ({port('en')})",
+                      f"            {q} <= {port('d')};"]
+
+    lines += ["    always @(*)", "        case (apb_PADDR)"]
+    for i, (_, reg, port) in enumerate(addresses):
+        if reg.access != "wo":
+            value = port("d") if reg.access == "ro" else port("q")
+            lines.append(f"            {width}'d{i}: apb_PRDATA = {value};")
+    lines += [f"            default: apb_PRDATA = {W}'h0;",
+              "        endcase",
+              "endmodule", ""]
+    return "\n".join(lines)
+
+
+def write_verilog(directory, regs, data_width, apb_slave_id=0, banks=None,
+                  name=None):
+    """
+    Write the output of `emit` to `<directory>/<name>.v`, returns its path
+    """
+    if name is None:
+        name = module_name(regs, data_width, apb_slave_id, banks)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name + ".v")
+    with open(path, "w") as f:
+        f.write(emit(regs, data_width, apb_slave_id, banks, name))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--regs", type=int, default=4096)
+    parser.add_argument("--data-width", type=int, default=32)
+    parser.add_argument("-o", "--directory", default="build")
+    args = parser.parse_args()
+
+    regs = tuple(Register(f"reg_{i}", access="hw" if i % 2 else "rw")
+                 for i in range(args.regs))
+    start = time.perf_counter()
+    path = write_verilog(args.directory, regs, args.data_width)
+    print(f"Wrote {path} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
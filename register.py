@@ -0,0 +1,66 @@
+ACCESS_MODES = ("rw", "hw", "ro", "wo")
+
+
+class Register:
+    """
+    Immutable description of a register in a register file
+
+    `access` selects the logic and ports generated for the register:
+        "rw": software read/write register (`<name>_q` output)
+        "hw": software read/write register that hardware can also update
+            (`<name>_d` and `<name>_en` inputs, `<name>_q` output)
+        "ro": read-only status, reads return the `<name>_d` input (no
+            storage, writes are ignored)
+        "wo": write-only pulse, `<name>_q` carries the written data (the
+            byte lanes enabled by the write strobe) for the cycle after a
+            write and is 0 otherwise, reads return 0
+    The default is "hw" if `has_ce` else "rw", `has_ce` is True exactly for
+    "hw" registers.  `init` is the reset value of "rw" and "hw" registers.
+
+    Registers compare and hash by value, so two register files described by
+    equal tuples of `Register`s are the same `RegisterFileGenerator` cache
+    entry and are only elaborated once.
+
+    This module does not depend on magma so software layers (e.g. models and
+    drivers) can use register descriptions without importing the RTL flow
+    """
+    __slots__ = ("name", "init", "has_ce", "access")
+
+    def __init__(self, name, init=0, has_ce=False, access=None):
+        if access is None:
+            access = "hw" if has_ce else "rw"
+        if access not in ACCESS_MODES:
+            raise ValueError(f"Unexpected access mode {access}, expected one "
+                             f"of {ACCESS_MODES}")
+        if has_ce and access != "hw":
+            raise ValueError(f"has_ce only applies to \"hw\" registers, got "
+                             f"access mode {access}")
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "init", init)
+        object.__setattr__(self, "has_ce", access == "hw")
+        object.__setattr__(self, "access", access)
+
+    def __setattr__(self, attr, value):
+        raise AttributeError(f"Register is immutable, cannot set {attr}")
+
+    def __delattr__(self, attr):
+        raise AttributeError(f"Register is immutable, cannot delete {attr}")
+
+    def _key(self):
+        return tuple(getattr(self, attr) for attr in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, Register):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        args = ", ".join(f"{attr}={getattr(self, attr)!r}"
+                         for attr in self.__slots__)
+        return f"Register({args})"
+
+    def __reduce__(self):
+        return (Register, self._key())
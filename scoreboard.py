@@ -0,0 +1,113 @@
+from typing import NamedTuple
+from apb_model import APBCommand, apply_strobe
+from vcd import VCD
+
+
+class Mismatch(NamedTuple):
+    cycle: int
+    slave_id: int
+    address: int
+    expected: int
+    actual: int
+
+    def __str__(self):
+        return (f"cycle {self.cycle}: read of slave {self.slave_id} address "
+                f"{self.address} returned {hex(self.actual)}, expected "
+                f"{hex(self.expected)}")
+
+
+class Scoreboard:
+    """
+    Shadows the contents of the register files behind an APB bus from the
+    observed writes and checks the observed reads against the shadow
+
+    Transfers can be observed from the model by attaching the scoreboard to an
+    `APBBus` (`bus.add_monitor(scoreboard)`) or in bulk after simulation with
+    `check_trace`, which replays the transfers recorded in a VCD file so reads
+    do not need per-transfer `expect` actions.  Reads of addresses that have
+    not been written (and have no initial value) are not checked.
+    """
+    def __init__(self, data_width, init=None, unchecked=()):
+        """
+        `init` maps (slave_id, address) to the reset value of the register,
+        `unchecked` is a set of (slave_id, address) that do not read back
+        the written value (e.g. status registers), which are not shadowed
+        """
+        self.data_width = data_width
+        self.shadow = dict(init) if init is not None else {}
+        self.unchecked = set(unchecked)
+        self.mismatches = []
+        self.reads = 0
+        self.writes = 0
+
+    @classmethod
+    def from_registers(cls, regs, data_width, slave_id=0):
+        """
+        Construct a scoreboard initialized with the reset values of `regs`
+        (the tuple of `Register`s passed to `RegisterFileGenerator`), "hw"
+        registers (which hardware updates without a bus transfer), "ro" and
+        "wo" registers are not checked
+        """
+        return cls(data_width,
+                   {(slave_id, address): reg.init
+                    for address, reg in enumerate(regs)
+                    if reg.access == "rw"},
+                   {(slave_id, address) for address, reg in enumerate(regs)
+                    if reg.access in ("hw", "ro", "wo")})
+
+    def __call__(self, slave_id, address, command, data, wait_states,
+                 strobe=None, cycle=None):
+        key = (int(slave_id), int(address))
+        if command == APBCommand.WRITE:
+            self.writes += 1
+            if key in self.unchecked:
+                return
+            if strobe is None:
+                self.shadow[key] = int(data)
+            else:
+                self.shadow[key] = apply_strobe(self.shadow.get(key, 0), data,
+                                                strobe, self.data_width)
+        elif command == APBCommand.READ:
+            self.reads += 1
+            expected = None if key in self.unchecked else self.shadow.get(key)
+            if expected is not None and expected != int(data):
+                self.mismatches.append(Mismatch(cycle, key[0], key[1],
+                                                expected, int(data)))
+
+    def check_trace(self, file_name, num_slaves=1, prefix="apb_"):
+        """
+        Observe the transfers recorded in the VCD file `file_name` (e.g.
+        `build/logs/<circuit name>.vcd` when running with `--trace`)
+
+        `prefix` is prepended to the APB signal names to find them in the
+        trace
+        """
+        vcd = VCD.load(file_name)
+        names = ["PENABLE", "PREADY", "PWRITE", "PADDR", "PWDATA", "PRDATA",
+                 "PSTRB"]
+        names += [f"PSEL{i}" for i in range(num_slaves)]
+        samples = vcd.sample(prefix + "PCLK",
+                             [prefix + name for name in names])
+        for cycle, (penable, pready, pwrite, paddr, pwdata, prdata, pstrb,
+                    *psel) in enumerate(samples, 1):
+            if not (penable and pready):
+                continue
+            for slave_id, selected in enumerate(psel):
+                if not selected:
+                    continue
+                if pwrite:
+                    self(slave_id, paddr, APBCommand.WRITE, pwdata, 0, pstrb,
+                         cycle)
+                else:
+                    self(slave_id, paddr, APBCommand.READ, prdata, 0,
+                         cycle=cycle)
+        return self
+
+    def check(self):
+        """
+        Raise an AssertionError listing every mismatch observed so far
+        """
+        if self.mismatches:
+            raise AssertionError(
+                f"{len(self.mismatches)} of {self.reads} reads mismatched:\n" +
+                "\n".join(str(mismatch) for mismatch in self.mismatches))
@@ -0,0 +1,390 @@
+import ctypes
+import hashlib
+import os
+import shutil
+import subprocess
+import magma as m
+import numpy as np
+from hwtypes import Bit
+
+
+SHIM = """\
+#include <cstring>
+#include "verilated.h"
+{save_include}#include "{cls}.h"
+
+double sc_time_stamp() {{ return 0; }}
+
+static void *port(const {cls} *top, int i) {{
+    switch (i) {{
+{port_cases}
+    }}
+    return nullptr;
+}}
+
+static const long port_size[] = {{ {port_sizes} }};
+
+static void tick({cls} *top) {{
+    top->{clock} = 1;
+    top->eval();
+    top->{clock} = 0;
+    top->eval();
+}}
+
+extern "C" {{
+
+void *sim_create() {{
+    {cls} *top = new {cls};
+    top->{clock} = 0;
+    top->eval();
+    return top;
+}}
+
+void sim_destroy(void *handle) {{
+    {cls} *top = ({cls} *) handle;
+    top->final();
+    delete top;
+}}
+
+void *sim_port(void *handle, int i) {{
+    return port(({cls} *) handle, i);
+}}
+
+long sim_port_size(int i) {{
+    return port_size[i];
+}}
+
+void sim_eval(void *handle) {{
+    (({cls} *) handle)->eval();
+}}
+
+void sim_step(void *handle, long cycles) {{
+    for (long t = 0; t < cycles; t++)
+        tick(({cls} *) handle);
+}}
+
+void sim_run(void *handle, long cycles,
+             int num_inputs, const int *input_ids, char **inputs,
+             int num_outputs, const int *output_ids, char **outputs) {{
+    {cls} *top = ({cls} *) handle;
+    void *input_ports[{num_ports}], *output_ports[{num_ports}];
+    for (int i = 0; i < num_inputs; i++)
+        input_ports[i] = port(top, input_ids[i]);
+    for (int i = 0; i < num_outputs; i++)
+        output_ports[i] = port(top, output_ids[i]);
+    for (long t = 0; t < cycles; t++) {{
+        for (int i = 0; i < num_inputs; i++) {{
+            long size = port_size[input_ids[i]];
+            std::memcpy(input_ports[i], inputs[i] + t * size, size);
+        }}
+        top->eval();
+        for (int i = 0; i < num_outputs; i++) {{
+            long size = port_size[output_ids[i]];
+            std::memcpy(outputs[i] + t * size, output_ports[i], size);
+        }}
+        tick(top);
+    }}
+}}
+
+{save}
+}}
+"""
+
+
+SAVE_SHIM = """
+void sim_save(void *handle, const char *file_name) {{
+    VerilatedSave os;
+    os.open(file_name);
+    os << *({cls} *) handle;
+    os.close();
+}}
+
+void sim_restore(void *handle, const char *file_name) {{
+    VerilatedRestore os;
+    os.open(file_name);
+    os >> *({cls} *) handle;
+    os.close();
+}}
+"""
+
+
+def leaf_ports(T, prefix=""):
+    """
+    Yields `(name, type)` for each port of the circuit interface `T`, naming
+    the fields of product ports like the Verilog backend (e.g. `apb_PADDR`)
+    """
+    fields = T.field_dict if issubclass(T, m.Product) else T.ports
+    for name, port in fields.items():
+        if issubclass(port, m.Product):
+            yield from leaf_ports(port, prefix + name + "_")
+        elif issubclass(port, m.Array) and issubclass(port.T, m.Product):
+            # Arrays of products (e.g. register file banks) are flattened
+            # per element, e.g. `q_0_csr`
+            for i in range(len(port)):
+                yield from leaf_ports(port.T, f"{prefix}{name}_{i}_")
+        else:
+            yield prefix + name, port
+
+
+def port_dtype(width):
+    """
+    Returns the NumPy dtype and number of words matching the verilator
+    storage of a port of `width` bits
+    """
+    for bits, dtype in ((8, np.uint8), (16, np.uint16), (32, np.uint32),
+                        (64, np.uint64)):
+        if width <= bits:
+            return np.dtype(dtype), 1
+    # Wider ports are arrays of 32 bit words
+    return np.dtype(np.uint32), (width + 31) // 32
+
+
+class VerilatorSim:
+    """
+    Verilated `circuit` built as a shared library and loaded in-process
+
+    `ports` maps each port name to a NumPy view of the corresponding member
+    of the verilated model, so setting an input or reading an output does not
+    copy through Python objects or files.  Ports are named like in the
+    generated Verilog, e.g. `apb_PADDR` or `reg_0_q`.
+
+    The model can be driven cycle by cycle (set inputs, `eval`, read
+    outputs, `step`), from a Python model with `cycle`, or in bulk with `run`
+    which applies a stimulus array per input and records an array per output
+    in a single call.
+
+    `clock` is the name of the clock port, by default the first input of
+    type `m.Clock`.  `flags` are passed to verilator.  `savable` builds the
+    model with support for `save` and `restore`.  `verilog` is the path of
+    a Verilog source of `circuit` to verilate instead of compiling it with
+    magma (e.g. from `reg_file_verilog.write_verilog`).
+
+    The views in `ports` are only valid until `close` is called.
+    """
+    def __init__(self, circuit, directory="build", clock=None, flags=(),
+                 savable=False, verilog=None):
+        self.circuit = circuit
+        self.name = name = circuit.name
+        ports = list(leaf_ports(circuit.IO))
+        self.widths = {port: T.flat_length() for port, T in ports}
+        self.inputs = [port for port, T in ports if T.is_input()]
+        self.outputs = [port for port, T in ports if T.is_output()]
+        if clock is None:
+            clock = next(port for port, T in ports if issubclass(T, m.Clock))
+        self.clock = clock
+        self._ids = {port: i for i, (port, _) in enumerate(ports)}
+        self.savable = savable
+        self.verilog = verilog
+
+        library = self.build(directory, flags)
+        self.lib = lib = ctypes.CDLL(library)
+        lib.sim_create.restype = ctypes.c_void_p
+        lib.sim_destroy.argtypes = [ctypes.c_void_p]
+        lib.sim_port.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.sim_port.restype = ctypes.c_void_p
+        lib.sim_port_size.argtypes = [ctypes.c_int]
+        lib.sim_port_size.restype = ctypes.c_long
+        lib.sim_eval.argtypes = [ctypes.c_void_p]
+        lib.sim_step.argtypes = [ctypes.c_void_p, ctypes.c_long]
+        lib.sim_run.argtypes = [
+            ctypes.c_void_p, ctypes.c_long,
+            ctypes.c_int, ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_void_p),
+            ctypes.c_int, ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_void_p)
+        ]
+        if savable:
+            lib.sim_save.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+            lib.sim_restore.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+        self.handle = lib.sim_create()
+
+        self.ports = {}
+        for port, i in self._ids.items():
+            dtype, words = port_dtype(self.widths[port])
+            size = lib.sim_port_size(i)
+            if size != dtype.itemsize * words:
+                raise RuntimeError(f"Unexpected storage size {size} for port "
+                                   f"{port}")
+            buffer = (ctypes.c_char * size).from_address(
+                lib.sim_port(self.handle, i))
+            self.ports[port] = np.frombuffer(buffer, dtype=dtype)
+
+    def build(self, directory, flags):
+        """
+        Compile the circuit to Verilog and verilate it with a C shim exposing
+        the model to ctypes, returns the path of the shared library
+        """
+        if shutil.which("verilator") is None:
+            raise RuntimeError("verilator is required to build a VerilatorSim")
+        os.makedirs(directory, exist_ok=True)
+        basename = os.path.join(directory, self.name)
+        verilog = self.verilog
+        if verilog is None:
+            m.compile(basename, self.circuit, output="coreir-verilog")
+            verilog = basename + ".v"
+
+        cls = "V" + self.name
+        port_cases = "\n".join(
+            f"    case {i}: return (void *) &top->{port};"
+            for port, i in self._ids.items())
+        port_sizes = ", ".join(f"sizeof(((const {cls} *) 0)->{port})"
+                               for port in self._ids)
+        save, save_include = "", ""
+        if self.savable:
+            save = SAVE_SHIM.format(cls=cls)
+            save_include = '#include "verilated_save.h"\n'
+            flags = ["--savable", *flags]
+        # Builds with different flags (e.g. threads or savable) or Verilog
+        # sources (e.g. the CoreIR output and `reg_file_verilog`) of the same
+        # circuit get their own shim and library, a library that is already
+        # loaded would not be reloaded by ctypes
+        digest = hashlib.sha1(repr(flags).encode())
+        with open(verilog, "rb") as f:
+            digest.update(f.read())
+        variant = basename + "_sim_" + digest.hexdigest()[:8]
+        shim = variant + ".cpp"
+        with open(shim, "w") as f:
+            f.write(SHIM.format(cls=cls, clock=self.clock,
+                                port_cases=port_cases, port_sizes=port_sizes,
+                                num_ports=len(self._ids), save=save,
+                                save_include=save_include))
+
+        obj_dir = variant
+        library = "lib" + os.path.basename(variant) + ".so"
+        subprocess.run(
+            ["verilator", "--cc", "--exe", "--build", "-Wno-fatal",
+             "--top-module", self.name, "-Mdir", obj_dir,
+             "-CFLAGS", "-fPIC", "-LDFLAGS", "-shared", "-o", library,
+             *flags, os.path.abspath(verilog),
+             os.path.abspath(shim)],
+            check=True, capture_output=True
+        )
+        return os.path.abspath(os.path.join(obj_dir, library))
+
+    def __getitem__(self, port):
+        words = self.ports[port]
+        if len(words) == 1:
+            return int(words[0])
+        return sum(int(word) << (32 * i) for i, word in enumerate(words))
+
+    def __setitem__(self, port, value):
+        words = self.ports[port]
+        value = int(value)
+        if len(words) == 1:
+            words[0] = value
+        else:
+            for i in range(len(words)):
+                words[i] = (value >> (32 * i)) & 0xFFFFFFFF
+
+    def eval(self):
+        """
+        Settle the combinational logic after setting inputs
+        """
+        self.lib.sim_eval(self.handle)
+
+    def step(self, cycles=1):
+        """
+        Apply `cycles` rising edges of the clock
+        """
+        self.lib.sim_step(self.handle, cycles)
+
+    def cycle(self, io, interface="apb"):
+        """
+        Simulate one cycle driven by a Python model
+
+        The inputs of the circuit are taken from the fields of the hwtypes
+        product `getattr(io, interface)` (e.g. `io.apb` after calling an
+        `APBBus`), and the outputs sampled by the clock edge are written back
+        to it, so the model sees them on its next call
+        """
+        product = getattr(io, interface)
+        fields = type(product).field_dict
+        prefix = interface + "_"
+        for field in fields:
+            port = prefix + field
+            if port in self.inputs and port != self.clock:
+                self[port] = getattr(product, field)
+        self.eval()
+        for field, T in fields.items():
+            port = prefix + field
+            if port in self.outputs:
+                value = self[port]
+                setattr(product, field,
+                        Bit(value) if T is Bit else T(value))
+        self.step()
+
+    def run(self, inputs, outputs=None):
+        """
+        Simulate one cycle per row of the arrays in `inputs` (a mapping from
+        input port to stimulus), in a single call into the model
+
+        In each cycle the inputs are applied, the values of `outputs`
+        (default all outputs) are recorded and the clock is stepped, so the
+        recorded values are those sampled by the clock edge.  Inputs not in
+        `inputs` keep their current value.
+
+        Returns a mapping from output port to an array with one row per
+        cycle.  Input arrays that already have the dtype of the port are used
+        without copying.
+        """
+        if outputs is None:
+            outputs = self.outputs
+        cycles = None
+        input_arrays = []
+        for port, values in inputs.items():
+            dtype, words = port_dtype(self.widths[port])
+            values = np.ascontiguousarray(values, dtype=dtype)
+            if cycles is None:
+                cycles = len(values)
+            if len(values) != cycles or values.size != cycles * words:
+                raise ValueError(f"Stimulus for {port} does not match the "
+                                 "number of cycles and port width")
+            input_arrays.append(values)
+        if cycles is None:
+            raise ValueError("run requires at least one input stimulus")
+        results = {}
+        for port in outputs:
+            dtype, words = port_dtype(self.widths[port])
+            shape = (cycles, ) if words == 1 else (cycles, words)
+            results[port] = np.empty(shape, dtype=dtype)
+
+        def pointers(ports, arrays):
+            ids = (ctypes.c_int * len(ports))(*(self._ids[port]
+                                                for port in ports))
+            buffers = (ctypes.c_void_p * len(ports))(
+                *(array.ctypes.data for array in arrays))
+            return len(ports), ids, buffers
+
+        self.lib.sim_run(self.handle, cycles,
+                         *pointers(list(inputs), input_arrays),
+                         *pointers(list(results), list(results.values())))
+        return results
+
+    def save(self, file_name):
+        """
+        Save the state of the model (registers and ports) to `file_name`,
+        requires `savable`
+        """
+        if not self.savable:
+            raise RuntimeError("VerilatorSim must be built with savable=True "
+                               "to save its state")
+        self.lib.sim_save(self.handle, os.fsencode(file_name))
+
+    def restore(self, file_name):
+        """
+        Restore the state saved by `save`, the views in `ports` remain valid
+        """
+        if not self.savable:
+            raise RuntimeError("VerilatorSim must be built with savable=True "
+                               "to restore its state")
+        self.lib.sim_restore(self.handle, os.fsencode(file_name))
+
+    def close(self):
+        if self.handle is not None:
+            self.lib.sim_destroy(self.handle)
+            self.handle = None
+            self.ports = {}
+
+    def __del__(self):
+        if getattr(self, "handle", None) is not None:
+            self.close()
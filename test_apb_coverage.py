@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from hwtypes import BitVector
+from apb_model import APBBus, APBCommand, make_request
+from apb_coverage import APBCoverage
+from traffic import TrafficGenerator, play
+
+
+def test_coverage_bins():
+    addr_width, data_width, num_slaves = 2, 32, 2
+    bus = APBBus(addr_width, data_width, num_slaves)
+    coverage = APBCoverage(num_slaves, 4, max_wait_states=1)
+    bus.add_monitor(coverage)
+    try:
+        io, request = make_request(0, 0, addr_width, data_width, num_slaves)
+        gen = TrafficGenerator(addr_width, data_width, num_slaves, seed=0,
+                               addresses=[2], slave_ids=[1], write_ratio=1.0,
+                               max_wait_states=3, wait_probability=1.0)
+        play(bus, io, gen.take(10))
+    finally:
+        bus.remove_monitor(coverage)
+    # All wait states above `max_wait_states` fall in the last bin
+    assert coverage.count(1, 2, APBCommand.WRITE, 1) == 10
+    assert coverage.hits == 1
+    assert len(coverage.holes()) == coverage.num_bins - 1
+    assert not coverage.done
+
+
+def test_coverage_stops_stream():
+    addr_width, data_width, num_slaves = 2, 32, 2
+    bus = APBBus(addr_width, data_width, num_slaves)
+    coverage = APBCoverage(num_slaves, 4)
+    bus.add_monitor(coverage)
+    try:
+        io, request = make_request(0, 0, addr_width, data_width, num_slaves)
+        gen = TrafficGenerator(addr_width, data_width, num_slaves, seed=0)
+        transfers = 0
+        for transfer in coverage.until_done(gen.take(100000)):
+            play(bus, io, [transfer])
+            transfers += 1
+    finally:
+        bus.remove_monitor(coverage)
+    assert coverage.done
+    assert coverage.holes() == []
+    # 16 bins, so the stream should stop well before it is exhausted
+    assert transfers < 1000
+
+
+def test_coverage_register_map():
+    # Three registers behind a two bit address, the generator only targets
+    # the register map so no transfer falls outside of the coverage space
+    addr_width, data_width, num_slaves = 2, 32, 2
+    bus = APBBus(addr_width, data_width, num_slaves)
+    coverage = APBCoverage(num_slaves, 3)
+    bus.add_monitor(coverage)
+    try:
+        io, request = make_request(0, 0, addr_width, data_width, num_slaves)
+        gen = TrafficGenerator(addr_width, data_width, num_slaves, seed=0,
+                               num_regs=3)
+        play(bus, io, coverage.until_done(gen.take(1000)))
+    finally:
+        bus.remove_monitor(coverage)
+    assert coverage.done
+
+    # Arguments are normalized with int() and range checked
+    assert coverage.count(BitVector[1](1), np.uint8(2), APBCommand.READ) == \
+        coverage.count(1, 2, APBCommand.READ) > 0
+    with pytest.raises(ValueError):
+        coverage.count(0, 3, APBCommand.READ)
+    with pytest.raises(ValueError):
+        coverage(2, 0, APBCommand.WRITE, 0, 0)
+    with pytest.raises(ValueError):
+        coverage(0, -1, APBCommand.WRITE, 0, 0)
@@ -1,14 +1,13 @@
-"""
-TODO
-====
-
-Test PSTRB logic
-"""
 from apb_model import APBBus, APBBusIO, Request, APB, APBCommand, \
-    default_APB_instance
+    default_APB_instance, make_request, apply_strobe
 from hwtypes import BitVector, Bit
 from dataclasses import fields
 from waveform import WaveForm
+from traffic import TrafficGenerator, play
+import pytest
+import os
+import subprocess
+import sys
 
 
 def test_apb_model_write_no_wait():
@@ -19,7 +18,8 @@ def test_apb_model_write_no_wait():
     data = 45
     request = Request(addr_width, data_width, 1)(
         APBCommand.IDLE, BitVector[addr_width](addr),
-        BitVector[data_width](data), BitVector[1](0))
+        BitVector[data_width](data), BitVector[1](0),
+        BitVector[4](0xF))
 
     # Specialized instance of APB for addr/data width
     _APB = APB(addr_width, data_width)
@@ -112,9 +112,10 @@ def test_apb_model_write_no_wait():
         },
         {
             "name": "PSTRB",
-            "wave": "=....",
+            "wave": "==...",
             "data": [
-                "0x0"
+                "0x0",
+                "0xf"
             ]
         },
         {
@@ -136,7 +137,8 @@ def test_apb_model_write_with_wait():
     addr = 13
     data = 45
     request = Request(addr_width, data_width, 1)(
-        APBCommand.IDLE, BitVector[addr_width](addr), BitVector[data_width](data), BitVector[1](0))
+        APBCommand.IDLE, BitVector[addr_width](addr), BitVector[data_width](data), BitVector[1](0),
+        BitVector[4](0xF))
 
     # Specialized instance of APB for addr/data width
     _APB = APB(addr_width, data_width)
@@ -235,9 +237,10 @@ def test_apb_model_write_with_wait():
         },
         {
             "name": "PSTRB",
-            "wave": "=......",
+            "wave": "==.....",
             "data": [
-                "0x0"
+                "0x0",
+                "0xf"
             ]
         },
         {
@@ -259,7 +262,8 @@ def test_apb_model_read_no_wait():
     addr = 13
     data = 0
     request = Request(addr_width, data_width, 1)(
-        APBCommand.IDLE, BitVector[addr_width](addr), BitVector[data_width](data), BitVector[1](0))
+        APBCommand.IDLE, BitVector[addr_width](addr), BitVector[data_width](data), BitVector[1](0),
+        BitVector[4](0))
 
     # Specialized instance of APB for addr/data width
     _APB = APB(addr_width, data_width)
@@ -371,7 +375,8 @@ def test_apb_model_read_with_wait():
     addr = 13
     data = 0
     request = Request(addr_width, data_width, 1)(
-        APBCommand.IDLE, BitVector[addr_width](addr), BitVector[data_width](data), BitVector[1](0))
+        APBCommand.IDLE, BitVector[addr_width](addr), BitVector[data_width](data), BitVector[1](0),
+        BitVector[4](0))
 
     # Specialized instance of APB for addr/data width
     _APB = APB(addr_width, data_width)
@@ -477,3 +482,136 @@ def test_apb_model_read_with_wait():
         }
     ]
 }""", waveform.render()  # Render if fails
+
+
+def test_apb_model_partial_write():
+    addr_width = 16
+    data_width = 32
+    bus = APBBus(addr_width, data_width)
+    io, request = make_request(13, 0xAB00, addr_width, data_width,
+                               strobe=0b0010)
+    assert io.apb.PSTRB == 0
+
+    request.command = APBCommand.WRITE
+    bus(io)
+    request.command = APBCommand.IDLE
+    # Only the second byte lane is written
+    assert io.apb.PSTRB == 0b0010
+    assert apply_strobe(0x12345678, io.apb.PWDATA, io.apb.PSTRB,
+                        data_width) == 0x1234AB78
+
+    io.apb.PREADY = Bit(1)
+    bus(io)
+    bus(io)
+    assert io.apb.PENABLE == 0
+
+    # PSTRB is driven low for reads
+    request.command = APBCommand.READ
+    bus(io)
+    assert io.apb.PSTRB == 0
+
+
+def test_make_request_full_strobe():
+    io, request = make_request(0, 0, 4, 16)
+    assert request.strobe == 0b11
+
+
+def test_apb_model_checkpoint():
+    addr_width = 4
+    data_width = 32
+    bus = APBBus(addr_width, data_width)
+    io, request = make_request(0, 0, addr_width, data_width)
+    transfers = list(TrafficGenerator(addr_width, data_width, seed=1,
+                                      wait_probability=0.5,
+                                      max_wait_states=2).take(40))
+    prologue, scenario = transfers[:20], transfers[20:]
+    other = TrafficGenerator(addr_width, data_width, seed=2).take(20)
+
+    completed = []
+
+    def monitor(*transfer):
+        completed.append(transfer)
+
+    bus.add_monitor(monitor)
+    try:
+        play(bus, io, prologue)
+        snapshot = bus.checkpoint()
+        del completed[:]
+        expected_cycles = play(bus, io, scenario)
+        expected = list(completed)
+
+        # The model cannot be checkpointed during a transfer
+        io.request.command = APBCommand.WRITE
+        bus(io)
+        with pytest.raises(RuntimeError):
+            bus.checkpoint()
+
+        # Scenarios started from the checkpoint do not depend on what ran
+        # before the restore
+        io = bus.restore(snapshot)
+        play(bus, io, other)
+        io = bus.restore(snapshot)
+        del completed[:]
+        assert play(bus, io, scenario) == expected_cycles
+        assert completed == expected
+    finally:
+        bus.remove_monitor(monitor)
+
+
+def test_apb_model_idle_fast_forward():
+    addr_width = 4
+    data_width = 32
+    bus = APBBus(addr_width, data_width)
+    transfers = list(TrafficGenerator(addr_width, data_width, seed=3,
+                                      max_idle_cycles=50,
+                                      max_wait_states=2,
+                                      wait_probability=0.5).take(50))
+    apb_fields = [field for field in bus.IO.field_dict["apb"].field_dict]
+
+    # Reference, every idle cycle simulated and captured
+    io, request = make_request(0, 0, addr_width, data_width)
+    expected = WaveForm(apb_fields, clock_name="PCLK")
+    expected_cycles = play(bus, io, transfers,
+                           on_cycle=lambda io: expected.step(io.apb))
+
+    io, request = make_request(0, 0, addr_width, data_width)
+    waveform = WaveForm(apb_fields, clock_name="PCLK")
+    cycles = play(bus, io, transfers,
+                  on_cycle=lambda io: waveform.step(io.apb),
+                  on_idle=lambda io, cycles: waveform.step(io.apb, cycles))
+    assert cycles == expected_cycles
+    assert waveform.to_wavejson() == expected.to_wavejson()
+    assert list(waveform.samples("PADDR")) == expected["PADDR"]
+    # Idle gaps are stored as a single entry
+    assert len(waveform["PCLK"]) < len(expected["PCLK"])
+    with pytest.raises(ValueError):
+        waveform.step(io.apb, 0)
+
+    # The model can only be fast-forwarded with an IDLE request
+    request.command = APBCommand.WRITE
+    with pytest.raises(RuntimeError):
+        bus.idle(io, 10)
+    request.command = APBCommand.IDLE
+
+
+# Import time budget (in seconds) for the model, waveform and stimulus layers,
+# which must not pull in the RTL toolchain
+IMPORT_BUDGET = 1.0
+
+
+def test_apb_model_import_budget():
+    code = """\
+import sys, time
+start = time.perf_counter()
+import apb_model, waveform, traffic, apb_coverage, scoreboard, vcd, register
+import axi_model, driver
+print(time.perf_counter() - start)
+print(",".join(name for name in ["magma", "mantle", "fault", "coreir"]
+               if name in sys.modules))
+"""
+    result = subprocess.run([sys.executable, "-c", code], check=True,
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    elapsed, rtl_modules = result.stdout.splitlines()
+    assert rtl_modules == ""
+    assert float(elapsed) < IMPORT_BUDGET
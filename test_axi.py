@@ -0,0 +1,27 @@
+import magma as m
+import pytest
+from axi import AXI4LiteMaster, AXI4LiteSlave
+
+
+def test_type():
+    master = AXI4LiteMaster(4, 64)()
+    for name in ["ACLK", "ARESETn", "AWADDR", "AWVALID", "WDATA", "WSTRB",
+                 "WVALID", "BREADY", "ARADDR", "ARVALID", "RREADY"]:
+        assert getattr(master, name).is_output()
+    for name in ["AWREADY", "WREADY", "BRESP", "BVALID", "ARREADY", "RDATA",
+                 "RRESP", "RVALID"]:
+        assert getattr(master, name).is_input()
+    assert isinstance(master.ACLK, m.Clock)
+    assert len(master.WDATA) == 64
+    assert len(master.WSTRB) == 8
+
+    slave = AXI4LiteSlave(4, 64)()
+    assert slave.ACLK.is_input()
+    assert slave.RDATA.is_output()
+
+    assert AXI4LiteSlave(4, 32).flip() == AXI4LiteMaster(4, 32)
+
+
+def test_data_width():
+    with pytest.raises(ValueError):
+        AXI4LiteMaster(4, 16)
@@ -0,0 +1,60 @@
+from apb_model import APBCommand
+from axi_model import AXI4LiteBus, AXI4LiteSlaveModel, make_axi4lite_io
+
+
+def run(bus, slave, io, max_cycles=1000):
+    cycles = 0
+    while True:
+        bus(io)
+        idle = bus.idle
+        slave(io)
+        if idle:
+            return cycles
+        cycles += 1
+        assert cycles < max_cycles
+
+
+def test_axi4lite_model_back_to_back():
+    addr_width, data_width = 3, 64
+    bus = AXI4LiteBus(addr_width, data_width)
+    slave = AXI4LiteSlaveModel(data_width, [0] * 8)
+    io = make_axi4lite_io(addr_width, data_width)
+    transfers = []
+    bus.add_monitor(lambda *args: transfers.append(args))
+
+    values = [0xDEADBEEF00000000 + i for i in range(8)]
+    for addr, data in enumerate(values):
+        bus.write(addr, data)
+    cycles = run(bus, slave, io)
+    assert slave.values == values
+    # One write accepted per cycle, plus one cycle for the last response
+    assert cycles == len(values) + 1
+
+    transfers.clear()
+    for addr in range(8):
+        bus.read(addr)
+    cycles = run(bus, slave, io)
+    assert cycles == len(values) + 1
+    assert [(int(address), command, int(data))
+            for _, address, command, data, _, _ in transfers] == \
+        [(addr, APBCommand.READ, data) for addr, data in enumerate(values)]
+
+
+def test_axi4lite_model_concurrent_read_write():
+    addr_width, data_width = 2, 32
+    bus = AXI4LiteBus(addr_width, data_width)
+    slave = AXI4LiteSlaveModel(data_width, [1, 2, 3, 4])
+    io = make_axi4lite_io(addr_width, data_width)
+    reads = []
+    bus.add_monitor(lambda slave_id, address, command, data, *args:
+                    reads.append(int(data))
+                    if command == APBCommand.READ else None)
+    # Reads and writes use separate channels and proceed in parallel
+    bus.write(0, 0xAB00, strobe=0b0010)
+    bus.write(1, 0x55)
+    bus.read(2)
+    bus.read(3)
+    cycles = run(bus, slave, io)
+    assert cycles == 3
+    assert slave.values == [0xAB01, 0x55, 3, 4]
+    assert reads == [3, 4]
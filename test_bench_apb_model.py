@@ -0,0 +1,23 @@
+from bench_apb_model import SCENARIOS, compare, run_benchmarks
+
+
+def test_run_benchmarks():
+    results = run_benchmarks(50)
+    assert set(results) == set(SCENARIOS) | {"make_request"}
+    for name in SCENARIOS:
+        assert results[name]["model_cycles_per_s"] > 0
+        assert results[name]["peak_bytes"] >= 0
+
+
+def test_compare():
+    baseline = {"write_heavy": {"model_cycles_per_s": 1000.0,
+                                "peak_bytes": 100}}
+    assert compare({"write_heavy": {"model_cycles_per_s": 800.0,
+                                    "peak_bytes": 120}},
+                   baseline, 0.3) == []
+    regressions = compare({"write_heavy": {"model_cycles_per_s": 600.0,
+                                           "peak_bytes": 200},
+                           "multi_slave": {"model_cycles_per_s": 1.0}},
+                          baseline, 0.3)
+    assert [regression.split(":")[0] for regression in regressions] == \
+        ["write_heavy.model_cycles_per_s", "write_heavy.peak_bytes"]
@@ -0,0 +1,66 @@
+import magma as m
+from apb import APBSlave
+from cost import Timing, estimate, primitive_cost, sinks, sweep
+from reg_file import RegisterFileGenerator
+from register import Register
+
+
+def test_primitive_cost():
+    Reg = m.Register(m.Bits[16])
+    reg = next(inst for inst in Reg.instances
+               if getattr(type(inst), "coreir_name", None) == "reg")
+    assert primitive_cost(type(reg)) == ((16, 0, 0, 0),
+                                         Timing(None, 0, 0, None))
+
+    class Or(m.Circuit):
+        io = m.IO(I0=m.In(m.Bit), I1=m.In(m.Bit), O=m.Out(m.Bit))
+        io.O @= io.I0 | io.I1
+
+    gate, = Or.instances
+    assert primitive_cost(type(gate)) == ((0, 0, 0, 1),
+                                          Timing(1, None, None, None))
+
+
+def test_sinks():
+    T = APBSlave(2, 16, 0)
+
+    class Main(m.Circuit):
+        io = m.IO(apb=T)
+
+    # Inside the definition, the outputs of the slave interface are sinks
+    names = [name for name, _ in sinks(Main.apb, "apb")]
+    assert names == ["apb_PREADY", "apb_PRDATA", "apb_PSLVERR"]
+
+
+def test_estimate_reg_file():
+    regs = (Register("a"), Register("b", has_ce=True))
+    cost = estimate(RegisterFileGenerator(regs, 16))
+    assert cost.flops == 32
+    assert cost.comparators == 2
+    assert cost.mux_inputs > 0 and cost.gates > 0
+    assert 0 < cost.read_depth <= cost.critical_depth
+    assert cost.decode_depth <= cost.critical_depth
+
+    # Status registers are read from their input and add no flops, pulse
+    # registers hold the written lanes in a register of the data width
+    status = regs + (Register("c", access="ro"), )
+    assert estimate(RegisterFileGenerator(status, 16)).flops == 32
+    pulse = regs + (Register("d", access="wo"), )
+    assert estimate(RegisterFileGenerator(pulse, 16)).flops == 48
+
+    # The OR of the write enables driving PREADY grows with the register count
+    regs = tuple(Register(f"r{i}") for i in range(32))
+    assert estimate(RegisterFileGenerator(regs, 16)).read_depth > 32
+
+
+def test_sweep():
+    costs = sweep(dmas=(1, 4), jobs=2)
+    assert set(costs) == {(mode, n) for mode in ("pack", "distribute")
+                          for n in (1, 4)}
+    for n in (1, 4):
+        pack, distribute = costs["pack", n], costs["distribute", n]
+        assert pack.flops == distribute.flops == n * 4 * 32
+    # Distributed register files duplicate the APB decode but shorten the
+    # read path of each file
+    assert costs["distribute", 4].gates > costs["pack", 4].gates
+    assert costs["distribute", 4].read_depth < costs["pack", 4].read_depth
@@ -0,0 +1,80 @@
+import pytest
+from apb_model import APBBus, APBCommand, APBSlaveModel, make_request
+from driver import APBTransport, RegisterDriver
+from register import Register
+
+
+def make_driver(regs, data_width=32):
+    addr_width = 2
+    bus = APBBus(addr_width, data_width)
+    io, request = make_request(0, 0, addr_width, data_width)
+    slave = APBSlaveModel(data_width, [reg.init for reg in regs])
+    transport = APBTransport(bus, io, slave)
+    return RegisterDriver(regs, data_width, transport), transport, slave
+
+
+def test_transport_back_to_back():
+    regs = tuple(Register(f"reg_{i}", init=i) for i in range(4))
+    _, transport, slave = make_driver(regs)
+    transport.run([(APBCommand.WRITE, addr, 0x10 + addr) for addr in range(4)])
+    # Each transfer takes a SETUP and an ACCESS cycle, the next transfer
+    # starts in the cycle the previous one completes
+    assert transport.cycles == 2 * 4 + 1
+    assert slave.values == [0x10, 0x11, 0x12, 0x13]
+    assert transport.read(2) == 0x12
+
+
+def test_driver_shadow_cache():
+    regs = (Register("ctrl", init=3), Register("status", has_ce=True),
+            Register("src"), Register("dst"))
+    driver, transport, slave = make_driver(regs)
+
+    # Software-only registers are served from the shadow copy
+    assert driver["ctrl"] == 3
+    assert transport.transfers == 0
+
+    # Writes are coalesced until flushed, writes of the current value are
+    # skipped
+    driver["src"] = 0x100
+    driver["src"] = 0x200
+    driver["dst"] = 0x300
+    driver["ctrl"] = 3
+    assert transport.transfers == 0
+    assert driver["src"] == 0x200
+    driver.flush()
+    assert transport.transfers == 2
+    assert slave.values[2:] == [0x200, 0x300]
+    assert driver.skipped_writes == 2
+
+    # Registers updated by hardware are read from the bus, after the pending
+    # writes
+    driver["ctrl"] = 1
+    slave.values[1] = 0xABC
+    assert driver["status"] == 0xABC
+    assert slave.values[0] == 1
+    assert transport.transfers == 4
+
+    # Writing back the value a pending write replaced drops the write
+    driver["dst"] = 0x400
+    driver["dst"] = 0x300
+    driver.flush()
+    assert transport.transfers == 4
+
+
+def test_driver_access_modes():
+    regs = (Register("ctrl"), Register("irq", access="ro"),
+            Register("start", access="wo"), Register("status", has_ce=True))
+    driver, transport, slave = make_driver(regs)
+
+    # Pulse registers are never cached: writing the same value twice issues
+    # two transfers
+    driver["start"] = 1
+    driver["start"] = 1
+    assert transport.transfers == 2
+    slave.values[1] = 0x5
+    assert driver["irq"] == 0x5
+    assert transport.transfers == 3
+    with pytest.raises(ValueError):
+        driver["irq"] = 0
+    with pytest.raises(ValueError):
+        driver["start"]
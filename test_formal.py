@@ -0,0 +1,53 @@
+import shutil
+import pytest
+from formal import TOOLS, harness, verify, failed_property
+from reg_file import RegisterFileGenerator
+from register import Register
+
+
+def test_formal_harness_access_modes():
+    regs = (Register("irq", access="ro"), Register("go", access="wo"))
+    circuit = RegisterFileGenerator(regs, 16)
+    source, properties = harness(circuit, regs, 16)
+    lines = source.splitlines()
+    line_of = {name: line for line, name in properties.items()}
+    assert sorted(line_of) == sorted([
+        "ready_in_access", "read_data_irq", "read_data_go", "reset_go",
+        "write_go", "hold_go"])
+    assert "apb_PRDATA == irq_d" in lines[line_of["read_data_irq"] - 1]
+    assert "go_q == 16'd0" in lines[line_of["hold_go"] - 1]
+
+
+def test_formal_harness():
+    regs = (Register("a", init=3), Register("b", has_ce=True))
+    circuit = RegisterFileGenerator(regs, 12)
+    source, properties = harness(circuit, regs, 12)
+    lines = source.splitlines()
+    line_of = {name: line for line, name in properties.items()}
+    assert sorted(line_of) == sorted([
+        "ready_in_access", "read_data_a", "read_data_b", "reset_a",
+        "write_a", "hold_a", "reset_b", "write_b", "update_b", "hold_b"])
+    for line in properties:
+        assert lines[line - 1].strip().startswith("assert")
+    assert "a_q == 12'd3" in lines[line_of["reset_a"] - 1]
+    # Only registers with a hardware update port have an update property
+    assert "a_en" not in source
+    assert "a_d" not in source
+    assert f"{circuit.name} dut (" in source
+
+    log = f"Assert failed in {circuit.name}_formal: " \
+        f"build/formal/x_formal.sv:{line_of['hold_b']}"
+    assert failed_property(log, properties) == "hold_b"
+    assert failed_property("", properties) is None
+
+
+@pytest.mark.skipif(any(shutil.which(tool) is None for tool in TOOLS),
+                    reason="yosys and yosys-smtbmc are required")
+@pytest.mark.parametrize("data_width", [12, 32])
+def test_formal_verify(tmp_path, data_width):
+    regs = (Register("ctrl", init=1), Register("status", has_ce=True),
+            Register("src"), Register("dst", has_ce=True, init=7),
+            Register("irq", access="ro"), Register("start", access="wo"))
+    result = verify(regs, data_width, depth=8, induction=True,
+                    directory=str(tmp_path))
+    assert result.passed, result.log
@@ -0,0 +1,108 @@
+import shutil
+import pytest
+from apb_model import APBBus, APBCommand, APBSlaveModel, make_request
+from driver import APBTransport
+from fuzz import Transaction, random_case, stimulus, model, compare, \
+    shrink, run_case
+from register import Register
+
+
+def test_fuzz_model_matches_slave_model():
+    case = random_case(1, 500)
+    regs = tuple(Register(reg.name, reg.init) for reg in case.regs)
+    transactions = [t._replace(hw_reg=None, strobe=(1 << 8) - 1)
+                    for t in case.transactions if t.command != "idle"]
+    inputs, owner = stimulus(regs, transactions)
+    expected = model(regs, case.data_width, inputs)
+
+    addr_width = max(1, (len(regs) - 1).bit_length())
+    bus = APBBus(addr_width, case.data_width)
+    io, _ = make_request(0, 0, addr_width, case.data_width)
+    slave = APBSlaveModel(case.data_width, [reg.init for reg in regs])
+    transport = APBTransport(bus, io, slave)
+    commands = {"write": APBCommand.WRITE, "read": APBCommand.READ}
+    data = transport.run([(commands[t.command], t.address, t.data)
+                          for t in transactions])
+
+    reads = [d for d, t in zip(data, transactions) if t.command == "read"]
+    access = (inputs["apb_PENABLE"] == 1) & (inputs["apb_PWRITE"] == 0)
+    assert expected["apb_PRDATA"][access].tolist() == reads
+    # The model reports the values sampled before each clock edge, the last
+    # transaction may be a write
+    if transactions[-1].command == "read":
+        assert [int(expected[f"{reg.name}_q"][-1]) for reg in regs] == \
+            slave.values
+
+
+def test_fuzz_hardware_update():
+    regs = (Register("a", init=1), Register("b", has_ce=True))
+    transactions = [
+        Transaction("idle", hw_reg=1, hw_data=0x55),
+        Transaction("read", 1),
+        # The bus write takes priority over the hardware update of the same
+        # register, the update of another register is not affected by a write
+        Transaction("write", 1, 0xAA, 0xF, hw_reg=1, hw_data=0x66),
+        Transaction("write", 0, 0x77, 0xF, hw_reg=1, hw_data=0x88),
+        Transaction("read", 1),
+    ]
+    inputs, owner = stimulus(regs, transactions)
+    assert owner.tolist() == [0, 1, 1, 2, 2, 3, 3, 4, 4]
+    expected = model(regs, 32, inputs)
+    assert expected["b_q"].tolist() == [0, 0x55, 0x55, 0x55, 0x55, 0xAA,
+                                        0xAA, 0x88, 0x88]
+    assert expected["a_q"][-1] == 0x77
+    assert expected["apb_PRDATA"][[2, 8]].tolist() == [0x55, 0x88]
+
+    actual = dict(expected, b_q=expected["b_q"].copy())
+    actual["b_q"][7] = 0xAA
+    mismatch = compare(regs, inputs, owner, expected, actual)
+    assert (mismatch.cycle, mismatch.transaction, mismatch.port) == \
+        (7, 4, "b_q")
+    assert compare(regs, inputs, owner, expected, expected) is None
+
+    # The lanes not written keep the value before the edge, not the update
+    regs = (Register("a", init=0x1111, access="hw"), )
+    transactions = [Transaction("write", 0, 0xAAAA, 0x1, hw_reg=0,
+                                hw_data=0x5555), Transaction("read", 0)]
+    inputs, owner = stimulus(regs, transactions)
+    expected = model(regs, 32, inputs)
+    assert expected["a_q"][-1] == 0x11AA
+    assert expected["apb_PRDATA"][-1] == 0x11AA
+
+
+def test_fuzz_status_and_pulse():
+    regs = (Register("irq", access="ro"), Register("go", access="wo"))
+    transactions = [
+        Transaction("read", 0, hw_reg=0, hw_data=0x12),
+        Transaction("write", 1, 0x3456, 0x2),
+        Transaction("read", 1),
+        # Writes to status registers are ignored
+        Transaction("write", 0, 0xFF, 0xF),
+    ]
+    inputs, owner = stimulus(regs, transactions)
+    assert "irq_en" not in inputs and "go_d" not in inputs
+    expected = model(regs, 16, inputs)
+    assert "irq_q" not in expected
+    assert expected["apb_PRDATA"][[1, 5]].tolist() == [0x12, 0]
+    # The written byte lanes are visible for one cycle
+    assert expected["go_q"].tolist() == [0, 0, 0, 0, 0x3400, 0, 0, 0]
+
+
+def test_fuzz_shrink():
+    transactions = list(range(100))
+    calls = []
+
+    def fails(transactions):
+        calls.append(transactions)
+        return 17 in transactions and 61 in transactions
+
+    assert shrink(transactions, fails) == [17, 61]
+    assert len(calls) < 100
+
+
+@pytest.mark.skipif(shutil.which("verilator") is None,
+                    reason="verilator is not installed")
+def test_fuzz_rtl(tmp_path):
+    case = random_case(0, 2000)
+    result = run_case(case, directory=str(tmp_path))
+    assert result.mismatch is None, result.shrunk
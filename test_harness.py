@@ -0,0 +1,72 @@
+import fault
+import pytest
+from apb_model import APBBus, StimulusTable, make_request, write
+from harness import ResultCache, fingerprint, verilator_flags
+from reg_file import RegisterFileGenerator
+from register import Register
+
+
+def test_verilator_flags():
+    assert verilator_flags() == ["--trace"]
+    assert verilator_flags(threads=4, jobs=8, trace=False) == \
+        ["--threads", "4", "-j", "8"]
+
+
+def test_verilator_flags_threads():
+    with pytest.raises(ValueError):
+        verilator_flags(threads=0)
+
+
+def test_fingerprint(tmp_path):
+    verilog = tmp_path / "RegFile.v"
+    verilog.write_text("module RegFile;\nendmodule\n")
+    actions = ["Poke(RegFile.a, 1)", "Step(RegFile.CLK, 2)"]
+    options = {"flags": ["--trace"]}
+    key = fingerprint(str(verilog), actions, options)
+    assert key == fingerprint(str(verilog), list(actions), dict(options))
+    # Any change of the Verilog, the actions or the options is a new scenario
+    assert key != fingerprint(str(verilog), actions[:1], options)
+    assert key != fingerprint(str(verilog), actions, {"flags": []})
+    verilog.write_text("module RegFile;\n\nendmodule\n")
+    assert key != fingerprint(str(verilog), actions, options)
+
+
+def test_result_cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    trace = tmp_path / "logs" / "RegFile.vcd"
+    trace.parent.mkdir()
+    trace.write_text("$enddefinitions $end\n")
+    assert not cache.get("ab12")
+
+    cache.put("ab12", [str(trace)])
+    trace.write_text("")
+    restore = tmp_path / "restored"
+    assert cache.get("ab12", restore_to=str(restore))
+    assert (restore / "RegFile.vcd").read_text() == "$enddefinitions $end\n"
+    # Files that were not produced (e.g. a run without trace) are skipped
+    cache.put("cd34", [str(tmp_path / "missing.vcd")])
+    assert cache.get("cd34", restore_to=str(restore))
+    assert not cache.get("ef56")
+
+
+def test_fingerprint_stimulus_files(tmp_path):
+    regs = tuple(Register(f"reg_{i}") for i in range(2))
+    RegFile = RegisterFileGenerator(regs, 8)
+    verilog = tmp_path / f"{RegFile.name}.v"
+    verilog.write_text("module RegFile;\nendmodule\n")
+
+    def replay(data):
+        tester = fault.Tester(RegFile, clock=RegFile.apb.PCLK)
+        bus = APBBus(1, 8)
+        table = StimulusTable(tester, bus)
+        io, request = make_request(0, 0, 1, 8)
+        request.address = type(request.address)(1)
+        request.data = type(request.data)(data)
+        write(bus, io, request, tester, 1, data)
+        table.replay(str(tmp_path))
+        return fingerprint(str(verilog), tester.actions, {})
+
+    # Each tester gets new fault loop variables, which must not change the
+    # key, the same actions reading different table files must
+    assert replay(0x12) == replay(0x12)
+    assert replay(0x12) != replay(0x34)
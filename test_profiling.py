@@ -0,0 +1,63 @@
+import json
+import os
+import profiling
+
+
+def test_profiler_phases():
+    profiler = profiling.Profiler()
+    with profiling.activate(profiler):
+        with profiling.phase("outer"):
+            with profiling.phase("inner"):
+                sum(range(1000))
+            with profiling.phase("inner"):
+                pass
+    # Phases are not recorded without an active profiler
+    with profiling.phase("ignored"):
+        pass
+
+    assert [phase.stack for phase in profiler.phases] == [
+        ("outer", "inner"), ("outer", "inner"), ("outer", )
+    ]
+    totals = profiler.totals()
+    assert totals["inner"]["calls"] == 2
+    assert totals["outer"]["wall"] >= totals["inner"]["wall"]
+    assert totals["outer"]["peak_rss"] > 0
+
+    self_times = profiler.self_times()
+    assert abs(self_times[("outer", )] + self_times[("outer", "inner")] -
+               totals["outer"]["wall"]) < 1e-9
+    lines = profiler.folded().splitlines()
+    assert [line.split()[0] for line in lines] == ["outer;inner", "outer"]
+
+
+def test_profiler_session(tmp_path):
+    test = profiling.Profiler()
+    with test.phase("compile_and_run"):
+        pass
+    session = profiling.Profiler()
+    session.extend(test, prefix=("test_a", ))
+    session.extend(test, prefix=("test_b", ))
+    assert session.totals()["compile_and_run"]["calls"] == 2
+
+    basename = os.path.join(tmp_path, "profile", "session")
+    session.write(basename)
+    with open(basename + ".json") as f:
+        report = json.load(f)
+    assert [phase["stack"] for phase in report["phases"]] == [
+        ["test_a", "compile_and_run"], ["test_b", "compile_and_run"]
+    ]
+    with open(basename + ".folded") as f:
+        assert f.read().startswith("test_a;compile_and_run ")
+
+
+def test_profiler_wrap():
+    class Tool:
+        @staticmethod
+        def run(command):
+            return command
+
+    profiling.wrap(Tool, "run", lambda command: f"run:{command}")
+    profiler = profiling.Profiler()
+    with profiling.activate(profiler):
+        assert Tool.run("verilator") == "verilator"
+    assert profiler.phases[0].stack == ("run:verilator", )
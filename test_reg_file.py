@@ -1,8 +1,13 @@
 from apb_model import APBBus, APBBusIO, Request, APB, APBCommand, \
-    set_apb_inputs, make_request, step, write, read
+    set_apb_inputs, make_request, step, write, read, idle, StimulusTable, \
+    bind_apb_inputs
+from axi_model import AXI4LiteBus, AXI4LiteSlaveModel, make_axi4lite_io, \
+    bind_axi_inputs
 from reg_file import RegisterFileGenerator, Register
+from harness import compile_and_run
 import magma as m
 import fault
+import os
 from dataclasses import fields
 
 
@@ -23,9 +28,7 @@ def test_simple_write():
     write(bus, io, request, tester, addr, data)
     getattr(tester.circuit, f"reg_{addr}_q").expect(data)
 
-    tester.compile_and_run(target="verilator", magma_output="coreir-verilog",
-                           magma_opts={"verilator_debug": True},
-                           flags=["--trace"])
+    compile_and_run(tester)
 
 
 def test_simple_write_read():
@@ -45,9 +48,120 @@ def test_simple_write_read():
 
     read(bus, io, request, tester, addr, data)
 
-    tester.compile_and_run(target="verilator", magma_output="coreir-verilog",
-                           magma_opts={"verilator_debug": True},
-                           flags=["--trace"])
+    compile_and_run(tester)
+
+
+def test_write_idle_read():
+    data_width = 32
+    regs = tuple(Register(f"reg_{i}", init=i, has_ce=True) for i in range(4))
+    RegFile = RegisterFileGenerator(regs, data_width)
+    tester = fault.Tester(RegFile, clock=RegFile.apb.PCLK)
+    tester.circuit.apb.PRESETn = 1
+
+    addr_width = m.bitutils.clog2(len(regs))
+    bus = APBBus(addr_width, data_width)
+    addr = 2
+    data = 0xCAFE
+    io, request = make_request(addr, data, addr_width, data_width)
+    write(bus, io, request, tester, addr, data)
+    num_actions = len(tester.actions)
+    # A long idle gap is a single step action after poking the inputs
+    idle(bus, io, tester, 10000)
+    assert len(tester.actions) - num_actions == \
+        len(bind_apb_inputs(tester, bus).ports) + 1
+    getattr(tester.circuit, f"reg_{addr}_q").expect(data)
+    read(bus, io, request, tester, addr, data)
+
+    compile_and_run(tester)
+
+
+def test_hw_update_during_write():
+    data_width = 32
+    regs = tuple(Register(f"reg_{i}", init=i, has_ce=True) for i in range(4))
+    RegFile = RegisterFileGenerator(regs, data_width)
+    tester = fault.Tester(RegFile, clock=RegFile.apb.PCLK)
+    tester.circuit.apb.PRESETn = 1
+
+    addr_width = m.bitutils.clog2(len(regs))
+    bus = APBBus(addr_width, data_width)
+    io, request = make_request(0, 0xCAFE, addr_width, data_width)
+    # A hardware update of a register is not overridden by a bus write to
+    # another register
+    tester.circuit.reg_1_en = 1
+    tester.circuit.reg_1_d = 0x55
+    write(bus, io, request, tester, 0, 0xCAFE)
+    tester.circuit.reg_1_en = 0
+    tester.circuit.reg_0_q.expect(0xCAFE)
+    tester.circuit.reg_1_q.expect(0x55)
+
+    compile_and_run(tester)
+
+
+def test_access_modes():
+    data_width = 32
+    regs = (Register("ctrl"), Register("irq", access="ro"),
+            Register("start", access="wo"), Register("status", has_ce=True))
+    RegFile = RegisterFileGenerator(regs, data_width)
+    # Only the ports needed by each access mode
+    ports = set(RegFile.interface.ports)
+    assert {"ctrl_q", "irq_d", "start_q", "status_d", "status_en",
+            "status_q"} <= ports
+    assert not ports & {"ctrl_d", "irq_q", "irq_en", "start_d"}
+
+    tester = fault.Tester(RegFile, clock=RegFile.apb.PCLK)
+    tester.circuit.apb.PRESETn = 1
+    tester.circuit.status_en = 0
+
+    addr_width = m.bitutils.clog2(len(regs))
+    bus = APBBus(addr_width, data_width)
+    io, request = make_request(0, 0, addr_width, data_width)
+    write(bus, io, request, tester, 0, 0x12)
+    tester.circuit.ctrl_q.expect(0x12)
+
+    # Writes of pulse registers are visible for a single cycle
+    write(bus, io, request, tester, 2, 0x1)
+    tester.circuit.start_q.expect(0x1)
+    idle(bus, io, tester, 1)
+    tester.circuit.start_q.expect(0)
+    tester.circuit.ctrl_q.expect(0x12)
+
+    # Status registers read the hardware input, pulse registers read 0
+    tester.circuit.irq_d = 0xAB
+    read(bus, io, request, tester, 1, 0xAB)
+    read(bus, io, request, tester, 2, 0)
+
+    compile_and_run(tester)
+
+
+def test_banks():
+    data_width = 32
+    regs = (Register("ctrl", init=1), Register("status", has_ce=True))
+    banks = 3
+    RegFile = RegisterFileGenerator(regs, data_width, banks=banks)
+    assert set(RegFile.interface.ports) == {"apb", "d", "en", "q"}
+    assert len(RegFile.q) == banks
+
+    tester = fault.Tester(RegFile, clock=RegFile.apb.PCLK)
+    tester.circuit.apb.PRESETn = 1
+    for bank in range(banks):
+        tester.circuit.en[bank].status = 0
+
+    addr_width = m.bitutils.clog2(len(regs) * banks)
+    bus = APBBus(addr_width, data_width)
+    io, request = make_request(0, 0, addr_width, data_width)
+    for bank in range(banks):
+        # Register `j` of bank `b` is at address `b * len(regs) + j`
+        addr = bank * len(regs)
+        write(bus, io, request, tester, addr, 0x100 + bank)
+        tester.circuit.q[bank].ctrl.expect(0x100 + bank)
+    tester.circuit.en[1].status = 1
+    tester.circuit.d[1].status = 0xAB
+    idle(bus, io, tester, 1)
+    tester.circuit.en[1].status = 0
+    read(bus, io, request, tester, 3, 0xAB)
+    read(bus, io, request, tester, 4, 0x102)
+
+    compile_and_run(tester)
 
 
 def test_write_then_reads():
@@ -70,6 +184,122 @@ def test_write_then_reads():
         io, request = make_request(addr, data, addr_width, data_width)
         read(bus, io, request, tester, addr, data)
 
-    tester.compile_and_run(target="verilator", magma_output="coreir-verilog",
-                           magma_opts={"verilator_debug": True},
-                           flags=["--trace"])
+    compile_and_run(tester)
+
+
+def test_partial_write():
+    data_width = 32
+    regs = tuple(Register(f"reg_{i}", init=i, has_ce=True) for i in range(4))
+    RegFile = RegisterFileGenerator(regs, data_width)
+    tester = fault.Tester(RegFile, clock=RegFile.apb.PCLK)
+    tester.circuit.apb.PRESETn = 1
+
+    addr_width = m.bitutils.clog2(len(regs))
+    bus = APBBus(addr_width, data_width)
+    addr = 2
+    io, request = make_request(addr, 0x12345678, addr_width, data_width)
+    write(bus, io, request, tester, addr, 0x12345678)
+
+    # Update the second byte in a single transfer
+    io, request = make_request(addr, 0xAB00, addr_width, data_width,
+                               strobe=0b0010)
+    write(bus, io, request, tester, addr, 0xAB00)
+    getattr(tester.circuit, f"reg_{addr}_q").expect(0x1234AB78)
+    read(bus, io, request, tester, addr, 0x1234AB78)
+
+    compile_and_run(tester)
+
+
+def test_write_then_reads_table():
+    data_width = 32
+    regs = tuple(Register(f"reg_{i}", init=i, has_ce=True) for i in range(4))
+    RegFile = RegisterFileGenerator(regs, data_width)
+    tester = fault.Tester(RegFile, clock=RegFile.apb.PCLK)
+    tester.circuit.apb.PRESETn = 1
+
+    addr_width = m.bitutils.clog2(len(regs))
+    bus = APBBus(addr_width, data_width)
+    # Record the stimulus in a table replayed by a fixed loop instead of
+    # appending actions per cycle
+    table = StimulusTable(tester, bus)
+    values = [0xDE, 0xAD, 0xBE, 0xEF] * 16
+    io, request = make_request(0, 0, addr_width, data_width)
+    for i, data in enumerate(values):
+        request.address = type(request.address)(i % len(regs))
+        request.data = type(request.data)(data)
+        write(bus, io, request, tester, i % len(regs), data)
+        read(bus, io, request, tester, i % len(regs), data)
+    table.replay()
+    num_actions = len(tester.actions)
+
+    compile_and_run(tester)
+    table.check_trace(os.path.join("build", "logs", f"{RegFile.name}.vcd"))
+    # The action list does not grow with the number of transfers
+    assert num_actions < 32
+
+
+def test_generator_cache():
+    # Equal register descriptions are the same generator cache entry
+    regs_a = tuple(Register(f"reg_{i}", init=i, has_ce=True)
+                   for i in range(4))
+    regs_b = tuple(Register(f"reg_{i}", init=i, has_ce=True)
+                   for i in range(4))
+    assert RegisterFileGenerator(regs_a, 32) is \
+        RegisterFileGenerator(regs_b, 32)
+    assert RegisterFileGenerator(regs_a, 32) is not \
+        RegisterFileGenerator(regs_a, 16)
+
+
+def test_generator_name():
+    # Register files with the same register names but different parameters
+    # get distinct circuit names, so they can share a CoreIR context
+    regs_a = tuple(Register(f"reg_{i}", init=i) for i in range(4))
+    regs_b = tuple(Register(f"reg_{i}") for i in range(4))
+    names = {RegisterFileGenerator(regs_a, 32).name,
+             RegisterFileGenerator(regs_b, 32).name,
+             RegisterFileGenerator(regs_a, 16).name,
+             RegisterFileGenerator(regs_a, 32, apb_slave_id=1).name}
+    assert len(names) == 4
+    assert all(name.startswith("RegFile_reg_0_reg_1_reg_2_reg_3_")
+               for name in names)
+    assert RegisterFileGenerator(regs_a, 32).name == \
+        RegisterFileGenerator(tuple(regs_a), 32).name
+
+
+def test_axi4lite_write_then_reads():
+    data_width = 64
+    regs = tuple(Register(f"reg_{i}", init=i, has_ce=True) for i in range(4))
+    RegFile = RegisterFileGenerator(regs, data_width, interface="axi4lite")
+    tester = fault.Tester(RegFile, clock=RegFile.axi.ACLK)
+    tester.circuit.axi.ARESETn = 1
+
+    addr_width = m.bitutils.clog2(len(regs))
+    bus = AXI4LiteBus(addr_width, data_width)
+    slave = AXI4LiteSlaveModel(data_width, [reg.init for reg in regs])
+    io = make_axi4lite_io(addr_width, data_width)
+    binding = bind_axi_inputs(tester, bus)
+
+    # Writes and reads are issued back to back on their own channels
+    values = [0xDEADBEEF_00000000 + i for i in range(len(regs))]
+    for addr, data in enumerate(values):
+        bus.write(addr, data)
+    for addr in range(len(regs)):
+        bus.read(addr)
+    while True:
+        bus(io)
+        idle = bus.idle
+        binding.step()
+        slave(io)
+        # The registered outputs of the RTL after the clock edge match the
+        # model
+        binding.expect("BVALID", slave.bvalid)
+        binding.expect("RVALID", slave.rvalid)
+        if slave.rvalid:
+            binding.expect("RDATA", slave.rdata)
+        if idle:
+            break
+
+    for addr, data in enumerate(slave.values):
+        getattr(tester.circuit, f"reg_{addr}_q").expect(data)
+
+    compile_and_run(tester)
@@ -0,0 +1,81 @@
+import shutil
+import subprocess
+import numpy as np
+import pytest
+from fuzz import RTL, random_case, stimulus, model, compare
+from reg_file import MAX_NAME_LENGTH, RegisterFileGenerator
+from reg_file_verilog import emit, module_name, ports, write_verilog
+from register import Register
+from sim import leaf_ports
+
+
+REGS = (Register("a", init=5), Register("b", has_ce=True),
+        Register("c", access="ro"), Register("d", access="wo"))
+
+
+@pytest.mark.parametrize("data_width, banks", [(12, None), (32, None),
+                                               (32, 3)])
+def test_ports_match_generator(data_width, banks):
+    circuit = RegisterFileGenerator(REGS, data_width, banks=banks)
+    expected = [(name, "input" if T.is_input() else "output",
+                 T.flat_length())
+                for name, T in leaf_ports(circuit.IO)]
+    actual = [(name, direction, width or 1)
+              for name, direction, width in ports(REGS, data_width,
+                                                  banks=banks)]
+    assert actual == expected
+    assert emit(REGS, data_width, banks=banks).startswith(
+        f"module {circuit.name} (")
+
+
+def test_emit():
+    source = emit(REGS, 16, name="RegFile")
+    # Indexed write decode and one case item per readable register
+    assert "wire [3:0] ce = {4{write}} & (4'd1 << apb_PADDR);" in source
+    assert "2'd2: apb_PRDATA = c_d;" in source
+    assert "2'd3:" not in source
+    # Only the logic needed by each access mode
+    assert "c_q" not in source
+    assert "else if (b_en)" in source and "a_en" not in source
+    assert "a_q <= 16'h5;" in source
+    with pytest.raises(ValueError):
+        emit(REGS, 16, banks=0)
+
+
+def test_write_verilog_large(tmp_path):
+    # One name part per register would be too long for a file name
+    regs = tuple(Register(f"reg_{i}", access=("rw", "hw")[i % 2])
+                 for i in range(512))
+    path = write_verilog(str(tmp_path), regs, 32)
+    name = module_name(regs, 32)
+    assert name.startswith("RegFile_512_") and len(name) <= MAX_NAME_LENGTH
+    assert path == str(tmp_path / f"{name}.v")
+    with open(path) as f:
+        assert f.read().startswith(f"module {name} (")
+    assert module_name(regs[:-1] + (Register("other"), ), 32) != name
+
+
+@pytest.mark.skipif(shutil.which("verilator") is None,
+                    reason="verilator is not installed")
+def test_lint(tmp_path):
+    for banks in (None, 2):
+        path = write_verilog(str(tmp_path), REGS, 32, banks=banks)
+        subprocess.run(["verilator", "--lint-only", "-Wall", path],
+                       check=True, capture_output=True)
+
+
+@pytest.mark.skipif(shutil.which("verilator") is None,
+                    reason="verilator is not installed")
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_equivalent_to_coreir(tmp_path, seed):
+    case = random_case(seed, 1000)
+    inputs, owner = stimulus(case.regs, case.transactions)
+    # Both builds share a directory, each must load its own model
+    coreir = RTL(case.regs, case.data_width, str(tmp_path))
+    direct = RTL(case.regs, case.data_width, str(tmp_path), direct=True)
+    assert direct.sim.lib._handle != coreir.sim.lib._handle
+    expected, actual = coreir.run(inputs), direct.run(inputs)
+    for port in expected:
+        np.testing.assert_array_equal(actual[port], expected[port], port)
+    assert compare(case.regs, inputs, owner,
+                   model(case.regs, case.data_width, inputs), actual) is None
@@ -0,0 +1,43 @@
+import pickle
+import pytest
+from register import Register
+
+
+def test_register_value_semantics():
+    assert Register("csr", init=1, has_ce=True) == \
+        Register("csr", init=1, has_ce=True)
+    assert Register("csr") != Register("csr", init=1)
+    assert Register("csr") != Register("ctrl")
+    regs_a = tuple(Register(f"reg_{i}", init=i) for i in range(4))
+    regs_b = tuple(Register(f"reg_{i}", init=i) for i in range(4))
+    assert hash(regs_a) == hash(regs_b)
+    assert len({regs_a, regs_b}) == 1
+
+
+def test_register_immutable():
+    reg = Register("csr")
+    with pytest.raises(AttributeError):
+        reg.init = 1
+    with pytest.raises(AttributeError):
+        reg.other = 1
+    assert not hasattr(reg, "__dict__")
+
+
+def test_register_pickle():
+    reg = Register("csr", init=3, has_ce=True)
+    assert pickle.loads(pickle.dumps(reg)) == reg
+
+
+def test_register_access():
+    assert Register("csr").access == "rw"
+    assert Register("status", has_ce=True).access == "hw"
+    assert Register("status", access="hw") == \
+        Register("status", has_ce=True)
+    assert Register("irq", access="ro").has_ce is False
+    assert Register("go", access="wo") != Register("go")
+    reg = Register("go", init=1, access="wo")
+    assert pickle.loads(pickle.dumps(reg)) == reg
+    with pytest.raises(ValueError):
+        Register("csr", access="rx")
+    with pytest.raises(ValueError):
+        Register("csr", has_ce=True, access="ro")
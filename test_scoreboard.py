@@ -0,0 +1,121 @@
+from apb_model import APBBus, APBCommand, make_request, apply_strobe
+from fuzz import Transaction, model, stimulus
+from register import Register
+from scoreboard import Scoreboard
+from traffic import TrafficGenerator, play
+import pytest
+
+
+def test_scoreboard_model():
+    addr_width, data_width = 2, 32
+    bus = APBBus(addr_width, data_width)
+    scoreboard = Scoreboard(data_width, {(0, i): 0 for i in range(4)})
+    registers = [0] * 4
+
+    def read_data(slave_id, address):
+        return registers[int(address)]
+
+    def update(slave_id, address, command, data, wait_states, strobe):
+        if command == APBCommand.WRITE:
+            registers[int(address)] = apply_strobe(registers[int(address)],
+                                                   data, strobe, data_width)
+
+    bus.add_monitor(update)
+    bus.add_monitor(scoreboard)
+    try:
+        io, request = make_request(0, 0, addr_width, data_width)
+        play(bus, io, TrafficGenerator(addr_width, data_width, seed=0,
+                                       max_wait_states=2,
+                                       wait_probability=0.5,
+                                       partial_write_ratio=0.5).take(200),
+             read_data=read_data)
+    finally:
+        bus.remove_monitor(update)
+        bus.remove_monitor(scoreboard)
+    assert scoreboard.reads > 0 and scoreboard.writes > 0
+    scoreboard.check()
+
+
+def write_trace(file_name, cycles):
+    """
+    Write a VCD with one entry per cycle in the order fault dumps them (the
+    state before the rising and falling clock edges)
+    """
+    names = ["PCLK", "PSEL0", "PENABLE", "PWRITE", "PREADY", "PADDR",
+             "PWDATA", "PRDATA", "PSTRB"]
+    ids = {name: chr(ord("!") + i) for i, name in enumerate(names)}
+    lines = ["$scope module TOP $end"]
+    for name in names:
+        lines.append(f"$var wire 32 {ids[name]} apb_{name} $end")
+    lines += ["$upscope $end", "$enddefinitions $end"]
+    time = 0
+    for cycle in cycles:
+        for clock in [0, 1]:
+            lines.append(f"#{time}")
+            lines.append(f"b{clock:b} {ids['PCLK']}")
+            for name, value in cycle.items():
+                lines.append(f"b{value:b} {ids[name]}")
+            time += 5
+    with open(file_name, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def test_scoreboard_trace(tmp_path):
+    idle = {"PSEL0": 0, "PENABLE": 0, "PREADY": 0}
+
+    def access(address, write, wdata=0, rdata=0, strobe=0xF):
+        return {"PSEL0": 1, "PENABLE": 1, "PREADY": 1, "PADDR": address,
+                "PWRITE": write, "PWDATA": wdata, "PRDATA": rdata,
+                "PSTRB": strobe if write else 0}
+
+    file_name = tmp_path / "trace.vcd"
+    write_trace(file_name, [
+        idle,
+        access(1, 1, wdata=0x2d),
+        idle,
+        access(1, 0, rdata=0x2d),
+        idle,
+        access(2, 0, rdata=0x5),
+        idle,
+        # Only update the second byte
+        access(1, 1, wdata=0xAB00, strobe=0b0010),
+        idle,
+        access(1, 0, rdata=0xAB2d),
+    ])
+    scoreboard = Scoreboard(32, {(0, i): 0 for i in range(4)})
+    scoreboard.check_trace(file_name)
+    assert scoreboard.writes == 2
+    assert scoreboard.reads == 3
+    assert [tuple(m) for m in scoreboard.mismatches] == [(6, 0, 2, 0, 5)]
+    with pytest.raises(AssertionError, match="cycle 6"):
+        scoreboard.check()
+
+
+def test_scoreboard_access_modes():
+    regs = (Register("ctrl", init=1), Register("irq", access="ro"),
+            Register("start", access="wo"))
+    scoreboard = Scoreboard.from_registers(regs, 32)
+    scoreboard(0, 2, APBCommand.WRITE, 0x1, 0)
+    # Status and pulse registers do not read back the written value
+    scoreboard(0, 1, APBCommand.READ, 0x77, 0)
+    scoreboard(0, 2, APBCommand.READ, 0, 0)
+    scoreboard(0, 0, APBCommand.READ, 0x2, 0)
+    assert scoreboard.reads == 3 and scoreboard.writes == 1
+    assert [mismatch.address for mismatch in scoreboard.mismatches] == [0]
+
+
+def test_scoreboard_hardware_update():
+    regs = (Register("a", init=1), Register("b", init=1, access="hw"))
+    transactions = [Transaction("write", 1, 0x22, 0xF),
+                    Transaction("idle", hw_reg=1, hw_data=0x55),
+                    Transaction("read", 1)]
+    inputs, _ = stimulus(regs, transactions)
+    prdata = model(regs, 32, inputs)["apb_PRDATA"]
+    # The read returns the value of the `b_en` update, not the written value
+    assert prdata[-1] == 0x55
+    scoreboard = Scoreboard.from_registers(regs, 32)
+    scoreboard(0, 1, APBCommand.WRITE, 0x22, 0, 0xF)
+    scoreboard(0, 1, APBCommand.READ, int(prdata[-1]), 0)
+    scoreboard(0, 0, APBCommand.READ, 0x1, 0)
+    assert scoreboard.reads == 2 and scoreboard.writes == 1
+    scoreboard.check()
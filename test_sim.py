@@ -0,0 +1,129 @@
+import shutil
+import magma as m
+import numpy as np
+import pytest
+from hwtypes import BitVector
+from apb_model import APBBus, APBCommand, make_request
+from reg_file import RegisterFileGenerator, Register
+from scoreboard import Scoreboard
+from sim import VerilatorSim
+
+
+pytestmark = pytest.mark.skipif(shutil.which("verilator") is None,
+                                reason="verilator is not installed")
+
+
+def reset(sim):
+    sim["apb_PRESETn"] = 0
+    sim.step()
+    sim["apb_PRESETn"] = 1
+
+
+def test_sim_apb_cosim():
+    data_width = 32
+    regs = tuple(Register(f"reg_{i}", init=i) for i in range(4))
+    RegFile = RegisterFileGenerator(regs, data_width)
+    sim = VerilatorSim(RegFile)
+    reset(sim)
+
+    addr_width = m.bitutils.clog2(len(regs))
+    bus = APBBus(addr_width, data_width)
+    io, request = make_request(0, 0, addr_width, data_width)
+    scoreboard = Scoreboard.from_registers(regs, data_width)
+    bus.add_monitor(scoreboard)
+    try:
+        transfers = [(APBCommand.READ, addr, 0) for addr in range(len(regs))]
+        transfers += [(APBCommand.WRITE, addr, 0xDEADBEEF ^ addr)
+                      for addr in range(len(regs))]
+        transfers += [(APBCommand.READ, addr, 0) for addr in range(len(regs))]
+        for command, addr, data in transfers:
+            request.command = command
+            request.address = BitVector[addr_width](addr)
+            request.data = BitVector[data_width](data)
+            bus(io)
+            sim.cycle(io)
+            request.command = APBCommand.IDLE
+            # The model holds PSEL until the slave completes the transfer
+            while io.apb.PSEL0:
+                bus(io)
+                sim.cycle(io)
+    finally:
+        bus.remove_monitor(scoreboard)
+
+    scoreboard.check()
+    assert scoreboard.reads == 2 * len(regs)
+    for addr in range(len(regs)):
+        assert sim[f"reg_{addr}_q"] == 0xDEADBEEF ^ addr
+    sim.close()
+
+
+def test_sim_run():
+    data_width = 32
+    regs = tuple(Register(f"reg_{i}") for i in range(4))
+    RegFile = RegisterFileGenerator(regs, data_width)
+    sim = VerilatorSim(RegFile)
+    reset(sim)
+
+    # Setup and access phase of a write to each register, then of a read of
+    # each register
+    values = np.array([0x01234567 * (i + 1) for i in range(len(regs))],
+                      dtype=np.uint32)
+    addresses = np.repeat(np.tile(np.arange(len(regs), dtype=np.uint8), 2),
+                          2)
+    cycles = len(addresses)
+    enable = np.tile(np.array([0, 1], dtype=np.uint8), cycles // 2)
+    write = np.repeat(np.array([1, 0], dtype=np.uint8), cycles // 2)
+    results = sim.run({
+        "apb_PSEL0": np.ones(cycles, dtype=np.uint8),
+        "apb_PENABLE": enable,
+        "apb_PWRITE": write,
+        "apb_PADDR": addresses,
+        "apb_PWDATA": np.tile(np.repeat(values, 2), 2),
+        "apb_PSTRB": np.full(cycles, 0xF, dtype=np.uint8),
+    }, outputs=["apb_PREADY", "apb_PRDATA"])
+
+    assert results["apb_PREADY"].tolist() == enable.tolist()
+    np.testing.assert_array_equal(results["apb_PRDATA"][cycles // 2 + 1::2],
+                                  values)
+    for addr, value in enumerate(values):
+        assert sim[f"reg_{addr}_q"] == value
+    sim.close()
+
+
+def test_sim_checkpoint(tmp_path):
+    data_width = 32
+    regs = tuple(Register(f"reg_{i}") for i in range(4))
+    RegFile = RegisterFileGenerator(regs, data_width)
+    sim = VerilatorSim(RegFile, savable=True)
+    reset(sim)
+
+    addr_width = m.bitutils.clog2(len(regs))
+    bus = APBBus(addr_width, data_width)
+    io, request = make_request(0, 0, addr_width, data_width)
+
+    def write(io, addr, data):
+        io.request.command = APBCommand.WRITE
+        io.request.address = BitVector[addr_width](addr)
+        io.request.data = BitVector[data_width](data)
+        bus(io)
+        sim.cycle(io)
+        io.request.command = APBCommand.IDLE
+        while io.apb.PSEL0:
+            bus(io)
+            sim.cycle(io)
+
+    # Configuration prologue shared by the scenarios
+    for addr in range(len(regs)):
+        write(io, addr, 0x100 + addr)
+    snapshot = bus.checkpoint()
+    file_name = str(tmp_path / "prologue.bin")
+    sim.save(file_name)
+
+    for scenario in range(3):
+        io = bus.restore(snapshot)
+        sim.restore(file_name)
+        assert [sim[f"reg_{addr}_q"] for addr in range(len(regs))] == \
+            [0x100 + addr for addr in range(len(regs))]
+        write(io, scenario, 0xF00 + scenario)
+        assert sim[f"reg_{scenario}_q"] == 0xF00 + scenario
+    sim.close()
@@ -2,7 +2,11 @@ from top import TopGenerator
 import fault
 from apb_model import APBBus, APBBusIO, Request, APB, APBCommand, \
     set_apb_inputs, make_request, step, write, read
+from scoreboard import Scoreboard
+from traffic import TrafficGenerator
+from harness import compile_and_run
 import magma as m
+import os
 import pytest
 
 
@@ -39,9 +43,7 @@ def test_top_simple_write(mode, num_slaves):
             getattr(getattr(tester.circuit, f"dma{i}"),
                     f"{field}").expect(data)
 
-    tester.compile_and_run(target="verilator", magma_output="coreir-verilog",
-                           magma_opts={"verilator_debug": True},
-                           flags=["--trace"])
+    compile_and_run(tester)
 
 
 @pytest.mark.parametrize("mode, num_slaves", [("pack", 1), ("distribute", 2)])
@@ -70,9 +72,7 @@ def test_top_simple_write_read(mode, num_slaves):
                     f"{field}").expect(data)
             read(bus, io, request, tester, addr, data)
 
-    tester.compile_and_run(target="verilator", magma_output="coreir-verilog",
-                           magma_opts={"verilator_debug": True},
-                           flags=["--trace"])
+    compile_and_run(tester)
 
 
 @pytest.mark.parametrize("mode, num_slaves", [("pack", 1), ("distribute", 2)])
@@ -113,6 +113,110 @@ def test_top_write_then_reads(mode, num_slaves):
                     f"{field}").expect(data)
             read(bus, io, request, tester, addr, data)
 
-    tester.compile_and_run(target="verilator", magma_output="coreir-verilog",
-                           magma_opts={"verilator_debug": True},
-                           flags=["--trace"])
+    compile_and_run(tester)
+
+
+@pytest.mark.parametrize("mode, num_slaves", [("pack", 1), ("distribute", 2)])
+def test_top_random_scoreboard(mode, num_slaves):
+    Top = TopGenerator(mode=mode)
+
+    tester = fault.Tester(Top, clock=Top.apb.PCLK)
+    tester.circuit.apb.PRESETn = 1
+
+    addr_width = len(Top.apb.PADDR)
+    data_width = len(Top.apb.PWDATA)
+    bus = APBBus(addr_width, data_width, num_slaves)
+    num_regs = len(dma_fields) * (2 if mode == "pack" else 1)
+    io, request = make_request(0, 0, addr_width, data_width, num_slaves)
+    gen = TrafficGenerator(addr_width, data_width, num_slaves, seed=0,
+                           num_regs=num_regs,
+                           partial_write_ratio=0.25)
+    for transfer in gen.take(64):
+        request.address = transfer.request.address
+        request.data = transfer.request.data
+        request.slave_id = transfer.request.slave_id
+        request.strobe = transfer.request.strobe
+        # Reads are checked against the trace by the scoreboard, so no
+        # expects are needed
+        if transfer.request.command == APBCommand.WRITE:
+            write(bus, io, request, tester, None, None, check=False)
+        else:
+            read(bus, io, request, tester, None, None, check=False)
+
+    compile_and_run(tester)
+
+    scoreboard = Scoreboard(data_width, {(slave_id, addr): 0
+                                         for slave_id in range(num_slaves)
+                                         for addr in range(num_regs)})
+    scoreboard.check_trace(os.path.join("build", "logs", f"{Top.name}.vcd"),
+                           num_slaves)
+    assert scoreboard.reads > 0
+    scoreboard.check()
+
+
+@pytest.mark.parametrize("mode, num_slaves", [("pack", 1), ("distribute", 3)])
+def test_top_num_dmas(mode, num_slaves):
+    num_dmas = 3
+    Top = TopGenerator(mode=mode, num_dmas=num_dmas)
+
+    tester = fault.Tester(Top, clock=Top.apb.PCLK)
+    tester.circuit.apb.PRESETn = 1
+
+    addr_width = len(Top.apb.PADDR)
+    data_width = len(Top.apb.PWDATA)
+    bus = APBBus(addr_width, data_width, num_slaves)
+    for i in range(num_dmas):
+        for addr, field in enumerate(dma_fields):
+            if mode == "pack":
+                addr += i * len(dma_fields)
+                slave_id = 0
+            else:
+                slave_id = i
+            data = fault.random.random_bv(data_width)
+            io, request = make_request(addr, data, addr_width, data_width,
+                                       num_slaves, slave_id)
+
+            write(bus, io, request, tester, addr, data)
+            getattr(getattr(tester.circuit, f"dma{i}"),
+                    f"{field}").expect(data)
+            read(bus, io, request, tester, addr, data)
+
+    compile_and_run(tester, threads=2)
+
+
+def test_top_num_dmas_error():
+    with pytest.raises(ValueError):
+        TopGenerator(num_dmas=0)
+
+
+@pytest.mark.parametrize("mode, num_slaves", [("pack", 1), ("distribute", 3)])
+def test_top_banked(mode, num_slaves):
+    num_dmas = 3
+    Top = TopGenerator(mode=mode, num_dmas=num_dmas, banked=True)
+    assert Top.name == f"Top_{mode}_3_banked"
+
+    tester = fault.Tester(Top, clock=Top.apb.PCLK)
+    tester.circuit.apb.PRESETn = 1
+
+    addr_width = len(Top.apb.PADDR)
+    data_width = len(Top.apb.PWDATA)
+    bus = APBBus(addr_width, data_width, num_slaves)
+    for i in range(num_dmas):
+        for addr, field in enumerate(dma_fields):
+            if mode == "pack":
+                # The banks of the packed register file are laid out one
+                # after the other
+                addr += i * len(dma_fields)
+                slave_id = 0
+            else:
+                slave_id = i
+            data = fault.random.random_bv(data_width)
+            io, request = make_request(addr, data, addr_width, data_width,
+                                       num_slaves, slave_id)
+
+            write(bus, io, request, tester, addr, data)
+            getattr(getattr(tester.circuit, f"dma{i}").regs,
+                    field).expect(data)
+            read(bus, io, request, tester, addr, data)
+
+    compile_and_run(tester)
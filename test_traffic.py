@@ -0,0 +1,73 @@
+import itertools
+import pytest
+from apb_model import APBCommand
+from traffic import TrafficGenerator
+
+
+def test_traffic_reproducible():
+    gen = TrafficGenerator(4, 32, num_slaves=2, seed=7, max_wait_states=3,
+                           wait_probability=0.5, max_idle_cycles=4)
+    first = [(t.request.command, t.request.address, t.request.data,
+              t.request.slave_id, t.wait_states, t.idle_cycles)
+             for t in gen.take(100)]
+    second = [(t.request.command, t.request.address, t.request.data,
+               t.request.slave_id, t.wait_states, t.idle_cycles)
+              for t in gen.take(100)]
+    assert first == second
+
+    other = TrafficGenerator(4, 32, num_slaves=2, seed=8, max_wait_states=3,
+                             wait_probability=0.5, max_idle_cycles=4)
+    assert first != [(t.request.command, t.request.address, t.request.data,
+                      t.request.slave_id, t.wait_states, t.idle_cycles)
+                     for t in other.take(100)]
+
+
+def test_traffic_constraints():
+    gen = TrafficGenerator(3, 32, num_slaves=2, seed=0, addresses=[1, 2, 5],
+                           address_weights=[1, 0, 1], write_ratio=1.0,
+                           slave_ids=[1], max_wait_states=2,
+                           wait_probability=1.0)
+    for transfer in gen.take(200):
+        request = transfer.request
+        assert request.command == APBCommand.WRITE
+        assert int(request.address) in [1, 5]
+        assert int(request.slave_id) == 1
+        assert 1 <= transfer.wait_states <= 2
+        assert transfer.idle_cycles == 0
+
+
+def test_traffic_write_ratio():
+    gen = TrafficGenerator(2, 32, seed=3, write_ratio=0.25)
+    writes = sum(t.request.command == APBCommand.WRITE
+                 for t in gen.take(4000))
+    assert 800 < writes < 1200
+
+
+def test_traffic_lazy():
+    # The stream is unbounded, so this only terminates if the transfers are
+    # generated on demand
+    gen = iter(TrafficGenerator(16, 32, seed=1))
+    assert sum(1 for _ in itertools.islice(gen, 10)) == 10
+
+
+def test_traffic_partial_writes():
+    gen = TrafficGenerator(2, 32, seed=5, write_ratio=1.0,
+                           partial_write_ratio=0.5)
+    strobes = [int(t.request.strobe) for t in gen.take(200)]
+    assert 0xF in strobes
+    assert any(strobe != 0xF for strobe in strobes)
+    assert all(0 <= strobe <= 0xF for strobe in strobes)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"addresses": [4]},
+    {"slave_ids": [1]},
+    {"write_ratio": 1.5},
+    {"partial_write_ratio": -0.1},
+    {"partial_write_ratio": 2},
+    {"wait_probability": -1},
+    {"wait_probability": 1.01},
+])
+def test_traffic_validation(kwargs):
+    with pytest.raises(ValueError):
+        TrafficGenerator(2, 32, **kwargs)
@@ -0,0 +1,45 @@
+from vcd import VCD
+
+
+VCD_TEXT = """\
+$timescale 1ps $end
+$scope module TOP $end
+$var wire 1 # apb_PCLK $end
+$var wire 2 $ apb_PADDR [1:0] $end
+$scope module RegFile $end
+$var wire 2 % apb_PADDR [1:0] $end
+$upscope $end
+$upscope $end
+$enddefinitions $end
+#0
+0#
+b00 $
+b00 %
+#5
+1#
+#10
+0#
+b10 $
+b10 %
+#15
+1#
+#20
+0#
+b01 $
+b01 %
+"""
+
+
+def test_vcd_find():
+    vcd = VCD.parse(VCD_TEXT.splitlines())
+    assert vcd.find("TOP.RegFile.apb_PADDR") == "%"
+    # Suffix matches resolve to the outermost signal
+    assert vcd.find("apb_PADDR") == "$"
+    assert vcd.widths["$"] == 2
+
+
+def test_vcd_sample():
+    vcd = VCD.parse(VCD_TEXT.splitlines())
+    # One sample per rising edge, the change at #20 happens after the last
+    # edge
+    assert vcd.sample("apb_PCLK", ["apb_PADDR"]) == [(0,), (2,)]
@@ -1,5 +1,5 @@
 import magma as m
-from reg_file import RegisterFileGenerator, Register
+from reg_file import RegisterFileGenerator, Register, RegisterBankType
 from apb import APBSlave, APBBase
 import math
 import mantle
@@ -18,56 +18,94 @@ class DMA(m.Circuit):
     io.txfr_len.unused()
 
 
+FIELDS = ["csr", "src_addr", "dst_addr", "txfr_len"]
+
+
+class ChannelDMA(m.Generator2):
+    """
+    Stub DMA module taking its registers as a single port of the type of a
+    register file bank, so a bank is wired in one operation
+    """
+    def __init__(self, data_width=32):
+        regs = tuple(Register(name) for name in FIELDS)
+        self.io = io = m.IO(
+            regs=m.In(RegisterBankType(regs, data_width, "q")))
+        io.regs.unused()
+
+
 class TopGenerator(m.Generator2):
-    def __init__(self, mode="pack"):
+    def __init__(self, mode="pack", num_dmas=2, banked=False):
         """
-        Simple example that instances two stub DMA modules and is paramtrizable
-        over distributed versus packed register file
+        Simple example that instances `num_dmas` stub DMA modules and is
+        paramtrizable over distributed versus packed register file
+
+        `banked` groups the registers of each DMA in a bank of the register
+        file (see `RegisterFileGenerator`), wired to a `ChannelDMA` in a
+        single connection
         """
 
         if mode not in ["pack", "distribute"]:
             raise ValueError(f"Unexpected mode {mode}")
+        if num_dmas < 1:
+            raise ValueError(f"Expected at least one DMA, got {num_dmas}")
 
-        fields = ["csr", "src_addr", "dst_addr", "txfr_len"]
+        fields = FIELDS
         data_width = 32
         if mode == "pack":
-            addr_width = math.ceil(math.log2(len(fields) * 2))
+            addr_width = math.ceil(math.log2(len(fields) * num_dmas))
         else:
             addr_width = math.ceil(math.log2(len(fields)))
 
         self.name = "Top_" + mode
+        if num_dmas != 2:
+            self.name += f"_{num_dmas}"
+        if banked:
+            self.name += "_banked"
         if mode == "pack":
             self.io = io = m.IO(apb=APBSlave(addr_width, data_width, 0))
         else:
-            self.io = io = m.IO(apb=APBSlave(addr_width, data_width, [0, 1]))
+            self.io = io = m.IO(apb=APBSlave(addr_width, data_width,
+                                             list(range(num_dmas))))
 
-        dmas = [DMA(name=f"dma{i}") for i in range(2)]
-        if mode == "pack":
-            regs = tuple(Register(name + str(i)) for i in range(2) for name in
-                         fields)
-            reg_file = RegisterFileGenerator(regs, data_width=32)(name="reg_file")
-            for i in range(2):
+        if banked:
+            dmas = [ChannelDMA(data_width)(name=f"dma{i}")
+                    for i in range(num_dmas)]
+        else:
+            dmas = [DMA(name=f"dma{i}") for i in range(num_dmas)]
+        if mode == "pack" and banked:
+            regs = tuple(Register(name) for name in fields)
+            reg_file = RegisterFileGenerator(
+                regs, data_width=32, banks=num_dmas)(name="reg_file")
+            for i in range(num_dmas):
+                m.wire(reg_file.q[i], dmas[i].regs)
+            m.wire(io.apb, reg_file.apb)
+        elif mode == "pack":
+            regs = tuple(Register(name + str(i)) for i in range(num_dmas)
+                         for name in fields)
+            reg_file = RegisterFileGenerator(
+                regs, data_width=32)(name="reg_file")
+            for i in range(num_dmas):
                 for name in fields:
                     m.wire(getattr(reg_file, name + str(i) + "_q"),
                            getattr(dmas[i], name))
             m.wire(io.apb, reg_file.apb)
-            for i in range(2):
-                for name in fields:
-                    m.wire(getattr(reg_file, name + str(i) + "_q"),
-                           getattr(reg_file, name + str(i) + "_d"))
         else:
             apb_outputs = {}
             for key, type_ in APBBase(addr_width, data_width).items():
                 if type_.is_input():
                     apb_outputs[key] = []
-            for i in range(2):
+            for i in range(num_dmas):
                 regs = tuple(Register(name) for name in fields)
                 reg_file = RegisterFileGenerator(
-                    regs, data_width=32, apb_slave_id=i
+                    regs, data_width=32, apb_slave_id=i,
+                    banks=1 if banked else None
                 )(name=f"reg_file{i}")
-                for name in fields:
-                    m.wire(getattr(reg_file, name + "_q"),
-                           getattr(dmas[i], name))
+                if banked:
+                    m.wire(reg_file.q[0], dmas[i].regs)
+                else:
+                    for name in fields:
+                        m.wire(getattr(reg_file, name + "_q"),
+                               getattr(dmas[i], name))
                 for key, type_ in APBBase(addr_width, data_width).items():
                     if type_.is_output():
                         m.wire(getattr(io.apb, key),
@@ -76,9 +114,20 @@ class TopGenerator(m.Generator2):
                         apb_outputs[key].append(getattr(reg_file.apb, key))
                 m.wire(getattr(io.apb, f"PSEL{i}"),
                        getattr(reg_file.apb, f"PSEL{i}"))
-                for name in fields:
-                    m.wire(getattr(reg_file, name + "_q"),
-                           getattr(reg_file, name + "_d"))
+            if num_dmas == 1:
+                for key, values in apb_outputs.items():
+                    m.wire(getattr(io.apb, key), values[0])
+                return
+            # Encode the (one-hot) PSEL signals into the index of the selected
+            # register file
+            select = []
+            for bit in range(m.bitutils.clog2(num_dmas)):
+                sel = None
+                for i in range(num_dmas):
+                    if i >> bit & 1:
+                        psel = getattr(io.apb, f"PSEL{i}")
+                        sel = psel if sel is None else sel | psel
+                select.append(sel)
+            select = select[0] if len(select) == 1 else m.bits(select)
             for key, values in apb_outputs.items():
-                m.wire(getattr(io.apb, key),
-                       mantle.mux(values, io.apb.PSEL1))
+                m.wire(getattr(io.apb, key), mantle.mux(values, select))
@@ -0,0 +1,199 @@
+import itertools
+import math
+import random
+from typing import NamedTuple
+from hwtypes import BitVector, Bit
+from apb_model import Request, APBCommand, slave_id_width
+
+
+class Transfer(NamedTuple):
+    """
+    A single generated transfer
+
+    `wait_states` is the number of cycles the slave should hold PREADY low in
+    the ACCESS phase and `idle_cycles` the number of idle cycles to insert
+    before the transfer
+    """
+    request: object
+    wait_states: int
+    idle_cycles: int
+
+
+class TrafficGenerator:
+    """
+    Generates a reproducible stream of constrained-random APB transfers
+
+    Transfers are produced lazily, so arbitrarily long streams can be consumed
+    without materializing them (e.g. `itertools.islice(gen, 1000000)`).
+    Iterating the same generator twice replays the same stream.
+
+    Parameters
+        `num_regs`: the number of registers of the register map (defaults to
+            the full address space)
+        `addresses`/`address_weights`: the register addresses to target and
+            their relative weights (defaults to `range(num_regs)`)
+        `write_ratio`: probability of a transfer being a write
+        `partial_write_ratio`: probability of a write only updating a random
+            subset of the byte lanes (PSTRB)
+        `slave_ids`/`slave_weights`: the slaves to target and their relative
+            weights (defaults to all `num_slaves` slaves)
+        `wait_probability`/`max_wait_states`: probability of a transfer
+            having wait states and the upper bound on their number
+        `max_idle_cycles`: upper bound on the idle gap before each transfer
+    """
+    def __init__(self, addr_width, data_width, num_slaves=1, seed=0,
+                 addresses=None, address_weights=None, write_ratio=0.5,
+                 slave_ids=None, slave_weights=None, wait_probability=0.0,
+                 max_wait_states=0, max_idle_cycles=0,
+                 partial_write_ratio=0.0, num_regs=None):
+        if num_regs is None:
+            num_regs = 1 << addr_width
+        if addresses is None:
+            addresses = range(num_regs)
+        if slave_ids is None:
+            slave_ids = range(num_slaves)
+        self.addresses = tuple(addresses)
+        self.slave_ids = tuple(slave_ids)
+        if any(addr >= (1 << addr_width) for addr in self.addresses):
+            raise ValueError(f"Address out of range for address width "
+                             f"{addr_width}: {self.addresses}")
+        if any(slave_id >= num_slaves for slave_id in self.slave_ids):
+            raise ValueError(f"Slave id out of range for {num_slaves} "
+                             f"slaves: {self.slave_ids}")
+        for name, ratio in (("write_ratio", write_ratio),
+                            ("partial_write_ratio", partial_write_ratio),
+                            ("wait_probability", wait_probability)):
+            if not 0 <= ratio <= 1:
+                raise ValueError(f"Expected {name} in [0, 1], got {ratio}")
+
+        self.addr_width = addr_width
+        self.data_width = data_width
+        self.num_slaves = num_slaves
+        self.seed = seed
+        self.address_weights = self._cumulative(address_weights,
+                                                self.addresses)
+        self.slave_weights = self._cumulative(slave_weights, self.slave_ids)
+        self.write_ratio = write_ratio
+        self.partial_write_ratio = partial_write_ratio
+        self.wait_probability = wait_probability
+        self.max_wait_states = max_wait_states
+        self.max_idle_cycles = max_idle_cycles
+
+    @staticmethod
+    def _cumulative(weights, values):
+        if weights is None:
+            return None
+        if len(weights) != len(values):
+            raise ValueError(f"Expected {len(values)} weights, got "
+                             f"{len(weights)}")
+        return tuple(itertools.accumulate(weights))
+
+    def __iter__(self):
+        rng = random.Random(self.seed)
+        _Request = Request(self.addr_width, self.data_width, self.num_slaves)
+        Address = BitVector[self.addr_width]
+        Data = BitVector[self.data_width]
+        SlaveId = BitVector[slave_id_width(self.num_slaves)]
+        strobe_width = math.ceil(self.data_width / 8)
+        Strobe = BitVector[strobe_width]
+        full_strobe = (1 << strobe_width) - 1
+
+        # Hoist the attribute lookups out of the loop, the stream is
+        # expected to be very long
+        addresses, address_weights = self.addresses, self.address_weights
+        slave_ids, slave_weights = self.slave_ids, self.slave_weights
+        write_ratio, data_width = self.write_ratio, self.data_width
+        partial_write_ratio = self.partial_write_ratio
+        wait_probability = self.wait_probability
+        max_wait_states = self.max_wait_states
+        max_idle_cycles = self.max_idle_cycles
+        choices, randint = rng.choices, rng.randint
+        getrandbits, rand = rng.getrandbits, rng.random
+
+        while True:
+            address = choices(addresses, cum_weights=address_weights)[0]
+            slave_id = choices(slave_ids, cum_weights=slave_weights)[0]
+            if rand() < write_ratio:
+                command = APBCommand.WRITE
+                data = getrandbits(data_width)
+                strobe = full_strobe
+                if partial_write_ratio and rand() < partial_write_ratio:
+                    strobe = getrandbits(strobe_width)
+            else:
+                command = APBCommand.READ
+                data = 0
+                strobe = 0
+            wait_states = 0
+            if max_wait_states and rand() < wait_probability:
+                wait_states = randint(1, max_wait_states)
+            idle_cycles = randint(0, max_idle_cycles) \
+                if max_idle_cycles else 0
+            request = _Request(command, Address(address), Data(data),
+                               SlaveId(slave_id), Strobe(strobe))
+            yield Transfer(request, wait_states, idle_cycles)
+
+    def take(self, n):
+        """
+        Returns an iterator over the first `n` transfers of the stream
+        """
+        return itertools.islice(self, n)
+
+
+def play(bus, io, transfers, read_data=None, on_cycle=None, on_idle=None):
+    """
+    Drive `transfers` through the `bus` model, with the test acting as the
+    slave (holding PREADY low for the requested number of wait states)
+
+    `read_data(slave_id, address)` provides PRDATA for reads (defaults to the
+    data of the request) and `on_cycle(io)` is called after every cycle (e.g.
+    to capture a `WaveForm`).  Idle gaps are fast-forwarded with `bus.idle`
+    and reported with a single `on_idle(io, cycles)` call (e.g.
+    `lambda io, cycles: waveform.step(io.apb, cycles)`), unless only
+    `on_cycle` is provided, in which case they are simulated cycle by cycle
+
+    Returns the number of cycles simulated
+    """
+    request = io.request
+    cycles = 0
+
+    def cycle():
+        bus(io)
+        if on_cycle is not None:
+            on_cycle(io)
+
+    for transfer in transfers:
+        if transfer.idle_cycles:
+            if on_cycle is not None and on_idle is None:
+                for _ in range(transfer.idle_cycles):
+                    cycle()
+            else:
+                bus.idle(io, transfer.idle_cycles)
+                if on_idle is not None:
+                    on_idle(io, transfer.idle_cycles)
+        next_request = transfer.request
+        request.address = next_request.address
+        request.data = next_request.data
+        request.slave_id = next_request.slave_id
+        request.strobe = next_request.strobe
+        request.command = next_request.command
+
+        # SETUP phase
+        cycle()
+        request.command = APBCommand.IDLE
+
+        # ACCESS phase
+        io.apb.PREADY = Bit(0)
+        cycle()
+        for _ in range(transfer.wait_states):
+            cycle()
+        io.apb.PREADY = Bit(1)
+        if next_request.command == APBCommand.READ:
+            if read_data is not None:
+                io.apb.PRDATA = type(request.data)(
+                    read_data(next_request.slave_id, next_request.address))
+            else:
+                io.apb.PRDATA = next_request.data
+        cycle()
+        io.apb.PREADY = Bit(0)
+        cycles += transfer.idle_cycles + transfer.wait_states + 3
+    return cycles
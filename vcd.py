@@ -0,0 +1,100 @@
+class VCD:
+    """
+    Minimal reader for the value change dump files produced by verilator's
+    `--trace` option
+
+    Values are stored as integers (unknown bits read as 0) in per-signal
+    lists of (time, value) changes
+    """
+    def __init__(self):
+        # Maps hierarchical signal names (e.g. "TOP.apb_PADDR") to VCD ids
+        self.ids = {}
+        self.widths = {}
+        self.changes = {}
+
+    @classmethod
+    def load(cls, file_name):
+        with open(file_name) as f:
+            return cls.parse(f)
+
+    @classmethod
+    def parse(cls, lines):
+        vcd = cls()
+        scope = []
+        lines = iter(lines)
+        for line in lines:
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0] == "$scope":
+                scope.append(tokens[2])
+            elif tokens[0] == "$upscope":
+                scope.pop()
+            elif tokens[0] == "$var":
+                width, id_, name = int(tokens[2]), tokens[3], tokens[4]
+                vcd.ids[".".join(scope + [name])] = id_
+                vcd.widths[id_] = width
+                vcd.changes.setdefault(id_, [])
+            elif tokens[0] == "$enddefinitions":
+                break
+
+        time = 0
+        changes = vcd.changes
+        for line in lines:
+            line = line.strip()
+            if not line or line[0] == "$":
+                continue
+            char = line[0]
+            if char == "#":
+                time = int(line[1:])
+            elif char in "bB":
+                value, id_ = line[1:].split()
+                value = value.replace("x", "0").replace("z", "0")
+                changes[id_].append((time, int(value, 2)))
+            elif char in "01xz":
+                changes[line[1:]].append((time, int(char == "1")))
+        return vcd
+
+    def find(self, name):
+        """
+        Returns the id of the signal `name`, which can be a full hierarchical
+        name or a suffix of one, in which case the outermost signal with
+        that name is used (e.g. "apb_PADDR" matches "TOP.apb_PADDR" over
+        "TOP.RegFile.apb_PADDR")
+        """
+        if name in self.ids:
+            return self.ids[name]
+        matches = [full_name for full_name in self.ids
+                   if full_name.endswith("." + name)]
+        if not matches:
+            raise KeyError(f"Signal {name} not found in trace")
+        return self.ids[min(matches, key=lambda x: x.count("."))]
+
+    def sample(self, clock, names):
+        """
+        Returns the values of signals `names` at each rising edge of `clock`
+        as a list of tuples (one per cycle)
+
+        fault dumps the state before each clock toggle, so the values recorded
+        with the clock high are the state after the rising edge with the
+        inputs poked for that cycle, i.e. what `expect` sees after
+        `tester.step(2)`
+        """
+        clock_changes = self.changes[self.find(clock)]
+        edges = [time for (time, value), (_, prev) in
+                 zip(clock_changes[1:], clock_changes) if value and not prev]
+        if clock_changes and clock_changes[0][1] and clock_changes[0][0]:
+            edges.insert(0, clock_changes[0][0])
+
+        columns = []
+        for name in names:
+            changes = self.changes[self.find(name)]
+            column = []
+            index, value = 0, 0
+            for time in edges:
+                while index < len(changes) and changes[index][0] <= time:
+                    value = changes[index][1]
+                    index += 1
+                column.append(value)
+            columns.append(column)
+        return list(zip(*columns))
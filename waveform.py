@@ -1,8 +1,18 @@
+import itertools
 import json
+from typing import NamedTuple
 from hwtypes import BitVector, Bit
 import os
 
 
+class Run(NamedTuple):
+    """
+    A sample repeated for a number of cycles
+    """
+    value: object
+    cycles: int
+
+
 class WaveForm(dict):
     def __init__(self, fields, clock_name=""):
         if clock_name:
@@ -11,52 +21,69 @@ class WaveForm(dict):
         for field in fields:
             self[field] = []
 
-    def step(self, obj):
-        self[self.clock_name].append(True)
+    def step(self, obj, cycles=1):
+        """
+        Sample the fields of `obj`, repeated for `cycles` cycles
+
+        Repeated samples are stored as a single `Run` entry, so capturing an
+        idle gap takes constant time and memory
+        """
+        if cycles < 1:
+            raise ValueError(f"Expected at least one cycle, got {cycles}")
         for field in self:
             if field == self.clock_name:
-                continue
-            self[field].append(getattr(obj, field))
+                value = True
+            else:
+                value = getattr(obj, field)
+            self[field].append(value if cycles == 1 else Run(value, cycles))
         # self[self.clock_name].append(1)
         # for field in self:
         #     if field == self.clock_name:
         #         continue
         #     self[field].append(getattr(obj, field))
 
-    def get_last_non_dot(self, wave):
-        for i in reversed(range(len(wave))):
-            if wave[i] != ".":
-                return wave[i]
-        raise Exception(f"Could not get last non dot of \"{wave}\"")
+    def samples(self, field):
+        """
+        Returns the sample of `field` in each cycle, expanding `Run`s
+        """
+        for value in self[field]:
+            if isinstance(value, Run):
+                yield from itertools.repeat(value.value, value.cycles)
+            else:
+                yield value
 
     def to_wavejson(self):
         top = {"signal": []}
-        for field, value in self.items():
-            wave = ""
+        for field, entries in self.items():
+            wave = []
             data = []
-            for v in value:
+            last = None
+            for v in entries:
+                cycles = 1
+                if isinstance(v, Run):
+                    v, cycles = v
                 if field == self.clock_name:
-                    if not wave:
-                        wave += "p"
-                    else:
-                        wave += "."
+                    wave.append("." if wave else "p")
                 elif isinstance(v, int) and v in [0, 1] or isinstance(v, Bit):
                     if isinstance(v, Bit):
                         v = int(bool(v))
-                    if not wave or str(v) != self.get_last_non_dot(wave):
-                        wave += str(v)
+                    if not wave or str(v) != last:
+                        last = str(v)
+                        wave.append(last)
                     else:
-                        wave += "."
+                        wave.append(".")
                 elif isinstance(v, BitVector):
                     str_val = str(hex(v.as_uint()))
                     if not wave or data[-1] != str_val:
-                        wave += "="
+                        wave.append("=")
                         data.append(str_val)
                     else:
-                        wave += "."
+                        wave.append(".")
                 else:
                     raise NotImplementedError(v, type(v))
-            signal = {"name": field, "wave": wave}
+                if cycles > 1:
+                    wave.append("." * (cycles - 1))
+            signal = {"name": field, "wave": "".join(wave)}
             if data:
                 signal["data"] = data
             top["signal"].append(signal)